@@ -0,0 +1,4 @@
+"""
+Benchmarks for Orcestator.
+Run from the project root, e.g. `python -m benchmarks.streaming`.
+"""
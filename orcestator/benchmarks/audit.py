@@ -0,0 +1,265 @@
+"""
+Audit backend benchmark.
+Reports rows/s and database size for per-row SQLModel commits, batched
+SQLModel commits and the bulk SQLite audit writer, storing message bodies
+in the content-addressed blob table, and for the bulk writer with the
+bodies stored inline as before: the first message only, with its index,
+or the full message list. Finally times the migration of an inline
+database to the blob table.
+
+The entries model chat traffic: a few long system prompts shared by all
+conversations, and conversations that resend their whole history on
+every turn.
+
+Usage:
+    python -m benchmarks.audit --rows 5000 --turns 8
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, SQLModel, create_engine
+
+from orcestator import db
+from orcestator.audit import SQLiteAuditWriter
+from orcestator.blobs import BLOB_COLUMNS, BlobEncoder
+from orcestator.config import Config
+from orcestator.db import AUDIT_COLUMNS, MessageBlob, RequestLog
+
+# Request log layout before the blob table and the timing columns.
+INLINE_SCHEMA = [
+    "CREATE TABLE requestlog ("
+    "id INTEGER NOT NULL PRIMARY KEY, timestamp DATETIME NOT NULL, "
+    "user_message VARCHAR NOT NULL, assistant_message VARCHAR NOT NULL, "
+    "prompt_tokens INTEGER NOT NULL, completion_tokens INTEGER NOT NULL, latency_ms INTEGER NOT NULL, "
+    "model VARCHAR NOT NULL, original_model VARCHAR NOT NULL)",
+    "CREATE INDEX ix_requestlog_user_message ON requestlog (user_message)",
+    "CREATE INDEX ix_requestlog_model ON requestlog (model)",
+]
+
+INLINE_COLUMNS = [
+    "timestamp", "user_message", "assistant_message", "prompt_tokens",
+    "completion_tokens", "latency_ms", "model", "original_model",
+]
+
+SYSTEM_PROMPTS = [
+    f"You are coding assistant #{k} working in the user's IDE. "
+    + "Follow the project's conventions, keep answers short and show code in fenced blocks. " * 30
+    for k in range(3)
+]
+
+
+def make_entries(count: int, turns: int) -> List[Dict]:
+    """
+    Build synthetic request log entries for chat traffic.
+    
+    Args:
+        count: Number of entries
+        turns: Requests per conversation
+    
+    Returns:
+        List[Dict]: Entries as queued by log_to_file, with the full message list
+    """
+    now = datetime.datetime.utcnow()
+    entries = []
+    history: List[Dict] = []
+    for i in range(count):
+        if i % turns == 0:
+            history = [{"role": "system", "content": SYSTEM_PROMPTS[(i // turns) % len(SYSTEM_PROMPTS)]}]
+        history = history + [{
+            "role": "user",
+            "content": f"Explain this function #{i}\n" + "def f(x):\n    return x\n" * 20,
+        }]
+        answer = f"Function #{i} returns its argument. " + "It returns its argument. " * 40
+        entries.append({
+            "timestamp": now,
+            "messages": history,
+            "user_message": history[0]["content"],
+            "assistant_message": answer,
+            "prompt_tokens": 250,
+            "completion_tokens": 200,
+            "latency_ms": 1200,
+            "model": "orcestator",
+            "original_model": "openai/gpt-4o",
+            "status": "ok",
+        })
+        history = history + [{"role": "assistant", "content": answer}]
+    return entries
+
+
+def fresh_engine(directory: str, name: str):
+    """
+    Create an engine for a new database with the request log schema.
+    
+    Args:
+        directory: Directory for the database file
+        name: Database file name
+    
+    Returns:
+        Engine: SQLAlchemy engine
+    """
+    engine = create_engine(f"sqlite:///{os.path.join(directory, name)}", echo=False)
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def write_orm(engine, encoder: BlobEncoder, entries: List[Dict]) -> None:
+    """Insert entries and their new blobs through the ORM in one commit."""
+    rows, blobs = encoder.encode(entries)
+    with Session(engine) as session:
+        if blobs:
+            session.exec(
+                sqlite_insert(MessageBlob)
+                .values([dict(zip(BLOB_COLUMNS, blob)) for blob in blobs])
+                .on_conflict_do_nothing()
+            )
+        session.add_all([RequestLog(**row) for row in rows])
+        session.commit()
+    encoder.remember(blobs)
+
+
+def bench_sqlmodel_per_row(directory: str, entries: List[Dict], batch_size: int) -> str:
+    """Insert every entry in its own Session and commit."""
+    engine = fresh_engine(directory, "per_row.db")
+    encoder = BlobEncoder()
+    for entry in entries:
+        write_orm(engine, encoder, [entry])
+    engine.dispose()
+    return "per_row.db"
+
+
+def bench_sqlmodel_batched(directory: str, entries: List[Dict], batch_size: int) -> str:
+    """Insert ORM objects with one Session commit per batch."""
+    engine = fresh_engine(directory, "batched.db")
+    encoder = BlobEncoder()
+    for i in range(0, len(entries), batch_size):
+        write_orm(engine, encoder, entries[i:i + batch_size])
+    engine.dispose()
+    return "batched.db"
+
+
+def bench_bulk_writer(directory: str, entries: List[Dict], batch_size: int) -> str:
+    """Insert batches and their new blobs through the WAL-mode SQLiteAuditWriter."""
+    fresh_engine(directory, "bulk.db").dispose()
+    writer = SQLiteAuditWriter(
+        os.path.join(directory, "bulk.db"), RequestLog.__tablename__, AUDIT_COLUMNS,
+        MessageBlob.__tablename__, BLOB_COLUMNS,
+    )
+    encoder = BlobEncoder()
+    for i in range(0, len(entries), batch_size):
+        rows, blobs = encoder.encode(entries[i:i + batch_size])
+        writer.write_batch(rows, blobs)
+        encoder.remember(blobs)
+    writer.close()
+    return "bulk.db"
+
+
+def write_inline(path: str, entries: List[Dict], batch_size: int, full_messages: bool) -> None:
+    """
+    Write entries with their bodies stored inline in the request log table.
+    
+    Args:
+        path: Database file
+        entries: Log entries
+        batch_size: Rows per transaction
+        full_messages: Store the message list as JSON instead of the first message
+    """
+    with sqlite3.connect(path) as connection:
+        for statement in INLINE_SCHEMA:
+            connection.execute(statement)
+    writer = SQLiteAuditWriter(path, RequestLog.__tablename__, INLINE_COLUMNS)
+    for i in range(0, len(entries), batch_size):
+        batch = entries[i:i + batch_size]
+        if full_messages:
+            batch = [dict(entry, user_message=json.dumps(entry["messages"], ensure_ascii=False)) for entry in batch]
+        writer.write_batch(batch)
+    writer.close()
+
+
+def bench_inline_first_message(directory: str, entries: List[Dict], batch_size: int) -> str:
+    """Store the first message and the response inline, with the message index."""
+    write_inline(os.path.join(directory, "inline_first.db"), entries, batch_size, full_messages=False)
+    return "inline_first.db"
+
+
+def bench_inline_full_messages(directory: str, entries: List[Dict], batch_size: int) -> str:
+    """Store the whole message list and the response inline, with the message index."""
+    write_inline(os.path.join(directory, "inline_full.db"), entries, batch_size, full_messages=True)
+    return "inline_full.db"
+
+
+BACKENDS: Dict[str, Callable[[str, List[Dict], int], str]] = {
+    "sqlmodel-per-row": bench_sqlmodel_per_row,
+    "sqlmodel-batched": bench_sqlmodel_batched,
+    "bulk-writer": bench_bulk_writer,
+    "inline-first-message": bench_inline_first_message,
+    "inline-full-messages": bench_inline_full_messages,
+}
+
+
+def database_size(path: str) -> int:
+    """Get the size of a database file, including its WAL file."""
+    return sum(os.path.getsize(name) for name in (path, path + "-wal") if os.path.exists(name))
+
+
+def bench_migration(directory: str, entries: List[Dict], batch_size: int) -> None:
+    """
+    Time moving an inline database's bodies to the blob table, as on first use after upgrading.
+    
+    Args:
+        directory: Directory for the database file
+        entries: Log entries
+        batch_size: Rows per transaction when writing the inline database
+    """
+    path = os.path.join(directory, "migrate.db")
+    write_inline(path, entries, batch_size, full_messages=False)
+    before = database_size(path)
+    
+    Config.DB_PATH = path
+    start = time.perf_counter()
+    db.get_engine().dispose()
+    elapsed = time.perf_counter() - start
+    print(
+        f"\nmigration: {len(entries) / elapsed:.0f} rows/s, "
+        f"{before / 2**20:.1f} MB -> {database_size(path) / 2**20:.1f} MB"
+    )
+
+
+def main(rows: int, batch_size: int, turns: int) -> None:
+    """
+    Run every backend on the same entries and print rows/s and database size.
+    
+    Args:
+        rows: Number of rows to insert per backend
+        batch_size: Rows per batch for the batched backends
+        turns: Requests per synthetic conversation
+    """
+    entries = make_entries(rows, turns)
+    print(f"{'backend':>22} {'rows/s':>10} {'MB':>8} {'bytes/row':>10}")
+    for name, bench in BACKENDS.items():
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            filename = bench(directory, entries, batch_size)
+            elapsed = time.perf_counter() - start
+            size = database_size(os.path.join(directory, filename))
+        print(f"{name:>22} {rows / elapsed:>10.0f} {size / 2**20:>8.1f} {size / rows:>10.0f}")
+    
+    with tempfile.TemporaryDirectory() as directory:
+        bench_migration(directory, entries, batch_size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--turns", type=int, default=8, help="Requests per synthetic conversation")
+    args = parser.parse_args()
+    
+    main(args.rows, args.batch_size, args.turns)
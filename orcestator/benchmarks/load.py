@@ -0,0 +1,531 @@
+"""
+Load generator for the full Orcestator stack.
+Drives /v1/chat/completions at a fixed concurrency or request rate and
+reports throughput, TTFT and total latency percentiles and the CPU and
+memory use of the worker. Results are saved as JSON so runs on different
+commits can be compared.
+
+With --spawn, the mock upstream, the controller, the proxy worker
+(or worker pool) and the API server are started locally and torn down
+afterwards, so requests take the full controller -> ProxyWorker path.
+
+Usage:
+    python -m benchmarks.load --spawn --requests 500 --concurrency 50 --output before.json
+    python -m benchmarks.load --spawn --requests 500 --concurrency 50 --output after.json --compare before.json
+    python -m benchmarks.load --url http://127.0.0.1:8000/v1 --worker-port 8002 --rate 20 --duration 60
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.ttft import percentile
+from orcestator.sse import iter_sse_data, loads
+
+try:
+    import psutil
+except ImportError:  # pragma: no cover - optional dependency
+    psutil = None
+
+# Metrics compared by --compare, with True where higher is better.
+COMPARED_METRICS = {
+    "requests_per_second": True,
+    "tokens_per_second": True,
+    "error_rate": False,
+    "ttft_p50_ms": False,
+    "ttft_p99_ms": False,
+    "latency_p50_ms": False,
+    "latency_p99_ms": False,
+    "worker_cpu_mean_percent": False,
+    "worker_rss_max_mb": False,
+}
+
+
+class ResourceSampler:
+    """
+    Samples CPU and resident memory of a process and its children.
+    
+    Children are included so a worker pool is measured as a whole.
+    """
+    
+    def __init__(self, pid: int, interval: float = 0.5):
+        """
+        Initialize the sampler.
+        
+        Args:
+            pid: Process to sample
+            interval: Seconds between samples
+        """
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.cpu: List[float] = []
+        self.rss: List[int] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+    
+    def _processes(self) -> List:
+        return [self.process] + self.process.children(recursive=True)
+    
+    def _run(self) -> None:
+        tracked: Dict[int, object] = {}
+        while not self._stop.is_set():
+            cpu = 0.0
+            rss = 0
+            try:
+                for process in self._processes():
+                    # cpu_percent needs the same Process object between calls.
+                    process = tracked.setdefault(process.pid, process)
+                    cpu += process.cpu_percent(None)
+                    rss += process.memory_info().rss
+            except psutil.Error:
+                pass
+            self.cpu.append(cpu)
+            self.rss.append(rss)
+            self._stop.wait(self.interval)
+    
+    def __enter__(self) -> "ResourceSampler":
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+    
+    def summary(self) -> Dict:
+        """
+        Get the sampled figures.
+        
+        Returns:
+            Dict: Mean and maximum CPU percent and maximum RSS in MiB; the
+            first sample is skipped, as psutil reports 0% for it
+        """
+        cpu = self.cpu[1:] or [0.0]
+        return {
+            "worker_cpu_mean_percent": round(sum(cpu) / len(cpu), 1),
+            "worker_cpu_max_percent": round(max(cpu), 1),
+            "worker_rss_max_mb": round(max(self.rss or [0]) / 2 ** 20, 1),
+        }
+
+
+def find_listening_pid(port: int) -> Optional[int]:
+    """
+    Find the process listening on a local TCP port.
+    
+    Args:
+        port: Port number
+    
+    Returns:
+        Optional[int]: PID, or None if not found or not permitted
+    """
+    try:
+        for connection in psutil.net_connections(kind="tcp"):
+            if connection.status == psutil.CONN_LISTEN and connection.laddr and connection.laddr.port == port:
+                return connection.pid
+    except psutil.Error:
+        pass
+    return None
+
+
+async def send_one(client: httpx.AsyncClient, body: Dict) -> Dict:
+    """
+    Send one completion and time it.
+    
+    Args:
+        client: Client for the API server
+        body: Request body
+    
+    Returns:
+        Dict: Status, TTFT and total seconds and completion tokens
+    """
+    start = time.perf_counter()
+    ttft: Optional[float] = None
+    tokens = 0
+    
+    if body.get("stream"):
+        async with client.stream("POST", "/chat/completions", json=body) as response:
+            if response.status_code != 200:
+                await response.aread()
+                return {"status": response.status_code, "ttft": None, "total": time.perf_counter() - start, "tokens": 0}
+            async for data in iter_sse_data(response.aiter_bytes()):
+                try:
+                    chunk = loads(data)
+                except ValueError:
+                    continue
+                if (chunk.get("choices") or [{}])[0].get("delta", {}).get("content"):
+                    if ttft is None:
+                        ttft = time.perf_counter() - start
+                    tokens += 1
+                usage = chunk.get("usage")
+                if usage:
+                    tokens = usage.get("completion_tokens") or tokens
+        return {"status": 200, "ttft": ttft, "total": time.perf_counter() - start, "tokens": tokens}
+    
+    response = await client.post("/chat/completions", json=body)
+    if response.status_code == 200:
+        tokens = (response.json().get("usage") or {}).get("completion_tokens", 0)
+    return {"status": response.status_code, "ttft": None, "total": time.perf_counter() - start, "tokens": tokens}
+
+
+async def generate_load(
+    url: str,
+    body: Dict,
+    requests: int,
+    concurrency: int,
+    rate: Optional[float],
+    duration: Optional[float],
+    api_key: str,
+) -> Tuple[List[Dict], float]:
+    """
+    Send requests in a closed loop, or open loop at a fixed rate.
+    
+    Args:
+        url: Base URL of the OpenAI-compatible API (ending in /v1)
+        body: Request body sent every time
+        requests: Number of requests (ignored when duration is set)
+        concurrency: Maximum requests in flight
+        rate: Requests started per second; None for as fast as concurrency allows
+        duration: Seconds to run instead of a fixed number of requests
+        api_key: Bearer token
+    
+    Returns:
+        Tuple[List[Dict], float]: Per-request results and elapsed seconds
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    results: List[Dict] = []
+    
+    async with httpx.AsyncClient(
+        base_url=url,
+        timeout=300.0,
+        headers={"Authorization": f"Bearer {api_key}"},
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+    ) as client:
+        async def one() -> None:
+            try:
+                results.append(await send_one(client, body))
+            except httpx.HTTPError as e:
+                results.append({"status": type(e).__name__, "ttft": None, "total": None, "tokens": 0})
+            finally:
+                semaphore.release()
+        
+        start = time.perf_counter()
+        tasks = []
+        index = 0
+        while True:
+            elapsed = time.perf_counter() - start
+            if duration is not None and elapsed >= duration:
+                break
+            if duration is None and index >= requests:
+                break
+            if rate:
+                delay = index / rate - elapsed
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await semaphore.acquire()
+            tasks.append(asyncio.create_task(one()))
+            index += 1
+        
+        await asyncio.gather(*tasks)
+        return results, time.perf_counter() - start
+
+
+def summarize(results: List[Dict], elapsed: float) -> Dict:
+    """
+    Compute throughput, error and latency figures.
+    
+    Args:
+        results: Per-request results
+        elapsed: Seconds from the first request to the last response
+    
+    Returns:
+        Dict: Report figures; latencies in milliseconds
+    """
+    ok = [r for r in results if r["status"] == 200]
+    errors: Dict[str, int] = {}
+    for r in results:
+        if r["status"] != 200:
+            errors[str(r["status"])] = errors.get(str(r["status"]), 0) + 1
+    
+    ttfts = [r["ttft"] * 1000 for r in ok if r["ttft"] is not None]
+    totals = [r["total"] * 1000 for r in ok] or [0.0]
+    report = {
+        "requests": len(results),
+        "ok": len(ok),
+        "errors": errors,
+        "error_rate": round((len(results) - len(ok)) / max(1, len(results)), 4),
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_second": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "tokens_per_second": round(sum(r["tokens"] for r in ok) / elapsed, 1) if elapsed else 0.0,
+    }
+    for pct in (50, 90, 99):
+        # Only streamed responses have a first token.
+        report[f"ttft_p{pct}_ms"] = round(percentile(ttfts, pct), 1) if ttfts else None
+    for pct in (50, 90, 99):
+        report[f"latency_p{pct}_ms"] = round(percentile(totals, pct), 1)
+    return report
+
+
+def git_commit() -> Optional[str]:
+    """Get the current commit hash, if run inside a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def wait_ready(
+    url: str,
+    timeout: float,
+    process: subprocess.Popen,
+    predicate=None,
+    method: str = "GET",
+) -> None:
+    """
+    Poll an endpoint until it answers 200 (and satisfies `predicate`).
+    
+    Args:
+        url: Endpoint to poll
+        timeout: Seconds to wait
+        process: Process expected to serve it; its exit fails the wait
+        predicate: Optional check on the JSON body
+        method: HTTP method
+    
+    Raises:
+        RuntimeError: If the process exits first
+        TimeoutError: If the endpoint is not ready in time
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args[2]} exited with code {process.returncode} before {url} was ready")
+        try:
+            response = httpx.request(method, url, timeout=2.0)
+            if response.status_code == 200 and (predicate is None or predicate(response.json())):
+                return
+        except (httpx.HTTPError, ValueError):
+            pass
+        time.sleep(0.25)
+    raise TimeoutError(f"{url} not ready after {timeout:.0f}s")
+
+
+def spawn_stack(args, workdir: str) -> Tuple[List[subprocess.Popen], int]:
+    """
+    Start the mock upstream, controller, proxy worker(s) and API server.
+    
+    Args:
+        args: Command line arguments
+        workdir: Directory for logs and the traffic log
+    
+    Returns:
+        Tuple[List[subprocess.Popen], int]: Started processes, last first
+        to stop, and the PID of the worker (or worker pool)
+    """
+    env = dict(
+        os.environ,
+        OR_API_KEY="bench",
+        OR_UPSTREAMS="",
+        OR_UPSTREAM_BASE_URL=f"http://127.0.0.1:{args.mock_port}/api/v1",
+        OR_UPSTREAM_WARM_CONNECTIONS="0",
+        OR_LOG_FILE=os.path.join(workdir, "traffic.log"),
+    )
+    python = sys.executable
+    controller = f"http://127.0.0.1:{args.controller_port}"
+    processes: List[subprocess.Popen] = []
+    
+    def start(name: str, command: List[str]) -> subprocess.Popen:
+        log = open(os.path.join(workdir, f"{name}.log"), "w")
+        process = subprocess.Popen(command, env=env, cwd=workdir, stdout=log, stderr=subprocess.STDOUT)
+        processes.insert(0, process)
+        return process
+    
+    # The children import benchmarks/orcestator from this checkout.
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+    
+    try:
+        mock = start("mock_upstream", [
+            python, "-m", "benchmarks.mock_upstream", "--port", str(args.mock_port),
+            "--ttft", str(args.ttft), "--tokens", str(args.tokens),
+            "--tokens-per-second", str(args.tokens_per_second),
+            "--error-rate", str(args.error_rate), "--rate-limit-rate", str(args.rate_limit_rate),
+        ])
+        wait_ready(f"http://127.0.0.1:{args.mock_port}/api/v1/models", args.startup_timeout, mock)
+        
+        controller_process = start("controller", [
+            python, "-m", "orcestator.controller_patch",
+            "--host", "127.0.0.1", "--port", str(args.controller_port),
+        ])
+        wait_ready(f"{controller}/list_models", args.startup_timeout, controller_process, method="POST")
+        
+        worker_module = "orcestator.worker_pool" if args.num_workers > 1 else "orcestator.proxy_worker"
+        worker_command = [
+            python, "-m", worker_module, "--port", str(args.worker_port),
+            "--controller-address", controller, "--model-id", args.model,
+        ]
+        if args.num_workers > 1:
+            worker_command += ["--num-workers", str(args.num_workers)]
+        worker = start("worker", worker_command)
+        wait_ready(
+            f"{controller}/list_models", args.startup_timeout, worker, method="POST",
+            predicate=lambda body: args.model in body.get("models", []),
+        )
+        
+        api_server = start("api_server", [
+            python, "-m", "orcestator.api_server", "--host", "127.0.0.1", "--port", str(args.api_port),
+            "--controller-address", controller,
+        ])
+        wait_ready(f"http://127.0.0.1:{args.api_port}/v1/models", args.startup_timeout, api_server)
+    except Exception:
+        stop_stack(processes)
+        raise
+    
+    return processes, worker.pid
+
+
+def stop_stack(processes: List[subprocess.Popen]) -> None:
+    """
+    Terminate spawned processes, killing those that do not exit.
+    
+    Args:
+        processes: Processes in stop order
+    """
+    for process in processes:
+        process.terminate()
+        try:
+            process.wait(10.0)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def compare(current: Dict, baseline: Dict, metrics: Dict[str, bool] = COMPARED_METRICS) -> None:
+    """
+    Print the change of the key metrics against a baseline report.
+    
+    Args:
+        current: This run's report
+        baseline: Report loaded from a previous run
+        metrics: Metrics to compare, with True where higher is better
+    """
+    print(f"\nvs {baseline.get('commit') or 'baseline'} ({baseline.get('timestamp', '?')})")
+    print(f"{'metric':>26} {'baseline':>10} {'current':>10} {'change':>8}")
+    for metric, higher_is_better in metrics.items():
+        old = baseline.get("results", {}).get(metric)
+        new = current["results"].get(metric)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        worse = change < 0 if higher_is_better else change > 0
+        flag = " !" if worse and abs(change) >= 5 else ""
+        print(f"{metric:>26} {old:>10} {new:>10} {change:>+7.1f}%{flag}")
+
+
+def main(args) -> None:
+    """
+    Run the load test and write the report.
+    
+    Args:
+        args: Command line arguments
+    """
+    body = {
+        "model": args.model,
+        "messages": [{"role": "user", "content": args.prompt}],
+        "stream": not args.no_stream,
+        "max_tokens": args.tokens,
+    }
+    processes: List[subprocess.Popen] = []
+    workdir = tempfile.mkdtemp(prefix="orcestator-load-")
+    url = args.url
+    worker_pid = args.worker_pid
+    sampler: Optional[ResourceSampler] = None
+    
+    if args.spawn:
+        processes, worker_pid = spawn_stack(args, workdir)
+        url = f"http://127.0.0.1:{args.api_port}/v1"
+        print(f"Stack started, logs in {workdir}")
+    elif worker_pid is None and args.worker_port and psutil is not None:
+        worker_pid = find_listening_pid(args.worker_port)
+    
+    try:
+        if args.warmup:
+            asyncio.run(generate_load(url, body, args.warmup, args.concurrency, None, None, args.api_key))
+        
+        sampler = ResourceSampler(worker_pid) if worker_pid and psutil is not None else None
+        if sampler is not None:
+            with sampler:
+                results, elapsed = asyncio.run(generate_load(
+                    url, body, args.requests, args.concurrency, args.rate, args.duration, args.api_key
+                ))
+        else:
+            results, elapsed = asyncio.run(generate_load(
+                url, body, args.requests, args.concurrency, args.rate, args.duration, args.api_key
+            ))
+    finally:
+        stop_stack(processes)
+    
+    summary = summarize(results, elapsed)
+    if sampler is not None:
+        summary.update(sampler.summary())
+    
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "settings": {
+            key: value for key, value in vars(args).items()
+            if key not in ("output", "compare", "api_key")
+        },
+        "results": summary,
+    }
+    
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", type=str, default="http://127.0.0.1:8000/v1", help="API base URL when not spawning")
+    parser.add_argument("--model", type=str, default="orcestator")
+    parser.add_argument("--prompt", type=str, default="Write a short poem about proxies.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=None, help="Run for this many seconds instead")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=None, help="Open-loop requests per second")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests sent first")
+    parser.add_argument("--no-stream", action="store_true")
+    parser.add_argument("--api-key", type=str, default="test")
+    parser.add_argument("--worker-pid", type=int, default=None, help="Worker process to sample")
+    parser.add_argument("--worker-port", type=int, default=8002, help="Worker port, used to find the process to sample")
+    parser.add_argument("--output", type=str, default=None, help="Write the JSON report here")
+    parser.add_argument("--compare", type=str, default=None, help="Baseline JSON report to compare with")
+    
+    stack = parser.add_argument_group("spawned stack")
+    stack.add_argument("--spawn", action="store_true", help="Start mock upstream, controller, worker and API server")
+    stack.add_argument("--num-workers", type=int, default=1)
+    stack.add_argument("--mock-port", type=int, default=9000)
+    stack.add_argument("--controller-port", type=int, default=21001)
+    stack.add_argument("--api-port", type=int, default=8000)
+    stack.add_argument("--ttft", type=float, default=0.2, help="Mock seconds before the first token")
+    stack.add_argument("--tokens", type=int, default=200, help="Mock tokens per completion")
+    stack.add_argument("--tokens-per-second", type=float, default=100.0)
+    stack.add_argument("--error-rate", type=float, default=0.0)
+    stack.add_argument("--rate-limit-rate", type=float, default=0.0)
+    stack.add_argument("--startup-timeout", type=float, default=60.0)
+    args = parser.parse_args()
+    
+    main(args)
@@ -0,0 +1,153 @@
+"""
+Mock OpenRouter upstream for benchmarks.
+Serves /api/v1/chat/completions with configurable time to first token,
+token rate and failure rates, in OpenRouter's SSE format (including its
+": OPENROUTER PROCESSING" keep-alive comments), so Orcestator can be
+measured without a real provider.
+
+Usage:
+    python -m benchmarks.mock_upstream --port 9000 --ttft 0.2 --tokens 200
+    python -m benchmarks.mock_upstream --error-rate 0.01 --rate-limit-rate 0.05
+    OR_UPSTREAM_BASE_URL=http://127.0.0.1:9000/api/v1 python -m orcestator.direct_server
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import AsyncGenerator, Dict
+
+import uvicorn
+from fastapi import APIRouter, FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+router = APIRouter(prefix="/api/v1")
+settings: Dict = {
+    "ttft": 0.2,
+    "tokens": 200,
+    "tokens_per_second": 100.0,
+    "error_rate": 0.0,
+    "rate_limit_rate": 0.0,
+    "retry_after": 1,
+}
+
+PROCESSING = ": OPENROUTER PROCESSING\n\n"
+KEEPALIVE_INTERVAL = 1.0
+
+
+def completion_chunk(model: str, content: str, finish_reason=None) -> str:
+    """
+    Build one OpenRouter-style SSE frame.
+    
+    Args:
+        model: Model name to report
+        content: Delta content
+        finish_reason: Finish reason for the last chunk
+        
+    Returns:
+        str: SSE frame
+    """
+    chunk = {
+        "id": "gen-mock",
+        "provider": "Mock",
+        "model": model,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "choices": [{"index": 0, "delta": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(chunk)}\n\n"
+
+
+@router.get("/models")
+async def list_models() -> Dict:
+    """List the mock model."""
+    return {"data": [{"id": "mock/model"}]}
+
+
+def error_response(status: int, message: str) -> JSONResponse:
+    """
+    Build an OpenRouter-style error response.
+    
+    Args:
+        status: HTTP status
+        message: Error message
+        
+    Returns:
+        JSONResponse: Error body, with Retry-After on 429
+    """
+    headers = {"Retry-After": str(settings["retry_after"])} if status == 429 else None
+    return JSONResponse({"error": {"message": message, "code": status}}, status_code=status, headers=headers)
+
+
+@router.post("/chat/completions")
+async def chat_completions(request: Request):
+    """Answer a chat completion after the configured delays, or fail at the configured rates."""
+    body = await request.json()
+    model = body.get("model", "mock/model")
+    
+    roll = random.random()
+    if roll < settings["rate_limit_rate"]:
+        return error_response(429, "Rate limit exceeded")
+    if roll < settings["rate_limit_rate"] + settings["error_rate"]:
+        return error_response(500, "Internal upstream error")
+    
+    tokens = int(settings["tokens"])
+    interval = 1.0 / settings["tokens_per_second"] if settings["tokens_per_second"] > 0 else 0.0
+    
+    if not body.get("stream"):
+        await asyncio.sleep(settings["ttft"] + interval * tokens)
+        return JSONResponse({
+            "id": "gen-mock",
+            "model": model,
+            "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "tok " * tokens}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": tokens, "total_tokens": 10 + tokens},
+        })
+    
+    async def stream() -> AsyncGenerator[str, None]:
+        # OpenRouter sends keep-alive comments while the provider is queued.
+        waited = 0.0
+        while waited < settings["ttft"]:
+            yield PROCESSING
+            step = min(KEEPALIVE_INTERVAL, settings["ttft"] - waited)
+            await asyncio.sleep(step)
+            waited += step
+        for i in range(tokens):
+            if i:
+                await asyncio.sleep(interval)
+            yield completion_chunk(model, "tok ")
+        usage = {"prompt_tokens": 10, "completion_tokens": tokens, "total_tokens": 10 + tokens}
+        yield f"data: {json.dumps({'model': model, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}], 'usage': usage})}\n\n"
+        yield "data: [DONE]\n\n"
+    
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+app = FastAPI(title="Mock OpenRouter")
+app.include_router(router)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--ttft", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--tokens", type=int, default=200, help="Tokens per completion")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds on 429")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    
+    random.seed(args.seed)
+    settings.update(
+        ttft=args.ttft,
+        tokens=args.tokens,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,191 @@
+"""
+Offline evaluation of the semantic cache.
+Replays the RequestLog table of the SQLite audit database in time order
+through the semantic cache index and reports, per similarity threshold,
+how many requests would have been served from the cache and how many of
+those hits would have returned a different answer than the one logged.
+
+The replay uses the full message list of each request, except for rows
+migrated from databases that kept only the first message; treat the
+results as a guide for choosing OR_SEMANTIC_CACHE_THRESHOLD /
+OR_SEMANTIC_CACHE_MODELS.
+
+Usage:
+    python -m benchmarks.semantic_cache --db logs/orcestator.db
+    python -m benchmarks.semantic_cache --db logs/orcestator.db --thresholds 0.9,0.95,0.99 --model openai/gpt-4o
+"""
+
+import argparse
+import sqlite3
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from orcestator.blobs import decode_messages, decompress
+from orcestator.config import Config
+from orcestator.semantic_cache import VectorIndex, bucket_id, embed, normalize_messages
+
+
+def load_requests(db_path: str, model: Optional[str], limit: Optional[int]) -> List[Dict]:
+    """
+    Read logged requests in time order.
+    
+    Args:
+        db_path: SQLite audit database
+        model: Only rows for this upstream model
+        limit: Maximum number of rows
+    
+    Returns:
+        List[Dict]: Rows with the upstream model, messages and answer
+    """
+    query = "SELECT original_model, model, messages_hash, response_hash FROM requestlog"
+    params: List = []
+    if model:
+        query += " WHERE original_model = ? OR (original_model = '' AND model = ?)"
+        params += [model, model]
+    query += " ORDER BY timestamp, id"
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+    
+    with sqlite3.connect(db_path) as connection:
+        rows = connection.execute(query, params).fetchall()
+        
+        def load(digest: str) -> bytes:
+            codec, data = connection.execute(
+                "SELECT codec, data FROM messageblob WHERE hash = ?", (digest,)
+            ).fetchone()
+            return decompress(codec, data)
+        
+        return [
+            {
+                "model": original_model or requested,
+                "messages": decode_messages(load(messages_hash), load),
+                "answer": load(response_hash).decode(),
+            }
+            for original_model, requested, messages_hash, response_hash in rows
+        ]
+
+
+def prepare(rows: List[Dict], dim: int) -> List[Dict]:
+    """
+    Embed prompts and answers once for all thresholds.
+    
+    Args:
+        rows: Logged requests
+        dim: Embedding dimension
+    
+    Returns:
+        List[Dict]: Rows with bucket, prompt vector and answer vector
+    """
+    prepared = []
+    for row in rows:
+        request_data = {
+            "model": row["model"],
+            "messages": row["messages"],
+            "temperature": 0.0,
+        }
+        answer = normalize_messages([{"role": "assistant", "content": row["answer"]}])
+        prepared.append({
+            "model": row["model"],
+            "bucket": bucket_id(request_data),
+            "vector": embed(normalize_messages(request_data["messages"]), dim),
+            "answer": answer,
+            "answer_vector": embed(answer, dim),
+        })
+    return prepared
+
+
+def replay(rows: List[Dict], threshold: float, answer_similarity: float, capacity: int, dim: int) -> Dict:
+    """
+    Replay requests through an index, storing only on misses as the proxy does.
+    
+    Args:
+        rows: Prepared rows
+        threshold: Minimum prompt similarity for a hit
+        answer_similarity: Minimum answer similarity for a hit to count as correct
+        capacity: Index capacity
+        dim: Embedding dimension
+    
+    Returns:
+        Dict: Totals overall and per model
+    """
+    index = VectorIndex(capacity, dim)
+    totals: Dict[str, Dict[str, int]] = defaultdict(lambda: {"requests": 0, "hits": 0, "wrong": 0})
+    
+    for now, row in enumerate(rows, start=1):
+        stats = totals[row["model"]]
+        stats["requests"] += 1
+        
+        found = index.search(row["vector"], row["bucket"], now)
+        if found is not None and found[1] >= threshold:
+            cached = index.entry(found[0], now)
+            stats["hits"] += 1
+            if cached["answer"] != row["answer"] and float(cached["answer_vector"] @ row["answer_vector"]) < answer_similarity:
+                stats["wrong"] += 1
+            continue
+        
+        index.add(row["vector"], row["bucket"], row, float("inf"), now)
+    
+    return totals
+
+
+def main(
+    db_path: str,
+    thresholds: List[float],
+    answer_similarity: float,
+    model: Optional[str],
+    limit: Optional[int],
+    capacity: int,
+    dim: int,
+) -> None:
+    """
+    Evaluate every threshold and print hit and wrong-answer rates.
+    
+    Args:
+        db_path: SQLite audit database
+        thresholds: Prompt similarity thresholds to compare
+        answer_similarity: Minimum answer similarity counted as the same answer
+        model: Only rows for this upstream model
+        limit: Maximum number of rows
+        capacity: Index capacity (OR_SEMANTIC_CACHE_MAX_ENTRIES)
+        dim: Embedding dimension (OR_SEMANTIC_CACHE_DIM)
+    """
+    rows = prepare(load_requests(db_path, model, limit), dim)
+    print(f"{len(rows)} requests from {db_path}")
+    print(f"{'threshold':>10} {'model':>32} {'requests':>9} {'hit rate':>9} {'wrong':>7} {'wrong/hits':>11}")
+    
+    for threshold in thresholds:
+        totals = replay(rows, threshold, answer_similarity, capacity, dim)
+        overall = {"requests": 0, "hits": 0, "wrong": 0}
+        for name in sorted(totals):
+            for field in overall:
+                overall[field] += totals[name][field]
+        for name, stats in sorted(totals.items()) + [("(all)", overall)]:
+            print(
+                f"{threshold:>10.3f} {name[-32:]:>32} {stats['requests']:>9} "
+                f"{stats['hits'] / max(1, stats['requests']):>9.1%} "
+                f"{stats['wrong'] / max(1, stats['requests']):>7.1%} "
+                f"{stats['wrong'] / max(1, stats['hits']):>11.1%}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default=Config.DB_PATH, required=Config.DB_PATH is None)
+    parser.add_argument("--thresholds", default="0.9,0.95,0.97,0.99")
+    parser.add_argument("--answer-similarity", type=float, default=0.9)
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--capacity", type=int, default=Config.SEMANTIC_CACHE_MAX_ENTRIES)
+    parser.add_argument("--dim", type=int, default=Config.SEMANTIC_CACHE_DIM)
+    args = parser.parse_args()
+    
+    main(
+        args.db,
+        [float(value) for value in args.thresholds.split(",")],
+        args.answer_similarity,
+        args.model,
+        args.limit,
+        args.capacity,
+        args.dim,
+    )
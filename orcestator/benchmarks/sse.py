@@ -0,0 +1,175 @@
+"""
+SSE decoding micro-benchmark.
+Replays recorded upstream SSE transcripts through the previous line-based
+parser and the byte-framed parser in orcestator.sse, and reports
+microseconds per chunk.
+
+Usage:
+    python -m benchmarks.sse
+    python -m benchmarks.sse --transcript recorded.sse --read-size 1024
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import AsyncIterator, Callable, Dict, List
+
+import httpx
+
+from orcestator import sse
+
+TRANSCRIPT_DIR = os.path.join(os.path.dirname(__file__), "transcripts")
+
+
+def load_transcripts(paths: List[str]) -> Dict[str, bytes]:
+    """
+    Read SSE transcripts, defaulting to the recorded ones in benchmarks/transcripts.
+    
+    Args:
+        paths: Transcript files; empty for the bundled recordings
+    
+    Returns:
+        Dict[str, bytes]: Transcript bodies by file name
+    """
+    if not paths:
+        paths = sorted(
+            os.path.join(TRANSCRIPT_DIR, name)
+            for name in os.listdir(TRANSCRIPT_DIR)
+            if name.endswith(".sse")
+        )
+    transcripts = {}
+    for path in paths:
+        with open(path, "rb") as f:
+            transcripts[os.path.basename(path)] = f.read()
+    return transcripts
+
+
+def make_response(body: bytes, read_size: int) -> httpx.Response:
+    """
+    Wrap a transcript in a streaming response delivered in network-sized reads.
+    
+    Args:
+        body: SSE body
+        read_size: Bytes per received chunk
+    
+    Returns:
+        httpx.Response: Response whose body is streamed in `read_size` pieces
+    """
+    async def stream() -> AsyncIterator[bytes]:
+        for start in range(0, len(body), read_size):
+            yield body[start:start + read_size]
+    
+    return httpx.Response(200, content=stream(), headers={"content-type": "text/event-stream"})
+
+
+async def parse_lines(response: httpx.Response) -> int:
+    """
+    The previous parser: aiter_lines, string prefix checks and json.loads.
+    
+    Args:
+        response: Streaming response to drain
+    
+    Returns:
+        int: Number of content chunks seen
+    """
+    count = 0
+    async for line in response.aiter_lines():
+        if not line or line.startswith(":"):
+            continue
+        if line.startswith("data: "):
+            line = line[6:]
+        if line.strip() == "[DONE]":
+            break
+        try:
+            chunk = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        choices = chunk.get("choices") or [{}]
+        if "model" in chunk:
+            chunk["model"] = "orcestator"
+        if (choices[0].get("delta") or {}).get("content", ""):
+            count += 1
+    return count
+
+
+def make_frame_parser(loads: Callable) -> Callable:
+    """
+    Build the byte-framed parser with the given JSON decoder.
+    
+    Args:
+        loads: JSON decode function
+    
+    Returns:
+        Callable: Coroutine function draining a response
+    """
+    async def parse_frames(response: httpx.Response) -> int:
+        count = 0
+        async for data in sse.iter_sse_data(response.aiter_bytes()):
+            try:
+                chunk = loads(data)
+            except ValueError:
+                continue
+            choices = chunk.get("choices") or [{}]
+            if (choices[0].get("delta") or {}).get("content", ""):
+                count += 1
+        return count
+    
+    return parse_frames
+
+
+async def measure(parser: Callable, body: bytes, read_size: int, repeats: int) -> Dict:
+    """
+    Time a parser over one transcript, keeping the fastest run.
+    
+    Args:
+        parser: Coroutine function taking a response
+        body: Transcript body
+        read_size: Bytes per received chunk
+        repeats: Number of runs
+    
+    Returns:
+        Dict: Best seconds and number of content chunks
+    """
+    best = float("inf")
+    chunks = 0
+    for _ in range(repeats):
+        response = make_response(body, read_size)
+        start = time.perf_counter()
+        chunks = await parser(response)
+        best = min(best, time.perf_counter() - start)
+    return {"seconds": best, "chunks": chunks}
+
+
+async def main(paths: List[str], read_size: int, repeats: int) -> None:
+    """
+    Run every parser over every transcript and print a table.
+    
+    Args:
+        paths: Transcript files
+        read_size: Bytes per received chunk
+        repeats: Runs per parser; the fastest is reported
+    """
+    parsers = {"lines+json": parse_lines, "frames+json": make_frame_parser(lambda data: json.loads(data.decode()))}
+    if sse.orjson is not None:
+        parsers["frames+orjson"] = make_frame_parser(sse.orjson.loads)
+    
+    print(f"{'transcript':>24} {'parser':>14} {'chunks':>8} {'us/chunk':>10}")
+    for name, body in load_transcripts(paths).items():
+        for label, parser in parsers.items():
+            result = await measure(parser, body, read_size, repeats)
+            print(
+                f"{name:>24} {label:>14} {result['chunks']:>8} "
+                f"{result['seconds'] / max(1, result['chunks']) * 1e6:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transcript", action="append", default=[])
+    parser.add_argument("--read-size", type=int, default=4096)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+    
+    asyncio.run(main(args.transcript, args.read_size, args.repeats))
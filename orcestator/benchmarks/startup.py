@@ -0,0 +1,171 @@
+"""
+Startup benchmark for Orcestator.
+Measures how long each component takes to import and how long
+`orcestator serve` takes to report ready and to answer its first
+completion, against the mock upstream. Results are saved as JSON so runs
+on different commits can be compared.
+
+Usage:
+    python -m benchmarks.startup --output before.json
+    python -m benchmarks.startup --output after.json --compare before.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.load import compare, git_commit, stop_stack, wait_ready
+
+MODULES = [
+    "orcestator.controller_patch",
+    "orcestator.proxy_worker",
+    "orcestator.api_server",
+    "orcestator.direct_server",
+]
+
+# Metrics compared by --compare; lower is better for all of them.
+COMPARED_METRICS = {
+    **{f"import_{module.rsplit('.', 1)[-1]}_ms": False for module in MODULES},
+    "ready_p50_ms": False,
+    "first_completion_p50_ms": False,
+}
+
+# FastChat replaces sys.stdout with a logger, so the result is written to fd 1 directly.
+_IMPORT_SNIPPET = (
+    "import os, time; start = time.perf_counter(); import {module}; "
+    "os.write(1, str(time.perf_counter() - start).encode())"
+)
+
+
+def import_time(module: str, env: Dict[str, str]) -> float:
+    """
+    Time importing a module in a fresh interpreter.
+    
+    Args:
+        module: Module to import
+        env: Environment of the interpreter
+    
+    Returns:
+        float: Seconds spent in the import, excluding interpreter startup
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", _IMPORT_SNIPPET.format(module=module)],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def time_serve(args, env: Dict[str, str], workdir: str, run: int) -> Dict[str, float]:
+    """
+    Start the stack with `orcestator serve` and time it until it serves.
+    
+    Args:
+        args: Command line arguments
+        env: Environment pointing the stack at the mock upstream
+        workdir: Directory for logs
+        run: Run number, for the log file name
+    
+    Returns:
+        Dict[str, float]: Seconds until /health reported ready and until
+        the first completion succeeded
+    """
+    base = f"http://127.0.0.1:{args.api_port}"
+    body = {"model": "orcestator", "messages": [{"role": "user", "content": "ping"}], "max_tokens": 8}
+    log = open(os.path.join(workdir, f"serve_{run}.log"), "w")
+    start = time.perf_counter()
+    serve = subprocess.Popen(
+        [sys.executable, "-m", "orcestator.launcher", "serve", "--port", str(args.api_port)],
+        env=env, cwd=workdir, stdout=log, stderr=subprocess.STDOUT,
+    )
+    try:
+        wait_ready(f"{base}/health", args.startup_timeout, serve)
+        ready = time.perf_counter() - start
+        response = httpx.post(f"{base}/v1/chat/completions", json=body, timeout=30.0)
+        response.raise_for_status()
+        first_completion = time.perf_counter() - start
+    finally:
+        stop_stack([serve])
+        log.close()
+    return {"ready": ready, "first_completion": first_completion}
+
+
+def main(args) -> None:
+    """
+    Run the benchmark and write the report.
+    
+    Args:
+        args: Command line arguments
+    """
+    workdir = tempfile.mkdtemp(prefix="orcestator-startup-")
+    env = dict(
+        os.environ,
+        OR_API_KEY="bench",
+        OR_UPSTREAMS="",
+        OR_UPSTREAM_BASE_URL=f"http://127.0.0.1:{args.mock_port}/api/v1",
+        OR_LOG_FILE=os.path.join(workdir, "traffic.log"),
+        PYTHONPATH=os.pathsep.join(filter(None, [os.getcwd(), os.environ.get("PYTHONPATH")])),
+    )
+    summary: Dict[str, float] = {}
+    
+    for module in MODULES:
+        samples = [import_time(module, env) for _ in range(args.repeats)]
+        summary[f"import_{module.rsplit('.', 1)[-1]}_ms"] = round(statistics.median(samples) * 1000, 1)
+    
+    mock_log = open(os.path.join(workdir, "mock_upstream.log"), "w")
+    mock = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.mock_upstream", "--port", str(args.mock_port), "--ttft", "0.05", "--tokens", "8"],
+        env=env, stdout=mock_log, stderr=subprocess.STDOUT,
+    )
+    runs: List[Dict[str, float]] = []
+    try:
+        wait_ready(f"http://127.0.0.1:{args.mock_port}/api/v1/models", args.startup_timeout, mock)
+        for run in range(args.runs):
+            runs.append(time_serve(args, env, workdir, run))
+    finally:
+        stop_stack([mock])
+        mock_log.close()
+    
+    for key in ("ready", "first_completion"):
+        samples = [run[key] for run in runs]
+        summary[f"{key}_p50_ms"] = round(statistics.median(samples) * 1000, 1)
+        summary[f"{key}_max_ms"] = round(max(samples) * 1000, 1)
+    
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": summary,
+    }
+    
+    print(json.dumps(summary, indent=2))
+    print(f"Logs in {workdir}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f), COMPARED_METRICS)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=5, help="Imports timed per module")
+    parser.add_argument("--runs", type=int, default=3, help="Stack starts timed")
+    parser.add_argument("--mock-port", type=int, default=9000)
+    parser.add_argument("--api-port", type=int, default=8000)
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--output", type=str, default=None, help="Write the JSON report here")
+    parser.add_argument("--compare", type=str, default=None, help="Baseline JSON report to compare with")
+    args = parser.parse_args()
+    
+    main(args)
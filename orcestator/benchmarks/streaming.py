@@ -0,0 +1,121 @@
+"""
+Streaming benchmark for OpenRouterProxy.generate_stream.
+Compares cumulative and delta streaming as the completion grows.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+os.environ.setdefault("OR_LOG_FILE", os.path.join(tempfile.mkdtemp(), "traffic.log"))
+
+import httpx
+
+from orcestator.proxy import OpenRouterProxy
+
+
+def build_sse_body(num_tokens: int, token: str = "tok ") -> bytes:
+    """
+    Build an OpenRouter-style SSE transcript with one token per chunk.
+    
+    Args:
+        num_tokens: Number of content chunks to emit
+        token: Text of each chunk
+        
+    Returns:
+        bytes: The full SSE response body
+    """
+    lines: List[str] = []
+    for _ in range(num_tokens):
+        chunk = {
+            "id": "gen-bench",
+            "model": "openai/gpt-4o",
+            "choices": [{"index": 0, "delta": {"content": token}}],
+        }
+        lines.append(f"data: {json.dumps(chunk)}\n\n")
+    usage = {"choices": [], "usage": {"prompt_tokens": 10, "completion_tokens": num_tokens}}
+    lines.append(f"data: {json.dumps(usage)}\n\n")
+    lines.append("data: [DONE]\n\n")
+    return "".join(lines).encode()
+
+
+def make_proxy(body: bytes) -> OpenRouterProxy:
+    """
+    Create a proxy whose upstream client is served from memory.
+    
+    Args:
+        body: SSE body returned for every request
+        
+    Returns:
+        OpenRouterProxy: Proxy with a mocked upstream
+    """
+    return OpenRouterProxy(
+        client=httpx.AsyncClient(
+            base_url="https://openrouter.ai/api/v1",
+            transport=httpx.MockTransport(
+                lambda request: httpx.Response(
+                    200, content=body, headers={"content-type": "text/event-stream"}
+                )
+            ),
+        )
+    )
+
+
+async def run_once(proxy: OpenRouterProxy, delta: bool) -> Dict:
+    """
+    Drain one stream and encode each event the way the worker gate does.
+    
+    Args:
+        proxy: Proxy to drive
+        delta: Whether to use delta streaming
+        
+    Returns:
+        Dict: Elapsed seconds and bytes sent over the worker hop
+    """
+    params = {"model": "orcestator", "messages": [{"role": "user", "content": "bench"}]}
+    sent = 0
+    text = ""
+    start = time.perf_counter()
+    async for event in proxy.generate_stream(params):
+        if delta:
+            event["delta"] = True
+        else:
+            text += event["text"]
+            event["text"] = text
+        sent += len(json.dumps(event).encode() + b"\0")
+    return {"seconds": time.perf_counter() - start, "bytes": sent}
+
+
+async def main(sizes: List[int], repeats: int) -> None:
+    """
+    Run the benchmark for every completion size and print a table.
+    
+    Args:
+        sizes: Completion lengths in tokens
+        repeats: Runs per size and mode; the fastest is reported
+    """
+    print(f"{'tokens':>8} {'mode':>10} {'us/token':>10} {'KiB sent':>10}")
+    for size in sizes:
+        proxy = make_proxy(build_sse_body(size))
+        for delta in (False, True):
+            runs = [await run_once(proxy, delta) for _ in range(repeats)]
+            best = min(runs, key=lambda r: r["seconds"])
+            mode = "delta" if delta else "cumulative"
+            print(
+                f"{size:>8} {mode:>10} {best['seconds'] / size * 1e6:>10.2f} "
+                f"{best['bytes'] / 1024:>10.1f}"
+            )
+        await proxy.router.upstreams[0].client.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[256, 1024, 4096, 8192])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    
+    asyncio.run(main(args.sizes, args.repeats))
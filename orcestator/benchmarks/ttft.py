@@ -0,0 +1,147 @@
+"""
+Time-to-first-token benchmark for OpenAI-compatible endpoints.
+Compares the FastChat stack (API server -> controller -> worker) with the
+direct single-process server against the same upstream.
+
+Usage:
+    python -m benchmarks.mock_upstream --port 9000 &
+    # FastChat stack on :8000 and direct server on :8010, both with
+    # OR_UPSTREAM_BASE_URL=http://127.0.0.1:9000/api/v1
+    python -m benchmarks.ttft --target fastchat=http://127.0.0.1:8000/v1 \\
+                              --target direct=http://127.0.0.1:8010/v1
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Compute a percentile with nearest-rank interpolation.
+    
+    Args:
+        values: Sample values
+        pct: Percentile in [0, 100]
+        
+    Returns:
+        float: The percentile value
+    """
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def measure_one(client: httpx.AsyncClient, model: str) -> Tuple[float, float]:
+    """
+    Send one streaming completion and time it.
+    
+    Args:
+        client: Client for the target endpoint
+        model: Model name to request
+        
+    Returns:
+        Tuple[float, float]: Time to first content token and total time, in seconds
+    """
+    body = {
+        "model": model,
+        "messages": [{"role": "user", "content": "Write a short poem about proxies."}],
+        "stream": True,
+    }
+    start = time.perf_counter()
+    ttft: Optional[float] = None
+    async with client.stream("POST", "/chat/completions", json=body) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if ttft is None and line.startswith("data: ") and '"content"' in line:
+                chunk = json.loads(line[6:])
+                if (chunk.get("choices") or [{}])[0].get("delta", {}).get("content"):
+                    ttft = time.perf_counter() - start
+    total = time.perf_counter() - start
+    return (ttft if ttft is not None else total), total
+
+
+async def run_target(url: str, model: str, requests: int, concurrency: int, api_key: str) -> Dict:
+    """
+    Run the benchmark against one endpoint.
+    
+    Args:
+        url: Base URL of the OpenAI-compatible API (ending in /v1)
+        model: Model name to request
+        requests: Number of requests
+        concurrency: Number of requests in flight at once
+        api_key: Bearer token
+        
+    Returns:
+        Dict: TTFT and total latency statistics in milliseconds
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    results: List[Tuple[float, float]] = []
+    errors = 0
+    
+    async with httpx.AsyncClient(
+        base_url=url,
+        timeout=120.0,
+        headers={"Authorization": f"Bearer {api_key}"},
+        limits=httpx.Limits(max_connections=concurrency),
+    ) as client:
+        async def worker() -> None:
+            nonlocal errors
+            async with semaphore:
+                try:
+                    results.append(await measure_one(client, model))
+                except httpx.HTTPError:
+                    errors += 1
+        
+        await asyncio.gather(*(worker() for _ in range(requests)))
+    
+    ttfts = [r[0] * 1000 for r in results] or [0.0]
+    totals = [r[1] * 1000 for r in results] or [0.0]
+    return {
+        "requests": len(results),
+        "errors": errors,
+        "ttft_mean_ms": statistics.fmean(ttfts),
+        "ttft_p50_ms": percentile(ttfts, 50),
+        "ttft_p95_ms": percentile(ttfts, 95),
+        "total_p50_ms": percentile(totals, 50),
+        "total_p95_ms": percentile(totals, 95),
+    }
+
+
+async def main(targets: List[str], model: str, requests: int, concurrency: int, api_key: str) -> None:
+    """
+    Benchmark every target and print a comparison table.
+    
+    Args:
+        targets: `name=url` pairs
+        model: Model name to request
+        requests: Requests per target
+        concurrency: Requests in flight at once
+        api_key: Bearer token
+    """
+    print(f"{'target':>10} {'ok':>5} {'err':>4} {'ttft mean':>10} {'ttft p50':>9} {'ttft p95':>9} {'total p95':>10}")
+    for target in targets:
+        name, _, url = target.partition("=")
+        stats = await run_target(url, model, requests, concurrency, api_key)
+        print(
+            f"{name:>10} {stats['requests']:>5} {stats['errors']:>4} "
+            f"{stats['ttft_mean_ms']:>10.1f} {stats['ttft_p50_ms']:>9.1f} "
+            f"{stats['ttft_p95_ms']:>9.1f} {stats['total_p95_ms']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", action="append", required=True, help="name=base_url, repeatable")
+    parser.add_argument("--model", type=str, default="orcestator")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--api-key", type=str, default="test")
+    args = parser.parse_args()
+    
+    asyncio.run(main(args.target, args.model, args.requests, args.concurrency, args.api_key))
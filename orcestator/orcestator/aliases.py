@@ -0,0 +1,353 @@
+"""
+Model aliases for Orcestator.
+Maps the model names clients request to weighted upstream targets and
+per-alias parameter overrides, read from a JSON file that is watched and
+swapped in at runtime without a restart.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from starlette.responses import Response
+
+from orcestator.config import Config
+
+logger = logging.getLogger("orcestator")
+
+DEFAULT_ALIAS = "orcestator"
+
+_NO_PARAMS: Dict = {}
+# Request fields an alias may not override.
+_RESERVED_PARAMS = ("model", "messages", "stream")
+
+
+def _alias_method(weights: List[float]) -> Tuple[List[float], List[int]]:
+    """
+    Build Vose alias tables for sampling an index by weight in O(1).
+    
+    Args:
+        weights: Positive weights
+    
+    Returns:
+        Tuple[List[float], List[int]]: Acceptance probability and alias
+        index of every column
+    """
+    count = len(weights)
+    total = sum(weights)
+    scaled = [weight * count / total for weight in weights]
+    accept = [1.0] * count
+    alias = list(range(count))
+    small = [index for index, value in enumerate(scaled) if value < 1.0]
+    large = [index for index, value in enumerate(scaled) if value >= 1.0]
+    
+    while small and large:
+        low = small.pop()
+        high = large.pop()
+        accept[low] = scaled[low]
+        alias[low] = high
+        scaled[high] += scaled[low] - 1.0
+        (small if scaled[high] < 1.0 else large).append(high)
+    
+    return accept, alias
+
+
+class ModelAlias:
+    """One client-facing model name with its upstream targets."""
+    
+    __slots__ = ("name", "targets", "weights", "params", "_accept", "_alias")
+    
+    def __init__(self, name: str, targets: Dict[str, float], params: Optional[Dict] = None):
+        """
+        Initialize and precompile an alias.
+        
+        Args:
+            name: Model name requested by clients
+            targets: Upstream models and their relative weights
+            params: Request fields forced on every request for the alias
+        """
+        if not targets:
+            raise ValueError(f"alias {name!r} has no targets")
+        for target, weight in targets.items():
+            if not isinstance(target, str) or not target:
+                raise ValueError(f"alias {name!r}: targets must be model names")
+            if not isinstance(weight, (int, float)) or isinstance(weight, bool) or weight <= 0:
+                raise ValueError(f"alias {name!r}: target {target!r} needs a positive weight")
+        if params is not None and not isinstance(params, dict):
+            raise ValueError(f"alias {name!r}: params must be an object")
+        reserved = [field for field in _RESERVED_PARAMS if field in (params or {})]
+        if reserved:
+            raise ValueError(f"alias {name!r}: params may not set {', '.join(reserved)}")
+        
+        self.name = name
+        self.targets = list(targets)
+        self.weights = [float(targets[target]) for target in self.targets]
+        self.params = dict(params or {})
+        self._accept, self._alias = _alias_method(self.weights)
+    
+    def pick(self) -> str:
+        """
+        Choose an upstream model by weight.
+        
+        Returns:
+            str: Upstream model name
+        """
+        if len(self.targets) == 1:
+            return self.targets[0]
+        column = int(random.random() * len(self.targets))
+        if random.random() >= self._accept[column]:
+            column = self._alias[column]
+        return self.targets[column]
+
+
+def model_card(model_id: str, created: int) -> Dict:
+    """
+    Build a /v1/models entry.
+    
+    Args:
+        model_id: Model name exposed to clients
+        created: Creation time to report
+    
+    Returns:
+        Dict: OpenAI model object
+    """
+    return {
+        "id": model_id,
+        "object": "model",
+        "created": created,
+        "owned_by": "orcestator",
+        "permission": [],
+        "root": model_id,
+        "parent": None,
+    }
+
+
+class AliasTable:
+    """
+    Immutable, precompiled alias configuration.
+    
+    Lookups are a dict access plus an O(1) weighted pick, and the
+    /v1/models response body is encoded once per table.
+    """
+    
+    def __init__(self, aliases: Dict[str, ModelAlias], created: int = 1677610602):
+        """
+        Initialize the table.
+        
+        Args:
+            aliases: Aliases by client-facing name
+            created: Creation time reported in /v1/models
+        """
+        if DEFAULT_ALIAS not in aliases:
+            aliases = dict(aliases)
+            aliases[DEFAULT_ALIAS] = ModelAlias(DEFAULT_ALIAS, {Config.DEFAULT_MODEL: 1.0})
+        self.aliases = aliases
+        self.names = sorted(aliases)
+        self.models_body = json.dumps(
+            {"object": "list", "data": [model_card(name, created) for name in self.names]},
+            separators=(",", ":"),
+        ).encode("utf-8")
+        self.etag = '"' + hashlib.sha256(self.models_body).hexdigest()[:16] + '"'
+    
+    @classmethod
+    def from_dict(cls, data: Dict, created: int = 1677610602) -> "AliasTable":
+        """
+        Build a table from the parsed alias file.
+        
+        Each entry of `aliases` is an upstream model name, a list of them
+        (equal weights), or an object with `targets` (a name, a list or an
+        object of weights) and optional `params`.
+        
+        Args:
+            data: Parsed alias file
+            created: Creation time reported in /v1/models
+        
+        Returns:
+            AliasTable: The compiled table
+        
+        Raises:
+            ValueError: If the file is malformed
+        """
+        entries = data.get("aliases") if isinstance(data, dict) else None
+        if not isinstance(entries, dict):
+            raise ValueError("the alias file must be an object with an 'aliases' object")
+        
+        aliases = {}
+        for name, entry in entries.items():
+            params = None
+            if isinstance(entry, dict):
+                params = entry.get("params")
+                entry = entry.get("targets")
+            if isinstance(entry, str):
+                targets = {entry: 1.0}
+            elif isinstance(entry, list):
+                if not all(isinstance(target, str) for target in entry):
+                    raise ValueError(f"alias {name!r}: targets must be model names")
+                targets = {target: 1.0 for target in entry}
+            elif isinstance(entry, dict):
+                targets = entry
+            else:
+                raise ValueError(f"alias {name!r} has no valid targets")
+            aliases[name] = ModelAlias(name, targets, params)
+        return cls(aliases, created)
+    
+    def resolve(self, model_name: str) -> Tuple[str, Dict]:
+        """
+        Map a requested model name to an upstream model.
+        
+        Args:
+            model_name: Model requested by the client
+        
+        Returns:
+            Tuple[str, Dict]: Upstream model and the request fields to
+            override; names that are not aliases map to themselves
+        """
+        alias = self.aliases.get(model_name)
+        if alias is None:
+            return model_name, _NO_PARAMS
+        return alias.pick(), alias.params
+
+
+class AliasRegistry:
+    """
+    Current alias table, reloaded when its file changes.
+    
+    A background thread polls the file's modification time and size; a
+    changed file is parsed and compiled off the request path and swapped
+    in with a single reference assignment, so requests in flight keep the
+    table they started with. A file that fails to load leaves the previous
+    table in place.
+    """
+    
+    def __init__(self, path: Optional[str], interval: float):
+        """
+        Load the alias file, or build the default table without one.
+        
+        Args:
+            path: Alias file, or None to alias only 'orcestator'
+            interval: Seconds between file checks
+        """
+        self.path = path
+        self.interval = interval
+        self.table = AliasTable({})
+        self._signature: Optional[Tuple[float, int]] = None
+        self._callbacks: List[Callable[[AliasTable], None]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if path:
+            self.reload()
+    
+    def resolve(self, model_name: str) -> Tuple[str, Dict]:
+        """
+        Map a requested model name with the current table.
+        
+        Args:
+            model_name: Model requested by the client
+        
+        Returns:
+            Tuple[str, Dict]: Upstream model and request field overrides
+        """
+        return self.table.resolve(model_name)
+    
+    def on_change(self, callback: Callable[[AliasTable], None]) -> None:
+        """
+        Register a function called with every newly loaded table.
+        
+        Args:
+            callback: Called from the watcher thread
+        """
+        self._callbacks.append(callback)
+    
+    def reload(self) -> bool:
+        """
+        Load the alias file if it changed since the last check.
+        
+        Returns:
+            bool: True if a new table was swapped in
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError as e:
+            if self._signature is not None:
+                logger.error(f"Alias file {self.path} unreadable, keeping current aliases: {e}")
+                self._signature = None
+            return False
+        
+        signature = (stat.st_mtime, stat.st_size)
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                table = AliasTable.from_dict(json.load(f), created=int(stat.st_mtime))
+        except (OSError, ValueError) as e:
+            logger.error(f"Invalid alias file {self.path}, keeping current aliases: {e}")
+            return False
+        
+        self.table = table
+        logger.info(f"Loaded {len(table.names)} model aliases from {self.path}")
+        for callback in self._callbacks:
+            try:
+                callback(table)
+            except Exception as e:
+                logger.error(f"Alias change callback failed: {e}")
+        return True
+    
+    def start(self) -> None:
+        """Start watching the alias file, if there is one."""
+        if not self.path or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._watch, name="orcestator-aliases", daemon=True)
+        self._thread.start()
+    
+    def _watch(self) -> None:
+        """Check the file periodically until closed."""
+        while not self._stop.wait(self.interval):
+            self.reload()
+    
+    def close(self) -> None:
+        """Stop watching the alias file."""
+        self._stop.set()
+
+
+_registry: Optional[AliasRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_alias_registry() -> AliasRegistry:
+    """
+    Get the process-wide alias registry, starting its watcher on first use.
+    
+    Returns:
+        AliasRegistry: Registry for OR_ALIAS_FILE
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                registry = AliasRegistry(Config.ALIAS_FILE, Config.ALIAS_RELOAD_INTERVAL)
+                registry.start()
+                _registry = registry
+    return _registry
+
+
+def models_response(if_none_match: Optional[str] = None) -> Response:
+    """
+    Serve /v1/models from the current alias table.
+    
+    Args:
+        if_none_match: The client's If-None-Match header
+    
+    Returns:
+        Response: The cached body, or 304 if the client's copy is current
+    """
+    table = get_alias_registry().table
+    headers = {"ETag": table.etag}
+    if if_none_match == table.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=table.models_body, media_type="application/json", headers=headers)
@@ -1,60 +1,267 @@
 """
 Wrapper for FastChat's OpenAI API server.
-Adds the 'orcestator' model to the available models.
+Serves the model aliases as the available models, dispatches requests
+to workers from a cached copy of the controller's worker list and closes
+worker streams as soon as their client disconnects. Batch job requests
+are forwarded to a worker, which runs the jobs.
 """
 
 import argparse
+import json
 import sys
-from typing import Dict, List
+from contextlib import aclosing
+from typing import AsyncGenerator, Dict, Optional
 
-from fastchat.serve.openai_api_server import app, build_logger, create_app, get_model_list
-from fastchat.utils import str_to_bool
+import httpx
+from fastapi import Depends, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from fastchat.serve import openai_api_server
+from fastchat.serve.openai_api_server import app, app_settings, build_logger, check_api_key
 
+from orcestator.aliases import get_alias_registry, models_response
 from orcestator.config import Config
+from orcestator.dispatch import WorkerResolver
 from orcestator.logger import start_metrics_server
+from orcestator.ratelimit import RateLimiter, RateLimitMiddleware
+from orcestator.streaming import ClosingStreamingResponse
 
 logger = build_logger("api_server", "api_server.log")
 
 
-def patch_model_list(model_list: List[Dict]) -> List[Dict]:
+# FastChat's /v1/models asks the controller to refresh every worker on
+# each call; the model list is the alias table, so serve it from there.
+app.router.routes = [route for route in app.router.routes if getattr(route, "path", None) != "/v1/models"]
+
+
+@app.get("/v1/models", dependencies=[Depends(check_api_key)])
+async def list_models(request: Request) -> Response:
     """
-    Add the 'orcestator' model to the model list.
+    List the model aliases from the cached alias table.
     
     Args:
-        model_list: Original model list from FastChat
+        request: Incoming request
         
     Returns:
-        List[Dict]: Updated model list with 'orcestator' added
+        Response: Cached model list
+    """
+    return models_response(request.headers.get("if-none-match"))
+
+
+@app.get("/health")
+async def health() -> JSONResponse:
+    """
+    Report whether requests can be served.
+    
+    The stack is ready once a worker has registered with the controller,
+    which workers do only after warming their upstream connections.
+    
+    Returns:
+        JSONResponse: 200 when ready, 503 while starting
+    """
+    try:
+        async with httpx.AsyncClient(timeout=2.0) as client:
+            response = await client.post(app_settings.controller_address + "/list_models")
+            models = response.json()["models"] if response.status_code == 200 else []
+    except (httpx.HTTPError, ValueError, KeyError):
+        models = []
+    
+    if not models:
+        return JSONResponse({"status": "starting"}, status_code=503)
+    return JSONResponse({"status": "ready", "models": sorted(models)})
+
+
+original_get_gen_params = openai_api_server.get_gen_params
+
+async def patched_get_gen_params(model_name: str, worker_addr: str, messages, **kwargs) -> Dict:
+    """
+    Patched version of get_gen_params that also passes the chat messages.
+    
+    FastChat renders messages into a single prompt with the worker's
+    template; the proxy worker forwards the original message list instead.
+    """
+    gen_params = await original_get_gen_params(model_name, worker_addr, messages, **kwargs)
+    if not isinstance(messages, str):
+        gen_params["messages"] = messages
+    return gen_params
+
+
+openai_api_server.get_gen_params = patched_get_gen_params
+
+
+original_generate_completion_stream = openai_api_server.generate_completion_stream
+
+async def patched_generate_completion_stream(payload: Dict, worker_addr: str) -> AsyncGenerator[Dict, None]:
+    """
+    Patched version of generate_completion_stream that accepts delta responses.
+    
+    Workers running with OR_STREAM_DELTAS send only the new text of each
+    response; FastChat's stream generators expect the whole text so far,
+    so it is rebuilt here as a running string.
+    """
+    text = ""
+    async with aclosing(original_generate_completion_stream(payload, worker_addr)) as contents:
+        async for content in contents:
+            if content.pop("delta", False):
+                text += content["text"]
+                content["text"] = text
+            yield content
+
+
+openai_api_server.generate_completion_stream = patched_generate_completion_stream
+
+
+original_check_model = openai_api_server.check_model
+original_get_worker_address = openai_api_server.get_worker_address
+resolver: Optional[WorkerResolver] = None
+
+
+async def patched_check_model(request) -> Optional[Response]:
+    """
+    Patched version of check_model that accepts models of cached workers.
+    
+    Unknown models are still checked with the controller, which also
+    produces FastChat's error response.
+    """
+    if resolver is not None and await resolver.has_model(request.model):
+        return None
+    return await original_check_model(request)
+
+
+async def patched_get_worker_address(model_name: str) -> str:
+    """
+    Patched version of get_worker_address that dispatches from the cached worker list.
+    
+    Raises:
+        ValueError: If no worker serves the model
+    """
+    if resolver is None:
+        return await original_get_worker_address(model_name)
+    return await resolver.get_worker_address(model_name)
+
+
+openai_api_server.check_model = patched_check_model
+openai_api_server.get_worker_address = patched_get_worker_address
+
+# FastChat's streaming endpoints build their responses from this module
+# global; closing the stream on a client disconnect closes the connection
+# to the worker, which then stops its upstream call.
+openai_api_server.StreamingResponse = ClosingStreamingResponse
+
+
+def stream_chunk_model(model):
+    """
+    Subclass a stream chunk model so FastChat can serialize it under pydantic 2.
+    
+    FastChat's stream generators call chunk.json(ensure_ascii=False),
+    which pydantic 2 rejects; model_dump_json takes the remaining
+    arguments and never escapes non-ASCII text.
+    
+    Args:
+        model: FastChat stream response model
+    
+    Returns:
+        The model, or a subclass whose json() accepts ensure_ascii
     """
-    for model in model_list:
-        if model["id"] == "orcestator":
-            return model_list
+    if not hasattr(model, "model_dump_json"):
+        return model
     
-    orcestator_model = {
-        "id": "orcestator",
-        "object": "model",
-        "created": 1677610602,
-        "owned_by": "orcestator",
-        "permission": [],
-        "root": "orcestator",
-        "parent": None,
-    }
+    class StreamChunk(model):
+        def json(self, *, ensure_ascii: bool = False, **kwargs) -> str:
+            if ensure_ascii:
+                return json.dumps(self.model_dump(mode="json", **kwargs))
+            return self.model_dump_json(**kwargs)
     
-    model_list.append(orcestator_model)
-    return model_list
+    StreamChunk.__name__ = model.__name__
+    return StreamChunk
 
 
-original_get_model_list = get_model_list
+# The stream generators look these up as module globals.
+openai_api_server.ChatCompletionStreamResponse = stream_chunk_model(openai_api_server.ChatCompletionStreamResponse)
+openai_api_server.CompletionStreamResponse = stream_chunk_model(openai_api_server.CompletionStreamResponse)
 
-def patched_get_model_list(*args, **kwargs):
+
+async def forward_batch(path: str, payload: Dict, model: Optional[str] = None) -> JSONResponse:
     """
-    Patched version of get_model_list that adds 'orcestator' to the model list.
+    Forward a batch job request to a worker.
+    
+    Jobs are stored in the database shared by the workers, so any worker
+    can report on or cancel a job; new jobs go to a worker of their model.
+    
+    Args:
+        path: Worker endpoint
+        payload: Request body for the worker
+        model: Model of a new job, or None for any worker
+    
+    Returns:
+        JSONResponse: The worker's response, or 503 if no worker is available
     """
-    model_list = original_get_model_list(*args, **kwargs)
-    return patch_model_list(model_list)
+    try:
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            if model is None:
+                response = await client.post(app_settings.controller_address + "/list_models")
+                models = sorted(response.json()["models"])
+                if not models:
+                    raise ValueError("no models registered")
+                model = models[0]
+            worker_addr = await openai_api_server.get_worker_address(model)
+            response = await client.post(worker_addr + path, json=payload)
+    except (httpx.HTTPError, ValueError, KeyError) as e:
+        return JSONResponse({"error": f"No worker available for batch jobs: {e}"}, status_code=503)
+    return JSONResponse(response.json(), status_code=response.status_code)
+
+
+@app.post("/v1/batches", dependencies=[Depends(check_api_key)])
+async def create_batch(request: Request) -> JSONResponse:
+    """Create a batch job from a JSONL file in OR_BATCH_DIR."""
+    spec = await request.json()
+    model = spec.get("model") if isinstance(spec, dict) else None
+    return await forward_batch("/worker_create_batch", spec, model)
+
+
+@app.get("/v1/batches", dependencies=[Depends(check_api_key)])
+async def list_batches() -> JSONResponse:
+    """List the most recent batch jobs."""
+    return await forward_batch("/worker_list_batches", {})
+
+
+@app.get("/v1/batches/{batch_id}", dependencies=[Depends(check_api_key)])
+async def get_batch(batch_id: str) -> JSONResponse:
+    """Get a batch job's progress, throughput and ETA."""
+    return await forward_batch("/worker_get_batch", {"id": batch_id})
+
 
+@app.post("/v1/batches/{batch_id}/cancel", dependencies=[Depends(check_api_key)])
+async def cancel_batch(batch_id: str) -> JSONResponse:
+    """Cancel a batch job."""
+    return await forward_batch("/worker_cancel_batch", {"id": batch_id})
 
-get_model_list = patched_get_model_list
+
+def str_to_bool(value: str) -> bool:
+    """Parse a boolean command line value."""
+    return value.lower() in ("1", "true", "yes")
+
+
+def configure_app(args) -> None:
+    """
+    Apply the command line settings to FastChat's API app.
+    
+    Args:
+        args: Parsed command line arguments
+    """
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=args.allowed_origins.split(","),
+        allow_credentials=args.allow_credentials,
+        allow_methods=args.allowed_methods.split(","),
+        allow_headers=args.allowed_headers.split(","),
+    )
+    app_settings.controller_address = args.controller_address
+    app_settings.api_keys = args.api_keys.split(",") if args.api_keys else None
+    
+    global resolver
+    if Config.DISPATCH_CACHE_TTL > 0:
+        resolver = WorkerResolver(args.controller_address, Config.DISPATCH_CACHE_TTL, original_get_worker_address)
 
 
 def run_api_server():
@@ -81,7 +288,15 @@ def run_api_server():
     logger.info(f"Starting Orcestator API server at {args.host}:{args.port}")
     logger.info(f"Using controller at {args.controller_address}")
     
-    create_app(args)
+    configure_app(args)
+    get_alias_registry()
+    
+    if Config.RATE_LIMIT_ENABLED:
+        app.add_middleware(
+            RateLimitMiddleware,
+            limiter=RateLimiter(persist=Config.RATE_LIMIT_PERSIST),
+            api_keys=app_settings.api_keys,
+        )
     
     import uvicorn
     uvicorn.run(app, host=args.host, port=args.port, log_level="info")
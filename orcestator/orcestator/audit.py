@@ -0,0 +1,105 @@
+"""
+High-throughput SQLite audit backend for Orcestator.
+Writes request log batches, and the message body blobs they reference,
+through one persistent sqlite3 connection.
+"""
+
+import datetime
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence
+
+
+class SQLiteAuditWriter:
+    """
+    Batch writer for the request log table.
+    
+    Uses a single long-lived connection in WAL mode and inserts each batch
+    with one prepared INSERT statement inside one transaction, skipping
+    ORM object construction entirely.
+    """
+    
+    def __init__(
+        self,
+        db_path: str,
+        table: str,
+        columns: Sequence[str],
+        blob_table: Optional[str] = None,
+        blob_columns: Sequence[str] = (),
+    ):
+        """
+        Open the writer connection and configure the journal.
+        
+        Args:
+            db_path: Path to the SQLite database file
+            table: Name of the table to insert into (must already exist)
+            columns: Column names to insert, in entry key order
+            blob_table: Name of the content-addressed blob table, if rows reference one
+            blob_columns: Blob table column names, in blob tuple order
+        """
+        self.db_path = db_path
+        self.table = table
+        self.columns = list(columns)
+        self._statement = (
+            f"INSERT INTO {table} ({', '.join(self.columns)}) "
+            f"VALUES ({', '.join('?' for _ in self.columns)})"
+        )
+        # Blobs are keyed by content hash, so one already stored is skipped.
+        self._blob_statement = (
+            f"INSERT OR IGNORE INTO {blob_table} ({', '.join(blob_columns)}) "
+            f"VALUES ({', '.join('?' for _ in blob_columns)})"
+        ) if blob_table else None
+        self._lock = threading.Lock()
+        
+        # isolation_level=None leaves transaction control to write_batch.
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+    
+    def _row(self, entry: Dict) -> tuple:
+        """
+        Convert a log entry to a parameter tuple for the INSERT statement.
+        
+        Args:
+            entry: Log entry fields
+            
+        Returns:
+            tuple: Values in column order
+        """
+        values = []
+        for column in self.columns:
+            value = entry.get(column)
+            if isinstance(value, datetime.datetime):
+                # Same text format SQLAlchemy uses for SQLite DATETIME columns.
+                value = value.strftime("%Y-%m-%d %H:%M:%S.%f")
+            values.append(value)
+        return tuple(values)
+    
+    def write_batch(self, entries: List[Dict], blobs: Sequence[tuple] = ()) -> None:
+        """
+        Insert a batch of entries and the blobs they reference in a single transaction.
+        
+        Args:
+            entries: Log entries keyed by column name
+            blobs: New blob rows, in blob column order
+        """
+        if not entries:
+            return
+        
+        rows = [self._row(entry) for entry in entries]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                if blobs:
+                    self._conn.executemany(self._blob_statement, blobs)
+                self._conn.executemany(self._statement, rows)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+    
+    def close(self) -> None:
+        """Close the writer connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,580 @@
+"""
+Offline batch jobs for Orcestator.
+Runs a JSONL file of chat completion requests through the proxy with a
+bounded number of requests in flight, writes the results to an output
+JSONL file in input order and checkpoints progress in the SQLite
+database, so a job resumes where it stopped after a crash or restart.
+
+Batch requests use the batch admission priority, so with the adaptive
+limiter enabled interactive requests are always admitted first.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi.responses import JSONResponse
+
+from orcestator.config import Config
+from orcestator.limiter import AdmissionTimeout
+from orcestator.logger import BATCH_REQUESTS
+from orcestator.router import RETRYABLE_STATUS_CODES
+
+logger = logging.getLogger("orcestator")
+
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+# A job whose process stops checkpointing for this long is resumed by another.
+LEASE_SECONDS = 60.0
+
+# Requests read ahead of the oldest unfinished one, per allowed in flight;
+# results are written in input order, so this bounds the results held back.
+WINDOW_FACTOR = 4
+
+
+class _JobLost(Exception):
+    """The job was cancelled or taken over by another process."""
+
+
+def resolve_path(path: str) -> Path:
+    """
+    Resolve a batch file path against OR_BATCH_DIR.
+    
+    Args:
+        path: Path relative to OR_BATCH_DIR, or absolute inside it
+    
+    Returns:
+        Path: Absolute path
+    
+    Raises:
+        ValueError: If the path is outside OR_BATCH_DIR
+    """
+    root = Path(Config.BATCH_DIR).resolve()
+    resolved = (root / path).resolve()
+    if root not in resolved.parents:
+        raise ValueError(f"Batch files must be inside OR_BATCH_DIR ({root}): {path}")
+    return resolved
+
+
+def count_requests(path: Path) -> int:
+    """
+    Count the non-blank lines of an input file.
+    
+    Args:
+        path: Input JSONL file
+    
+    Returns:
+        int: Number of requests
+    """
+    with open(path, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def parse_request(raw: bytes, line: int, model: str) -> Tuple[str, Dict]:
+    """
+    Parse one input line.
+    
+    Lines are either OpenAI batch requests (`custom_id`, `method`, `url`
+    and `body`) or bare chat completion bodies with an optional `custom_id`.
+    
+    Args:
+        raw: The line
+        line: Line number, 1-based
+        model: Model for requests that name none
+    
+    Returns:
+        Tuple[str, Dict]: Custom ID and chat completion body
+    
+    Raises:
+        ValueError: If the line is not a valid chat completion request
+    """
+    request = json.loads(raw)
+    if not isinstance(request, dict):
+        raise ValueError("request is not a JSON object")
+    
+    if "body" in request:
+        url = request.get("url", "/v1/chat/completions")
+        if url != "/v1/chat/completions":
+            raise ValueError(f"unsupported url {url}")
+        body = request["body"]
+        if not isinstance(body, dict):
+            raise ValueError("body is not a JSON object")
+    else:
+        body = {key: value for key, value in request.items() if key != "custom_id"}
+    
+    if not body.get("messages"):
+        raise ValueError("request has no messages")
+    body = dict(body, stream=False)
+    body.setdefault("model", model)
+    return str(request.get("custom_id") or f"line-{line}"), body
+
+
+def retry_delay(error: Exception, attempt: int) -> float:
+    """
+    Get the pause before retrying a failed request.
+    
+    Args:
+        error: The failure
+        attempt: Number of the attempt that failed, 1-based
+    
+    Returns:
+        float: Seconds to wait, from Retry-After if the upstream sent one
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        try:
+            return min(60.0, float(error.response.headers["retry-after"]))
+        except (KeyError, ValueError):
+            pass
+    return min(30.0, 2.0 ** (attempt - 1))
+
+
+def job_status(job: Dict) -> Dict:
+    """
+    Describe a job for the status endpoints.
+    
+    Throughput covers the job's current run, so a resumed job's ETA is
+    not skewed by the time it was stopped.
+    
+    Args:
+        job: BatchJob fields
+    
+    Returns:
+        Dict: Progress, token totals, requests per second and ETA
+    """
+    done = job["completed"] + job["failed"]
+    throughput = None
+    if job["run_started_at"] is not None:
+        elapsed = job["updated_at"] - job["run_started_at"]
+        if elapsed > 0 and done > job["run_start_done"]:
+            throughput = (done - job["run_start_done"]) / elapsed
+    
+    remaining = max(0, job["total"] - done)
+    eta = None
+    if job["status"] == "in_progress" and throughput:
+        eta = round(remaining / throughput, 1)
+    
+    return {
+        "id": job["id"],
+        "object": "batch",
+        "status": job["status"],
+        "input_file": job["input_file"],
+        "output_file": job["output_file"],
+        "model": job["model"],
+        "parallelism": job["parallelism"],
+        "total": job["total"],
+        "completed": job["completed"],
+        "failed": job["failed"],
+        "remaining": remaining,
+        "prompt_tokens": job["prompt_tokens"],
+        "completion_tokens": job["completion_tokens"],
+        "throughput": None if throughput is None else round(throughput, 2),
+        "eta_seconds": eta,
+        "created_at": job["created_at"],
+        "finished_at": job["finished_at"],
+        "error": job["error"],
+    }
+
+
+class BatchRunner:
+    """
+    Runs batch jobs in one proxy process.
+    
+    Each job reads its input ahead of the oldest unfinished request, up to
+    WINDOW_FACTOR times its parallelism, and sends at most `parallelism`
+    requests at once; all jobs of the process together send at most
+    OR_BATCH_PARALLELISM. Results are appended to the output file in input
+    order, and every OR_BATCH_CHECKPOINT_INTERVAL seconds the output is
+    synced and the input line, file offsets and counters are saved. A
+    resumed job truncates its output to the checkpoint and continues from
+    the checkpointed line, so no result is written twice.
+    
+    Jobs are owned through a lease renewed by every checkpoint; the
+    database is polled for jobs whose lease ran out, which is how jobs of
+    a crashed or restarted process are resumed.
+    """
+    
+    def __init__(self, proxy, parallelism: int = Config.BATCH_PARALLELISM):
+        """
+        Initialize the runner.
+        
+        Args:
+            proxy: OpenRouterProxy that sends the requests
+            parallelism: Requests in flight across all jobs of the process
+        """
+        self.proxy = proxy
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.parallelism = parallelism
+        self._slots = asyncio.Semaphore(parallelism)
+        self._jobs: Dict[str, Dict] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._claimer: Optional[asyncio.Task] = None
+    
+    def start(self) -> None:
+        """Start resuming unfinished jobs; call from the event loop."""
+        if self._claimer is None:
+            self._claimer = asyncio.create_task(self._claim_loop())
+    
+    async def close(self) -> None:
+        """Stop the jobs and release their leases, so a restarted process resumes them at once."""
+        from orcestator.db import release_batch_jobs
+        
+        tasks = list(self._tasks.values())
+        if self._claimer is not None:
+            tasks.append(self._claimer)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.to_thread(release_batch_jobs, self.owner)
+    
+    async def submit(self, spec: Dict) -> Dict:
+        """
+        Create a job and start running it.
+        
+        Args:
+            spec: `input_file`, and optionally `output_file` (default
+                `<input>.output.jsonl`), `model` for lines without one and
+                `parallelism`, at most the runner's own
+        
+        Returns:
+            Dict: Job status
+        
+        Raises:
+            ValueError: If the spec is invalid
+        """
+        from orcestator.db import create_batch_job
+        
+        if not isinstance(spec, dict) or not spec.get("input_file"):
+            raise ValueError("input_file is required")
+        input_path = resolve_path(spec["input_file"])
+        if not input_path.is_file():
+            raise ValueError(f"Input file not found: {spec['input_file']}")
+        output_path = resolve_path(spec.get("output_file") or input_path.with_suffix(".output.jsonl"))
+        if output_path == input_path:
+            raise ValueError("output_file must differ from input_file")
+        if output_path.exists() and output_path.stat().st_size > 0:
+            raise ValueError(f"Output file already exists: {output_path.name}")
+        try:
+            parallelism = int(spec.get("parallelism") or self.parallelism)
+        except (TypeError, ValueError):
+            raise ValueError("parallelism must be an integer")
+        if not 1 <= parallelism <= self.parallelism:
+            raise ValueError(f"parallelism must be between 1 and {self.parallelism}")
+        
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.touch()
+        now = time.time()
+        job = {
+            "id": f"batch_{uuid.uuid4().hex[:24]}",
+            "status": "in_progress",
+            "input_file": str(input_path),
+            "output_file": str(output_path),
+            "model": spec.get("model") or "orcestator",
+            "parallelism": parallelism,
+            "total": await asyncio.to_thread(count_requests, input_path),
+            "next_line": 1,
+            "input_offset": 0,
+            "output_offset": 0,
+            "completed": 0,
+            "failed": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "owner": self.owner,
+            "lease_until": now + LEASE_SECONDS,
+            "created_at": now,
+            "updated_at": now,
+            "run_started_at": now,
+            "run_start_done": 0,
+            "finished_at": None,
+            "error": None,
+        }
+        await asyncio.to_thread(create_batch_job, job)
+        logger.info(f"Batch job {job['id']} created: {job['total']} requests from {input_path.name}")
+        self._start_job(job)
+        return job_status(job)
+    
+    async def status(self, job_id: str) -> Dict:
+        """
+        Get a job's status, live if this process runs it.
+        
+        Args:
+            job_id: Job ID
+        
+        Returns:
+            Dict: Job status
+        
+        Raises:
+            KeyError: If there is no such job
+        """
+        from orcestator.db import get_batch_job
+        
+        job = self._jobs.get(job_id) or await asyncio.to_thread(get_batch_job, job_id)
+        if job is None:
+            raise KeyError(job_id)
+        return job_status(job)
+    
+    async def list(self) -> List[Dict]:
+        """
+        List the most recent jobs.
+        
+        Returns:
+            List[Dict]: Job statuses, newest first
+        """
+        from orcestator.db import list_batch_jobs
+        
+        return [job_status(self._jobs.get(job["id"], job)) for job in await asyncio.to_thread(list_batch_jobs)]
+    
+    async def cancel(self, job_id: str) -> Dict:
+        """
+        Cancel a job; results written so far stay in the output file.
+        
+        Args:
+            job_id: Job ID
+        
+        Returns:
+            Dict: Job status
+        
+        Raises:
+            KeyError: If there is no such job
+        """
+        from orcestator.db import cancel_batch_job
+        
+        job = await asyncio.to_thread(cancel_batch_job, job_id, time.time())
+        if job is None:
+            raise KeyError(job_id)
+        task = self._tasks.get(job_id)
+        if task is not None and job["status"] == "cancelled":
+            self._jobs[job_id].update(status="cancelled", finished_at=job["finished_at"])
+            task.cancel()
+        return await self.status(job_id)
+    
+    def _start_job(self, job: Dict) -> None:
+        """Run a job owned by this process in the background."""
+        self._jobs[job["id"]] = job
+        self._tasks[job["id"]] = asyncio.create_task(self._run(job))
+    
+    async def _claim_loop(self) -> None:
+        """Resume unfinished jobs whose lease has run out."""
+        from orcestator.db import claim_batch_jobs
+        
+        while True:
+            try:
+                claimed = await asyncio.to_thread(claim_batch_jobs, self.owner, time.time(), LEASE_SECONDS)
+            except Exception as e:
+                logger.error(f"Failed to check for unfinished batch jobs: {str(e)}")
+                claimed = []
+            
+            for job in claimed:
+                job.update(
+                    run_started_at=time.time(),
+                    run_start_done=job["completed"] + job["failed"],
+                    updated_at=time.time(),
+                )
+                logger.info(f"Resuming batch job {job['id']} at line {job['next_line']}")
+                self._start_job(job)
+            await asyncio.sleep(LEASE_SECONDS / 4)
+    
+    async def _run(self, job: Dict) -> None:
+        """
+        Run a job from its last checkpoint to the end of its input.
+        
+        Args:
+            job: BatchJob fields, updated as the job progresses
+        """
+        # Jobs may have been created by a process with a higher limit.
+        parallelism = min(job["parallelism"], self.parallelism)
+        job_slots = asyncio.Semaphore(parallelism)
+        window = parallelism * WINDOW_FACTOR
+        pending: Deque[Tuple[int, int, Optional[asyncio.Task]]] = deque()
+        try:
+            with open(job["input_file"], "rb") as source, open(job["output_file"], "ab") as sink:
+                if sink.seek(0, os.SEEK_END) < job["output_offset"]:
+                    raise OSError("the output file is shorter than its last checkpoint")
+                # Results written after the last checkpoint are produced again.
+                sink.truncate(job["output_offset"])
+                source.seek(job["input_offset"])
+                line = job["next_line"]
+                end_of_input = False
+                checkpointed = time.monotonic()
+                
+                while True:
+                    while not end_of_input and len(pending) < window:
+                        raw = source.readline()
+                        if not raw:
+                            end_of_input = True
+                            break
+                        task = None
+                        if raw.strip():
+                            task = asyncio.create_task(self._execute(job, job_slots, line, raw))
+                        pending.append((line, source.tell(), task))
+                        line += 1
+                    if not pending:
+                        break
+                    
+                    head_line, head_offset, task = pending[0]
+                    if task is not None and not task.done():
+                        await asyncio.wait({task}, timeout=Config.BATCH_CHECKPOINT_INTERVAL)
+                    if task is None or task.done():
+                        pending.popleft()
+                        if task is not None:
+                            self._write_result(job, sink, *task.result())
+                        job["next_line"] = head_line + 1
+                        job["input_offset"] = head_offset
+                    
+                    if time.monotonic() - checkpointed >= Config.BATCH_CHECKPOINT_INTERVAL:
+                        await self._checkpoint(job, sink)
+                        checkpointed = time.monotonic()
+                
+                job["status"] = "completed"
+                await self._checkpoint(job, sink)
+            logger.info(
+                f"Batch job {job['id']} completed: {job['completed']} succeeded, {job['failed']} failed"
+            )
+        except (_JobLost, asyncio.CancelledError):
+            logger.info(f"Batch job {job['id']} stopped in this process")
+        except Exception as e:
+            logger.error(f"Batch job {job['id']} failed: {str(e)}")
+            job["status"] = "failed"
+            job["error"] = str(e)
+            try:
+                await self._checkpoint(job, None)
+            except Exception as checkpoint_error:
+                logger.error(f"Failed to record the failure of batch job {job['id']}: {checkpoint_error}")
+        finally:
+            for _, _, task in pending:
+                if task is not None:
+                    task.cancel()
+            self._jobs.pop(job["id"], None)
+            self._tasks.pop(job["id"], None)
+    
+    async def _execute(self, job: Dict, job_slots: asyncio.Semaphore, line: int, raw: bytes) -> Tuple[Dict, Dict]:
+        """
+        Send one request, retrying overload and transient upstream errors.
+        
+        Args:
+            job: BatchJob fields
+            job_slots: The job's own limit on requests in flight
+            line: Line number of the request
+            raw: The input line
+        
+        Returns:
+            Tuple[Dict, Dict]: Output record and token usage
+        """
+        record = {"id": f"{job['id']}-{line}", "custom_id": f"line-{line}", "line": line, "response": None, "error": None}
+        try:
+            record["custom_id"], body = parse_request(raw, line, job["model"])
+        except ValueError as e:
+            BATCH_REQUESTS.labels(outcome="failed").inc()
+            record["error"] = {"code": "invalid_request", "message": str(e)}
+            return record, {}
+        
+        async with job_slots, self._slots:
+            for attempt in range(1, Config.BATCH_MAX_ATTEMPTS + 1):
+                try:
+                    result = await self.proxy.chat_completion(body)
+                except (AdmissionTimeout, httpx.HTTPError) as e:
+                    status_code = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+                    retryable = status_code is None or status_code in RETRYABLE_STATUS_CODES
+                    if retryable and attempt < Config.BATCH_MAX_ATTEMPTS:
+                        BATCH_REQUESTS.labels(outcome="retried").inc()
+                        await asyncio.sleep(retry_delay(e, attempt))
+                        continue
+                    error = {"code": status_code or type(e).__name__, "message": str(e)}
+                except Exception as e:
+                    error = {"code": type(e).__name__, "message": str(e)}
+                else:
+                    BATCH_REQUESTS.labels(outcome="completed").inc()
+                    record["response"] = {"status_code": 200, "body": result}
+                    return record, result.get("usage") or {}
+                
+                BATCH_REQUESTS.labels(outcome="failed").inc()
+                record["error"] = error
+                return record, {}
+    
+    @staticmethod
+    def _write_result(job: Dict, sink, record: Dict, usage: Dict) -> None:
+        """
+        Append a result to the output file and count it.
+        
+        Args:
+            job: BatchJob fields
+            sink: Output file
+            record: Output record
+            usage: Token usage of the response
+        """
+        sink.write(json.dumps(record, ensure_ascii=False).encode() + b"\n")
+        if record["error"] is None:
+            job["completed"] += 1
+        else:
+            job["failed"] += 1
+        job["prompt_tokens"] += usage.get("prompt_tokens") or 0
+        job["completion_tokens"] += usage.get("completion_tokens") or 0
+        job["updated_at"] = time.time()
+    
+    async def _checkpoint(self, job: Dict, sink) -> None:
+        """
+        Make the written results durable, then save the job's progress.
+        
+        Args:
+            job: BatchJob fields
+            sink: Output file, or None to save only the status
+        
+        Raises:
+            _JobLost: If the job was cancelled or taken over meanwhile
+        """
+        from orcestator.db import checkpoint_batch_job
+        
+        if sink is not None:
+            sink.flush()
+            await asyncio.to_thread(os.fsync, sink.fileno())
+            job["output_offset"] = sink.tell()
+        
+        now = time.time()
+        job["updated_at"] = now
+        finished = job["status"] in FINISHED_STATUSES
+        job["lease_until"] = 0.0 if finished else now + LEASE_SECONDS
+        if finished:
+            job["finished_at"] = now
+        
+        fields = {
+            key: job[key]
+            for key in (
+                "status", "next_line", "input_offset", "output_offset", "completed", "failed",
+                "prompt_tokens", "completion_tokens", "lease_until", "updated_at",
+                "run_started_at", "run_start_done", "finished_at", "error",
+            )
+        }
+        if not await asyncio.to_thread(checkpoint_batch_job, job["id"], self.owner, fields):
+            raise _JobLost(job["id"])
+
+
+async def batch_response(runner: Optional[BatchRunner], action: str, *args) -> JSONResponse:
+    """
+    Call a BatchRunner method for an HTTP endpoint.
+    
+    Args:
+        runner: The process's runner, or None if batch jobs are unavailable
+        action: Method name: submit, status, list or cancel
+        *args: Method arguments
+    
+    Returns:
+        JSONResponse: The result, or an error with status 400, 404 or 503
+    """
+    if runner is None:
+        return JSONResponse({"error": "Batch jobs need OR_DB_PATH to be set"}, status_code=503)
+    try:
+        result = await getattr(runner, action)(*args)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except KeyError as e:
+        return JSONResponse({"error": f"Batch job not found: {e.args[0]}"}, status_code=404)
+    if action == "list":
+        return JSONResponse({"object": "list", "data": result})
+    return JSONResponse(result)
@@ -0,0 +1,226 @@
+"""
+Content-addressed storage of request log message bodies.
+Chat clients resend the same system prompt and conversation prefix on
+every turn, so each message is stored once, compressed, in a blob table
+keyed by the hash of its content. A request references its message list
+through a manifest blob holding the hashes of its messages, and its
+response through the blob of the response text; a new turn of a
+conversation only adds its new messages and a small manifest.
+"""
+
+import hashlib
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+# Hash, codec, uncompressed size and stored bytes, in blob table column order.
+Blob = Tuple[str, str, int, bytes]
+
+BLOB_COLUMNS = ["hash", "codec", "size", "data"]
+
+# Entry fields replaced by blob references.
+BODY_FIELDS = ("messages", "user_message", "assistant_message")
+
+# Shorter bodies are stored uncompressed; compression only adds overhead.
+MIN_COMPRESS_SIZE = 64
+
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+
+# Hashes of recently written blobs, so repeated messages are neither
+# compressed nor inserted again.
+KNOWN_HASHES = 65536
+
+_local = threading.local()
+
+
+def blob_hash(data: bytes) -> str:
+    """
+    Hash a blob's content.
+    
+    Args:
+        data: Uncompressed content
+    
+    Returns:
+        str: 128-bit BLAKE2b digest in hex
+    """
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def compress(data: bytes) -> Tuple[str, bytes]:
+    """
+    Compress a blob with zstd if zstandard is installed, else with zlib.
+    
+    Args:
+        data: Uncompressed content
+    
+    Returns:
+        Tuple[str, bytes]: Codec ("zstd", "zlib" or "raw") and stored bytes
+    """
+    if len(data) < MIN_COMPRESS_SIZE:
+        return "raw", data
+    if zstandard is not None:
+        # Compressor objects are not thread-safe.
+        compressor = getattr(_local, "compressor", None)
+        if compressor is None:
+            compressor = _local.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        codec, packed = "zstd", compressor.compress(data)
+    else:
+        codec, packed = "zlib", zlib.compress(data, ZLIB_LEVEL)
+    if len(packed) >= len(data):
+        return "raw", data
+    return codec, packed
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    """
+    Restore a blob's content.
+    
+    Args:
+        codec: Codec the blob was stored with
+        data: Stored bytes
+    
+    Returns:
+        bytes: Uncompressed content
+    
+    Raises:
+        RuntimeError: If the blob is zstd-compressed and zstandard is not installed
+        ValueError: If the codec is unknown
+    """
+    if codec == "raw":
+        return data
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Reading zstd-compressed request log bodies needs zstandard (pip install zstandard)")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown blob codec: {codec}")
+
+
+def encode_message(message: Dict) -> bytes:
+    """
+    Serialize a message canonically, so equal messages hash equally.
+    
+    Uses orjson when available; both produce compact UTF-8 JSON with
+    sorted keys.
+    
+    Args:
+        message: Chat message
+    
+    Returns:
+        bytes: Compact JSON with sorted keys
+    """
+    if orjson is not None:
+        return orjson.dumps(message, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(message, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode()
+
+
+class BlobEncoder:
+    """
+    Turns request log entries into rows that reference blobs, plus the blobs.
+    
+    Blobs written recently are remembered by hash and left out of later
+    batches; the blob table is written with INSERT OR IGNORE, so a blob
+    that was forgotten, or written by another process, is simply
+    deduplicated by the database.
+    """
+    
+    def __init__(self, known_hashes: int = KNOWN_HASHES):
+        """
+        Initialize the encoder.
+        
+        Args:
+            known_hashes: Number of written blob hashes to remember
+        """
+        self.known_hashes = known_hashes
+        self._known: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _add(self, data: bytes, blobs: Dict[str, Blob]) -> str:
+        """
+        Reference a blob, compressing it unless it is already stored.
+        
+        Args:
+            data: Uncompressed content
+            blobs: New blobs of the batch, by hash
+        
+        Returns:
+            str: The blob's hash
+        """
+        digest = blob_hash(data)
+        if digest in self._known:
+            self._known.move_to_end(digest)
+        elif digest not in blobs:
+            codec, packed = compress(data)
+            blobs[digest] = (digest, codec, len(data), packed)
+        return digest
+    
+    def encode(self, entries: List[Dict]) -> Tuple[List[Dict], List[Blob]]:
+        """
+        Replace the message bodies of log entries with blob hashes.
+        
+        Entries without a `messages` list are stored as a single user
+        message holding `user_message`.
+        
+        Args:
+            entries: Log entries
+        
+        Returns:
+            Tuple[List[Dict], List[Blob]]: Rows with `messages_hash` and
+            `response_hash` instead of the bodies, and the blobs to insert
+        """
+        rows = []
+        blobs: Dict[str, Blob] = {}
+        with self._lock:
+            for entry in entries:
+                messages = entry.get("messages")
+                if messages is None:
+                    messages = [{"role": "user", "content": entry.get("user_message") or ""}]
+                hashes = [self._add(encode_message(message), blobs) for message in messages]
+                
+                row = {key: value for key, value in entry.items() if key not in BODY_FIELDS}
+                row["messages_hash"] = self._add(json.dumps(hashes, separators=(",", ":")).encode(), blobs)
+                row["response_hash"] = self._add((entry.get("assistant_message") or "").encode(), blobs)
+                rows.append(row)
+        return rows, list(blobs.values())
+    
+    def remember(self, blobs: List[Blob]) -> None:
+        """
+        Record blobs as stored once their transaction has committed.
+        
+        Args:
+            blobs: Blobs returned by encode
+        """
+        with self._lock:
+            for blob in blobs:
+                self._known[blob[0]] = None
+            while len(self._known) > self.known_hashes:
+                self._known.popitem(last=False)
+
+
+def decode_messages(manifest: bytes, load: Callable[[str], bytes]) -> List[Dict]:
+    """
+    Rebuild a message list from its manifest blob.
+    
+    Args:
+        manifest: Uncompressed manifest content
+        load: Callable returning the uncompressed content of a blob hash
+    
+    Returns:
+        List[Dict]: The messages, in order
+    """
+    return [json.loads(load(digest)) for digest in json.loads(manifest)]
+
@@ -0,0 +1,197 @@
+"""
+Response cache for Orcestator.
+Serves repeated deterministic chat completions without an upstream call.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from orcestator.logger import CACHE_EVICTIONS, CACHE_HITS, CACHE_MISSES
+
+logger = logging.getLogger("orcestator")
+
+# Fields that change how a completion is delivered, not what it is.
+TRANSPORT_FIELDS = ("stream", "stream_options")
+
+
+def is_deterministic(request_data: Dict) -> bool:
+    """
+    Check whether a request samples deterministically and may be cached.
+    
+    Args:
+        request_data: Upstream request body
+        
+    Returns:
+        bool: True if temperature is zero
+    """
+    return float(request_data.get("temperature", 1.0)) <= 0.0
+
+
+def cache_key(request_data: Dict) -> str:
+    """
+    Compute a canonical hash of the fields that determine a completion.
+    
+    Every field of the upstream request counts, including parameters an
+    alias adds such as `seed` or `response_format`, except the transport
+    fields.
+    
+    Args:
+        request_data: Upstream request body
+        
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    canonical = {field: value for field, value in request_data.items() if field not in TRANSPORT_FIELDS}
+    payload = json.dumps(canonical, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    LRU cache with TTL expiry and a memory cap, plus an optional on-disk tier.
+    
+    Entries are dicts with `text`, `prompt_tokens`, `completion_tokens` and
+    `finish_reason`. The disk tier stores one JSON file per key under
+    `cache_dir` and is consulted on memory misses; hits are promoted back
+    into memory.
+    """
+    
+    def __init__(
+        self,
+        ttl: float,
+        max_entries: int,
+        max_bytes: int,
+        cache_dir: Optional[str] = None,
+    ):
+        """
+        Initialize the cache.
+        
+        Args:
+            ttl: Seconds an entry stays valid
+            max_entries: Maximum number of entries kept in memory
+            max_bytes: Approximate memory cap for cached text
+            cache_dir: Directory for the on-disk tier, or None to disable it
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        
+        self._entries: "OrderedDict[str, Tuple[float, int, Dict]]" = OrderedDict()
+        self._bytes = 0
+        
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    @staticmethod
+    def _size(entry: Dict) -> int:
+        """Approximate the memory held by an entry."""
+        return len(entry.get("text", "").encode("utf-8")) + 256
+    
+    def _disk_path(self, key: str) -> Path:
+        """Path of the on-disk file for a key."""
+        return self.cache_dir / key[:2] / f"{key}.json"
+    
+    def _remove(self, key: str) -> None:
+        """Remove a key from memory."""
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+    
+    def _store(self, key: str, expires_at: float, entry: Dict) -> None:
+        """Insert an entry in memory and evict down to the configured caps."""
+        if key in self._entries:
+            self._remove(key)
+        
+        size = self._size(entry)
+        self._entries[key] = (expires_at, size, entry)
+        self._bytes += size
+        
+        while self._entries and len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            CACHE_EVICTIONS.labels(reason="lru").inc()
+        while self._entries and self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            CACHE_EVICTIONS.labels(reason="memory").inc()
+    
+    def _read_disk(self, key: str) -> Optional[Tuple[float, Dict]]:
+        """Read a valid entry from the disk tier, deleting it if expired."""
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        if record["expires_at"] <= time.time():
+            path.unlink(missing_ok=True)
+            CACHE_EVICTIONS.labels(reason="ttl").inc()
+            return None
+        
+        return record["expires_at"], record["entry"]
+    
+    def _write_disk(self, key: str, expires_at: float, entry: Dict) -> None:
+        """Atomically write an entry to the disk tier."""
+        path = self._disk_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": expires_at, "entry": entry}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry to disk: {str(e)}")
+    
+    async def get(self, key: str) -> Optional[Dict]:
+        """
+        Look up an entry, checking memory first and then the disk tier.
+        
+        Args:
+            key: Cache key from cache_key()
+            
+        Returns:
+            Optional[Dict]: The cached entry, or None on a miss
+        """
+        item = self._entries.get(key)
+        if item is not None:
+            expires_at, _, entry = item
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                CACHE_HITS.labels(tier="memory").inc()
+                return entry
+            self._remove(key)
+            CACHE_EVICTIONS.labels(reason="ttl").inc()
+        
+        if self.cache_dir is not None:
+            record = await asyncio.to_thread(self._read_disk, key)
+            if record is not None:
+                expires_at, entry = record
+                self._store(key, expires_at, entry)
+                CACHE_HITS.labels(tier="disk").inc()
+                return entry
+        
+        CACHE_MISSES.inc()
+        return None
+    
+    async def put(self, key: str, entry: Dict) -> None:
+        """
+        Store an entry in memory and, if enabled, on disk.
+        
+        Args:
+            key: Cache key from cache_key()
+            entry: Completion text, token counts and finish reason
+        """
+        expires_at = time.time() + self.ttl
+        self._store(key, expires_at, entry)
+        
+        if self.cache_dir is not None:
+            await asyncio.to_thread(self._write_disk, key, expires_at, entry)
@@ -0,0 +1,114 @@
+"""
+In-flight request coalescing for Orcestator.
+Lets identical concurrent requests share one upstream call.
+"""
+
+import asyncio
+from typing import AsyncGenerator, AsyncIterator, Callable, Dict, List, Optional
+
+from orcestator.logger import COALESCED_REQUESTS
+
+
+class _Flight:
+    """One in-progress upstream call and the items it has produced so far."""
+    
+    def __init__(self):
+        self.items: List[Dict] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self.changed = asyncio.Event()
+    
+    def notify(self) -> None:
+        """Wake every subscriber waiting for new items."""
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class SingleFlight:
+    """
+    Single-flight layer keyed by canonical request hash.
+    
+    The first subscriber for a key starts the upstream call in a background
+    task; later subscribers with the same key replay the items produced so
+    far and then follow the live stream. The upstream call is cancelled
+    once every subscriber has gone away.
+    """
+    
+    def __init__(self):
+        """Initialize an empty flight table."""
+        self._flights: Dict[str, _Flight] = {}
+    
+    def __len__(self) -> int:
+        return len(self._flights)
+    
+    async def subscribe(
+        self,
+        key: str,
+        factory: Callable[[], AsyncIterator[Dict]],
+    ) -> AsyncGenerator[Dict, None]:
+        """
+        Subscribe to the flight for a key, starting it if needed.
+        
+        Args:
+            key: Canonical request key
+            factory: Creates the upstream item iterator for a new flight
+            
+        Yields:
+            Dict: Items produced by the shared upstream call
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run(key, flight, factory))
+            COALESCED_REQUESTS.labels(role="leader").inc()
+        else:
+            COALESCED_REQUESTS.labels(role="follower").inc()
+        
+        flight.subscribers += 1
+        try:
+            index = 0
+            while True:
+                changed = flight.changed
+                while index < len(flight.items):
+                    yield flight.items[index]
+                    index += 1
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await changed.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done and flight.task is not None:
+                flight.task.cancel()
+    
+    async def _run(
+        self,
+        key: str,
+        flight: _Flight,
+        factory: Callable[[], AsyncIterator[Dict]],
+    ) -> None:
+        """
+        Drive the upstream iterator and publish its items to subscribers.
+        
+        Args:
+            key: Canonical request key
+            flight: Flight to publish to
+            factory: Creates the upstream item iterator
+        """
+        try:
+            async for item in factory():
+                flight.items.append(item)
+                flight.notify()
+        except asyncio.CancelledError as e:
+            flight.error = e
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.notify()
@@ -3,13 +3,37 @@ Configuration module for Orcestator.
 Handles environment variables and settings.
 """
 
+import functools
+import json
 import os
-from typing import Optional
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
+def _env_bool(name: str, default: str) -> bool:
+    """Read a boolean flag from the environment."""
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+@functools.lru_cache(maxsize=None)
+def _json_map(raw: str) -> Dict:
+    """
+    Parse a per-model JSON setting once per distinct value.
+    
+    The per-model lookups run on every request; invalid values are not
+    cached, so they raise again for validate() to report.
+    
+    Args:
+        raw: JSON object from an environment variable
+    
+    Returns:
+        Dict: The parsed object, shared between calls and not to be modified
+    """
+    return json.loads(raw)
+
+
 class Config:
     """Configuration class for Orcestator."""
 
@@ -18,15 +42,232 @@ class Config:
 
     API_KEY: str = os.getenv("OR_API_KEY", "")
     DEFAULT_MODEL: str = os.getenv("OR_DEFAULT_MODEL", "openai/gpt-4o")
+    ALIAS_FILE: Optional[str] = os.getenv("OR_ALIAS_FILE", None)
+    ALIAS_RELOAD_INTERVAL: float = float(os.getenv("OR_ALIAS_RELOAD_INTERVAL", "2.0"))
 
     LOG_FILE: str = os.getenv("OR_LOG_FILE", "logs/traffic.log")
     DB_PATH: Optional[str] = os.getenv("OR_DB_PATH", None)
+    DB_BACKEND: str = os.getenv("OR_DB_BACKEND", "bulk").lower()
     LOG_LEVEL: str = os.getenv("OR_LOG_LEVEL", "info").upper()
 
+    LOG_QUEUE_SIZE: int = int(os.getenv("OR_LOG_QUEUE_SIZE", "10000"))
+    LOG_BATCH_SIZE: int = int(os.getenv("OR_LOG_BATCH_SIZE", "256"))
+    LOG_FLUSH_INTERVAL: float = float(os.getenv("OR_LOG_FLUSH_INTERVAL", "1.0"))
+    LOG_OVERFLOW_POLICY: str = os.getenv("OR_LOG_OVERFLOW_POLICY", "drop").lower()
+    LOG_SAMPLE_EVERY: int = int(os.getenv("OR_LOG_SAMPLE_EVERY", "10"))
+    LOG_FORMAT: str = os.getenv("OR_LOG_FORMAT", "csv").lower()
+    LOG_ROTATE_BYTES: int = int(os.getenv("OR_LOG_ROTATE_BYTES", str(100 * 1024 * 1024)))
+    LOG_ROTATE_INTERVAL: float = float(os.getenv("OR_LOG_ROTATE_INTERVAL", "86400"))
+    LOG_COMPRESS: bool = _env_bool("OR_LOG_COMPRESS", "true")
+    LOG_ROW_GROUP_SIZE: int = int(os.getenv("OR_LOG_ROW_GROUP_SIZE", "10000"))
+
+    STREAM_DELTAS: bool = _env_bool("OR_STREAM_DELTAS", "false")
+
+    CACHE_ENABLED: bool = _env_bool("OR_CACHE_ENABLED", "false")
+    CACHE_TTL: float = float(os.getenv("OR_CACHE_TTL", "3600"))
+    CACHE_MAX_ENTRIES: int = int(os.getenv("OR_CACHE_MAX_ENTRIES", "10000"))
+    CACHE_MAX_BYTES: int = int(os.getenv("OR_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    CACHE_DIR: Optional[str] = os.getenv("OR_CACHE_DIR", None)
+    CACHE_REPLAY_CHUNK: int = int(os.getenv("OR_CACHE_REPLAY_CHUNK", "64"))
+    
+    SEMANTIC_CACHE_ENABLED: bool = _env_bool("OR_SEMANTIC_CACHE_ENABLED", "false")
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("OR_SEMANTIC_CACHE_THRESHOLD", "0.97"))
+    SEMANTIC_CACHE_MODELS: str = os.getenv("OR_SEMANTIC_CACHE_MODELS", "")
+    SEMANTIC_CACHE_TTL: float = float(os.getenv("OR_SEMANTIC_CACHE_TTL", "3600"))
+    SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv("OR_SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+    SEMANTIC_CACHE_DIM: int = int(os.getenv("OR_SEMANTIC_CACHE_DIM", "512"))
+
+    TOKENIZER_MODELS: str = os.getenv("OR_TOKENIZER_MODELS", "")
+    CONTEXT_BUDGET: int = int(os.getenv("OR_CONTEXT_BUDGET", "0"))
+    CONTEXT_BUDGETS: str = os.getenv("OR_CONTEXT_BUDGETS", "")
+
+    COALESCE_ENABLED: bool = _env_bool("OR_COALESCE_ENABLED", "false")
+
+    HEDGE_ENABLED: bool = _env_bool("OR_HEDGE_ENABLED", "false")
+    HEDGE_PERCENTILE: float = float(os.getenv("OR_HEDGE_PERCENTILE", "0.95"))
+    HEDGE_MIN_DELAY: float = float(os.getenv("OR_HEDGE_MIN_DELAY", "0.5"))
+    HEDGE_MIN_SAMPLES: int = int(os.getenv("OR_HEDGE_MIN_SAMPLES", "20"))
+    HEDGE_WINDOW: int = int(os.getenv("OR_HEDGE_WINDOW", "200"))
+    HEDGE_BUDGET: float = float(os.getenv("OR_HEDGE_BUDGET", "0.05"))
+    HEDGE_BURST: float = float(os.getenv("OR_HEDGE_BURST", "5"))
+    HEDGE_MODELS: str = os.getenv("OR_HEDGE_MODELS", "")
+
+    UPSTREAM_BASE_URL: str = os.getenv("OR_UPSTREAM_BASE_URL", "https://openrouter.ai/api/v1")
+    UPSTREAM_HTTP2: bool = _env_bool("OR_UPSTREAM_HTTP2", "true")
+    UPSTREAM_MAX_CONNECTIONS: int = int(os.getenv("OR_UPSTREAM_MAX_CONNECTIONS", "100"))
+    UPSTREAM_MAX_KEEPALIVE: int = int(os.getenv("OR_UPSTREAM_MAX_KEEPALIVE", "20"))
+    UPSTREAM_KEEPALIVE_EXPIRY: float = float(os.getenv("OR_UPSTREAM_KEEPALIVE_EXPIRY", "30.0"))
+    UPSTREAM_CONNECT_TIMEOUT: float = float(os.getenv("OR_UPSTREAM_CONNECT_TIMEOUT", "5.0"))
+    UPSTREAM_READ_TIMEOUT: float = float(os.getenv("OR_UPSTREAM_READ_TIMEOUT", "60.0"))
+    UPSTREAM_WRITE_TIMEOUT: float = float(os.getenv("OR_UPSTREAM_WRITE_TIMEOUT", "10.0"))
+    UPSTREAM_POOL_TIMEOUT: float = float(os.getenv("OR_UPSTREAM_POOL_TIMEOUT", "10.0"))
+    UPSTREAM_WARM_CONNECTIONS: int = int(os.getenv("OR_UPSTREAM_WARM_CONNECTIONS", "2"))
+    UPSTREAMS: str = os.getenv("OR_UPSTREAMS", "")
+
+    LIMITER_ENABLED: bool = _env_bool("OR_LIMITER_ENABLED", "false")
+    LIMITER_INITIAL: int = int(os.getenv("OR_LIMITER_INITIAL", "10"))
+    LIMITER_MIN: int = int(os.getenv("OR_LIMITER_MIN", "2"))
+    LIMITER_MAX: int = int(os.getenv("OR_LIMITER_MAX", "200"))
+    LIMITER_LATENCY_TOLERANCE: float = float(os.getenv("OR_LIMITER_LATENCY_TOLERANCE", "2.0"))
+    QUEUE_DEADLINE_INTERACTIVE: float = float(os.getenv("OR_QUEUE_DEADLINE_INTERACTIVE", "10.0"))
+    QUEUE_DEADLINE_BATCH: float = float(os.getenv("OR_QUEUE_DEADLINE_BATCH", "120.0"))
+
+    BATCH_DIR: str = os.getenv("OR_BATCH_DIR", "batches")
+    BATCH_PARALLELISM: int = int(os.getenv("OR_BATCH_PARALLELISM", "8"))
+    BATCH_MAX_ATTEMPTS: int = int(os.getenv("OR_BATCH_MAX_ATTEMPTS", "3"))
+    BATCH_CHECKPOINT_INTERVAL: float = float(os.getenv("OR_BATCH_CHECKPOINT_INTERVAL", "1.0"))
+
+    RATE_LIMIT_ENABLED: bool = _env_bool("OR_RATE_LIMIT_ENABLED", "false")
+    RATE_LIMIT_RPS: float = float(os.getenv("OR_RATE_LIMIT_RPS", "2.0"))
+    RATE_LIMIT_BURST: int = int(os.getenv("OR_RATE_LIMIT_BURST", "10"))
+    RATE_LIMIT_TPM: int = int(os.getenv("OR_RATE_LIMIT_TPM", "100000"))
+    RATE_LIMIT_MODELS: str = os.getenv("OR_RATE_LIMIT_MODELS", "")
+    RATE_LIMIT_PERSIST: bool = _env_bool("OR_RATE_LIMIT_PERSIST", "false")
+    RATE_LIMIT_SNAPSHOT_INTERVAL: float = float(os.getenv("OR_RATE_LIMIT_SNAPSHOT_INTERVAL", "30.0"))
+
+    ROUTER_EWMA_ALPHA: float = float(os.getenv("OR_ROUTER_EWMA_ALPHA", "0.2"))
+    ROUTER_MAX_ATTEMPTS: int = int(os.getenv("OR_ROUTER_MAX_ATTEMPTS", "3"))
+    CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("OR_CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_COOLDOWN: float = float(os.getenv("OR_CIRCUIT_COOLDOWN", "30.0"))
+
     CONTROLLER_HOST: str = "0.0.0.0"
     CONTROLLER_PORT: int = 21001
     WORKER_PORT: int = 8002
+    CONTROLLER_WORKER_TTL: float = float(os.getenv("OR_CONTROLLER_WORKER_TTL", "3.0"))
+    LOAD_REPORT_INTERVAL: float = float(os.getenv("OR_LOAD_REPORT_INTERVAL", "0.5"))
+    DISPATCH_CACHE_TTL: float = float(os.getenv("OR_DISPATCH_CACHE_TTL", "1.0"))
+
+    @classmethod
+    def upstreams(cls) -> List[Dict[str, str]]:
+        """
+        Get the configured upstream endpoints.
+        
+        OR_UPSTREAMS holds a JSON list of objects with `name`, `base_url`
+        and either `api_key` or a list of `api_keys`; every key becomes its
+        own endpoint. Without it, OpenRouter with OR_API_KEY is used.
+        
+        Returns:
+            List[Dict[str, str]]: Endpoints with name, base_url and api_key
+        """
+        if not cls.UPSTREAMS:
+            return [{"name": "openrouter", "base_url": cls.UPSTREAM_BASE_URL, "api_key": cls.API_KEY}]
+        
+        endpoints = []
+        for upstream in json.loads(cls.UPSTREAMS):
+            keys = upstream.get("api_keys") or [upstream.get("api_key", "")]
+            for index, key in enumerate(keys):
+                name = upstream["name"] if len(keys) == 1 else f"{upstream['name']}#{index}"
+                endpoints.append({"name": name, "base_url": upstream["base_url"], "api_key": key})
+        return endpoints
+
+    @classmethod
+    def rate_limits(cls, model: str) -> Dict[str, float]:
+        """
+        Get the rate limits that apply to a requested model.
+        
+        OR_RATE_LIMIT_MODELS holds a JSON object mapping requested models
+        or aliases to any of `rps`, `burst` and `tpm`, overriding the
+        global limits. A limit of 0 disables that bucket.
+        
+        Args:
+            model: Model or alias requested by the client
+            
+        Returns:
+            Dict[str, float]: Limits with rps, burst and tpm
+        """
+        limits = {"rps": cls.RATE_LIMIT_RPS, "burst": cls.RATE_LIMIT_BURST, "tpm": cls.RATE_LIMIT_TPM}
+        if cls.RATE_LIMIT_MODELS:
+            limits.update(_json_map(cls.RATE_LIMIT_MODELS).get(model, {}))
+        return limits
 
+    @classmethod
+    def has_rate_limits(cls, model: str) -> bool:
+        """
+        Check whether OR_RATE_LIMIT_MODELS sets limits for a requested model.
+        
+        Args:
+            model: Model or alias requested by the client
+            
+        Returns:
+            bool: True if the model has an entry of its own
+        """
+        return bool(cls.RATE_LIMIT_MODELS) and model in _json_map(cls.RATE_LIMIT_MODELS)
+
+    @classmethod
+    def semantic_threshold(cls, model: str) -> float:
+        """
+        Get the semantic cache similarity threshold for a target model.
+        
+        OR_SEMANTIC_CACHE_MODELS holds a JSON object mapping target models
+        to thresholds, overriding OR_SEMANTIC_CACHE_THRESHOLD. A threshold
+        above 1 disables the semantic cache for that model.
+        
+        Args:
+            model: Upstream model name
+        
+        Returns:
+            float: Minimum cosine similarity for a hit
+        """
+        if cls.SEMANTIC_CACHE_MODELS:
+            return float(_json_map(cls.SEMANTIC_CACHE_MODELS).get(model, cls.SEMANTIC_CACHE_THRESHOLD))
+        return cls.SEMANTIC_CACHE_THRESHOLD
+    
+    @classmethod
+    def hedge_model(cls, model: str) -> str:
+        """
+        Get the model a hedge of a request for a target model is sent to.
+        
+        OR_HEDGE_MODELS holds a JSON object mapping target models to
+        alternate models; other models are hedged with themselves.
+        
+        Args:
+            model: Upstream model name
+        
+        Returns:
+            str: Upstream model name for the duplicate request
+        """
+        if cls.HEDGE_MODELS:
+            return _json_map(cls.HEDGE_MODELS).get(model, model)
+        return model
+    
+    @classmethod
+    def tokenizer_encoding(cls, model: str) -> Optional[str]:
+        """
+        Get the configured tokenizer for a target model.
+        
+        OR_TOKENIZER_MODELS holds a JSON object mapping target models to a
+        tiktoken encoding name, a path to a `tokenizer.json` file or
+        "heuristic".
+        
+        Args:
+            model: Upstream model name
+        
+        Returns:
+            Optional[str]: Tokenizer name, or None to pick one by model name
+        """
+        if cls.TOKENIZER_MODELS:
+            return _json_map(cls.TOKENIZER_MODELS).get(model)
+        return None
+    
+    @classmethod
+    def context_budget(cls, model: str) -> int:
+        """
+        Get the prompt token budget for a target model.
+        
+        OR_CONTEXT_BUDGETS holds a JSON object mapping target models to
+        budgets, overriding OR_CONTEXT_BUDGET. A budget of 0 disables
+        context trimming.
+        
+        Args:
+            model: Upstream model name
+        
+        Returns:
+            int: Maximum prompt tokens sent upstream
+        """
+        if cls.CONTEXT_BUDGETS:
+            return int(_json_map(cls.CONTEXT_BUDGETS).get(model, cls.CONTEXT_BUDGET))
+        return cls.CONTEXT_BUDGET
+    
     @classmethod
     def validate(cls) -> bool:
         """
@@ -35,8 +276,77 @@ class Config:
         Returns:
             bool: True if configuration is valid, False otherwise.
         """
-        if not cls.API_KEY:
+        if not cls.API_KEY and not cls.UPSTREAMS:
             print("ERROR: OR_API_KEY environment variable is required")
             return False
         
+        if cls.UPSTREAMS:
+            try:
+                cls.upstreams()
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"ERROR: OR_UPSTREAMS is not a valid upstream list: {e}")
+                return False
+        
+        if cls.RATE_LIMIT_MODELS:
+            try:
+                cls.rate_limits(cls.DEFAULT_MODEL)
+            except (ValueError, AttributeError) as e:
+                print(f"ERROR: OR_RATE_LIMIT_MODELS is not a valid JSON object: {e}")
+                return False
+        
+        if cls.SEMANTIC_CACHE_MODELS:
+            try:
+                cls.semantic_threshold(cls.DEFAULT_MODEL)
+            except (ValueError, AttributeError, TypeError) as e:
+                print(f"ERROR: OR_SEMANTIC_CACHE_MODELS is not a valid JSON object: {e}")
+                return False
+        
+        if cls.ALIAS_FILE:
+            from orcestator.aliases import AliasTable
+            
+            try:
+                with open(cls.ALIAS_FILE, encoding="utf-8") as f:
+                    AliasTable.from_dict(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"ERROR: OR_ALIAS_FILE {cls.ALIAS_FILE} could not be loaded: {e}")
+                return False
+        
+        if cls.HEDGE_MODELS:
+            try:
+                cls.hedge_model(cls.DEFAULT_MODEL)
+            except (ValueError, AttributeError) as e:
+                print(f"ERROR: OR_HEDGE_MODELS is not a valid JSON object: {e}")
+                return False
+        
+        if cls.TOKENIZER_MODELS:
+            try:
+                cls.tokenizer_encoding(cls.DEFAULT_MODEL)
+            except (ValueError, AttributeError) as e:
+                print(f"ERROR: OR_TOKENIZER_MODELS is not a valid JSON object: {e}")
+                return False
+        
+        if cls.CONTEXT_BUDGETS:
+            try:
+                cls.context_budget(cls.DEFAULT_MODEL)
+            except (ValueError, AttributeError, TypeError) as e:
+                print(f"ERROR: OR_CONTEXT_BUDGETS is not a valid JSON object: {e}")
+                return False
+        
+        if cls.DB_BACKEND not in ("bulk", "sqlmodel"):
+            print("ERROR: OR_DB_BACKEND must be one of: bulk, sqlmodel")
+            return False
+        
+        if cls.LOG_OVERFLOW_POLICY not in ("drop", "block", "sample"):
+            print("ERROR: OR_LOG_OVERFLOW_POLICY must be one of: drop, block, sample")
+            return False
+        
+        if cls.LOG_FORMAT not in ("csv", "arrow", "parquet"):
+            print("ERROR: OR_LOG_FORMAT must be one of: csv, arrow, parquet")
+            return False
+        
+        if cls.BATCH_PARALLELISM < 1 or cls.BATCH_MAX_ATTEMPTS < 1 or cls.BATCH_CHECKPOINT_INTERVAL <= 0:
+            print("ERROR: OR_BATCH_PARALLELISM and OR_BATCH_MAX_ATTEMPTS must be at least 1 "
+                  "and OR_BATCH_CHECKPOINT_INTERVAL positive")
+            return False
+        
         return True
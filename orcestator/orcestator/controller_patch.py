@@ -1,18 +1,323 @@
 """
-Optional extensions for FastChat controller.
-This module is not required for basic functionality.
+Load-aware controller for Orcestator.
+Extends FastChat's controller with the in-flight counts and service
+times that proxy workers report, dispatches each request to the worker
+with the shortest expected wait and evicts workers that stop reporting
+within seconds instead of FastChat's 90-second heartbeat expiry.
+
+Run with `python -m orcestator.controller_patch` in place of
+`python -m fastchat.serve.controller`.
 """
 
+import argparse
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from fastapi import Request
+from fastchat.serve import controller as fastchat_controller
+from fastchat.serve.controller import Controller, DispatchMethod, app
+
+from orcestator.config import Config
+from orcestator.dispatch import pick_worker
+
+logger = logging.getLogger("orcestator")
 
-from fastchat.serve.controller import Controller
+
+class WorkerLoad:
+    """Load of one worker as last reported, plus requests dispatched since."""
+    
+    __slots__ = ("in_flight", "capacity", "service_time", "reported", "reports_load")
+    
+    def __init__(self, in_flight: int, capacity: int, service_time: Optional[float]):
+        """
+        Initialize from a worker's status.
+        
+        Args:
+            in_flight: Requests running or queued on the worker
+            capacity: Requests the worker runs concurrently
+            service_time: Average seconds per request, or None if unknown
+        """
+        self.in_flight = in_flight
+        self.capacity = capacity
+        self.service_time = service_time
+        self.reported = time.time()
+        # Plain FastChat workers only send heartbeats and are expired by FastChat.
+        self.reports_load = False
+    
+    def entry(self, address: str) -> Dict:
+        """
+        Describe the worker for /list_workers.
+        
+        Args:
+            address: Worker address
+        
+        Returns:
+            Dict: Address and load
+        """
+        return {
+            "address": address,
+            "in_flight": self.in_flight,
+            "capacity": self.capacity,
+            "service_time": self.service_time,
+        }
 
 
 class EnhancedController(Controller):
     """
-    Enhanced version of FastChat's Controller with additional functionality.
-    This is a placeholder for future extensions.
+    FastChat controller that dispatches by reported worker load.
+    
+    Proxy workers post their in-flight count, concurrency limit and
+    average service time to /report_load a few times per second. Each
+    dispatch picks the worker with the least expected wait and counts the
+    request against it until the worker's next report. Workers that have
+    reported load once and then miss reports for `worker_ttl` seconds are
+    removed; the API server reads the same load from /list_workers to
+    dispatch without asking the controller per request.
     """
     
-    def __init__(self, *args, **kwargs):
-        """Initialize the enhanced controller."""
-        super().__init__(*args, **kwargs)
+    def __init__(self, dispatch_method: str = "shortest_queue", worker_ttl: float = Config.CONTROLLER_WORKER_TTL):
+        """
+        Initialize the controller and start evicting silent workers.
+        
+        Args:
+            dispatch_method: 'shortest_queue' for load-aware dispatch or
+                'lottery' for FastChat's speed-weighted lottery
+            worker_ttl: Seconds without a load report before a worker is removed
+        """
+        # Controller.__init__ starts FastChat's heartbeat expiry in a
+        # non-daemon thread, which keeps the process alive after uvicorn
+        # exits (e.g. when the port is taken), so the launcher would never
+        # see it crash. The same thread is started here as a daemon.
+        self.worker_info = {}
+        self.dispatch_method = DispatchMethod.from_str(dispatch_method)
+        self.heart_beat_thread = threading.Thread(
+            target=fastchat_controller.heart_beat_controller, args=(self,), daemon=True
+        )
+        self.heart_beat_thread.start()
+        self.worker_ttl = worker_ttl
+        self.loads: Dict[str, WorkerLoad] = {}
+        self._lock = threading.RLock()
+        self._reaper = threading.Thread(target=self._evict_loop, name="orcestator-reaper", daemon=True)
+        self._reaper.start()
+    
+    def register_worker(
+        self,
+        worker_name: str,
+        check_heart_beat: bool,
+        worker_status: dict,
+        multimodal: bool,
+    ) -> bool:
+        """
+        Register a worker and take its initial load from its status.
+        
+        Args:
+            worker_name: Worker address
+            check_heart_beat: Whether the worker is expired when silent
+            worker_status: Status sent by the worker, or None to fetch it
+            multimodal: Whether the worker accepts images
+        
+        Returns:
+            bool: True if the worker was registered
+        """
+        with self._lock:
+            if not super().register_worker(worker_name, check_heart_beat, worker_status, multimodal):
+                return False
+            info = self.worker_info[worker_name]
+            status = worker_status or {}
+            self.loads[worker_name] = WorkerLoad(
+                info.queue_length,
+                status.get("capacity", 1),
+                status.get("service_time"),
+            )
+            return True
+    
+    def remove_worker(self, worker_name: str) -> None:
+        """
+        Forget a worker.
+        
+        Args:
+            worker_name: Worker address
+        """
+        with self._lock:
+            self.worker_info.pop(worker_name, None)
+            self.loads.pop(worker_name, None)
+    
+    def refresh_all_workers(self) -> None:
+        """Re-register every worker from its current status."""
+        with self._lock:
+            self.loads = {}
+            super().refresh_all_workers()
+    
+    def report_load(
+        self,
+        worker_name: str,
+        in_flight: int,
+        capacity: int,
+        service_time: Optional[float],
+    ) -> bool:
+        """
+        Record the current load of a worker.
+        
+        Args:
+            worker_name: Worker address
+            in_flight: Requests running or queued on the worker
+            capacity: Requests the worker runs concurrently
+            service_time: Average seconds per request, or None if unknown
+        
+        Returns:
+            bool: False if the worker is unknown and must register again
+        """
+        with self._lock:
+            load = self.loads.get(worker_name)
+            if load is None:
+                return False
+            load.in_flight = in_flight
+            load.capacity = capacity
+            load.service_time = service_time
+            load.reported = time.time()
+            load.reports_load = True
+            info = self.worker_info[worker_name]
+            info.queue_length = in_flight
+            info.last_heart_beat = load.reported
+            return True
+    
+    def receive_heart_beat(self, worker_name: str, queue_length: int) -> bool:
+        """
+        Record a FastChat heartbeat.
+        
+        Workers that do not report load are dispatched by the queue
+        length their heartbeats carry.
+        
+        Args:
+            worker_name: Worker address
+            queue_length: Requests running or queued on the worker
+        
+        Returns:
+            bool: False if the worker is unknown and must register again
+        """
+        with self._lock:
+            if not super().receive_heart_beat(worker_name, queue_length):
+                return False
+            load = self.loads[worker_name]
+            if not load.reports_load:
+                load.in_flight = queue_length
+            return True
+    
+    def list_workers(self) -> Dict[str, List[Dict]]:
+        """
+        List the workers of every model with their load.
+        
+        Returns:
+            Dict[str, List[Dict]]: Worker entries by model name
+        """
+        with self._lock:
+            workers: Dict[str, List[Dict]] = {}
+            for worker_name, info in self.worker_info.items():
+                entry = self.loads[worker_name].entry(worker_name)
+                for model_name in info.model_names:
+                    workers.setdefault(model_name, []).append(entry)
+            return workers
+    
+    def get_worker_address(self, model_name: str) -> str:
+        """
+        Pick the worker with the shortest expected wait for a model.
+        
+        Args:
+            model_name: Requested model
+        
+        Returns:
+            str: Worker address, or an empty string if none serves the model
+        """
+        if self.dispatch_method == DispatchMethod.LOTTERY:
+            return super().get_worker_address(model_name)
+        
+        with self._lock:
+            candidates = [
+                self.loads[worker_name].entry(worker_name)
+                for worker_name, info in self.worker_info.items()
+                if model_name in info.model_names
+            ]
+            if not candidates:
+                return ""
+            address = pick_worker(candidates, {})["address"]
+            # Counted until the worker's next report includes the request.
+            self.loads[address].in_flight += 1
+            return address
+    
+    def remove_expired_workers(self) -> List[str]:
+        """
+        Remove the load-reporting workers that stopped reporting.
+        
+        Returns:
+            List[str]: Addresses of the removed workers
+        """
+        expire = time.time() - self.worker_ttl
+        with self._lock:
+            expired = [
+                worker_name
+                for worker_name, load in self.loads.items()
+                if load.reports_load and load.reported < expire and self.worker_info[worker_name].check_heart_beat
+            ]
+            for worker_name in expired:
+                self.remove_worker(worker_name)
+        for worker_name in expired:
+            logger.warning(f"Removed worker {worker_name}: no load report for {self.worker_ttl}s")
+        return expired
+    
+    def remove_stale_workers_by_expiration(self) -> None:
+        """Apply FastChat's heartbeat expiry under the controller lock."""
+        with self._lock:
+            super().remove_stale_workers_by_expiration()
+    
+    def _evict_loop(self) -> None:
+        """Check for silent workers several times per TTL."""
+        while True:
+            time.sleep(max(0.1, self.worker_ttl / 4))
+            self.remove_expired_workers()
+
+
+@app.post("/report_load")
+async def report_load(request: Request) -> Dict:
+    """Record a worker's load report."""
+    data = await request.json()
+    exist = fastchat_controller.controller.report_load(
+        data["worker_name"],
+        data["in_flight"],
+        data["capacity"],
+        data.get("service_time"),
+    )
+    return {"exist": exist}
+
+
+@app.post("/list_workers")
+async def list_workers() -> Dict:
+    """List the workers of every model with their load."""
+    return {"workers": fastchat_controller.controller.list_workers()}
+
+
+def main() -> None:
+    """Run the load-aware controller with FastChat's controller API."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="localhost")
+    parser.add_argument("--port", type=int, default=Config.CONTROLLER_PORT)
+    parser.add_argument(
+        "--dispatch-method",
+        type=str,
+        choices=["lottery", "shortest_queue"],
+        default="shortest_queue",
+    )
+    parser.add_argument("--worker-ttl", type=float, default=Config.CONTROLLER_WORKER_TTL)
+    args = parser.parse_args()
+    
+    # FastChat's routes call the module-level controller.
+    fastchat_controller.controller = EnhancedController(args.dispatch_method, args.worker_ttl)
+    app.title = "Orcestator Controller"
+    
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="info")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,282 @@
 """
 Database module for Orcestator.
-Provides SQLModel models for request logging if OR_DB_PATH is set.
+Provides SQLModel models for request logging if OR_DB_PATH is set, and
+stores rate limit snapshots and batch job checkpoints. Request and
+response bodies are stored once per distinct content in a compressed blob
+table that request log rows reference by hash.
+Writes go through the bulk SQLite audit writer unless OR_DB_BACKEND=sqlmodel.
+The engine and schema are created on first use, not at import.
 """
 
 import datetime
-from typing import Optional
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
 
-from sqlmodel import Field, SQLModel, create_engine, Session
+from sqlalchemy import inspect, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlmodel import Field, SQLModel, Session, create_engine, select
 
+from orcestator.audit import SQLiteAuditWriter
+from orcestator.blobs import BLOB_COLUMNS, BlobEncoder, decode_messages, decompress
 from orcestator.config import Config
 
+logger = logging.getLogger("orcestator")
+
 
 class RequestLog(SQLModel, table=True):
     """Model for logging API requests and responses."""
     
     id: Optional[int] = Field(default=None, primary_key=True)
     timestamp: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
-    user_message: str = Field(index=True)
-    assistant_message: str
+    messages_hash: str
+    response_hash: str
     prompt_tokens: int
     completion_tokens: int
     latency_ms: int
     model: str = Field(index=True)
     original_model: str = Field(default="")
+    queue_wait_ms: Optional[int] = None
+    connect_ms: Optional[int] = None
+    ttfb_ms: Optional[int] = None
+    ttft_ms: Optional[int] = None
+    inter_token_ms: Optional[int] = None
+    tokens_per_second: Optional[float] = None
+    status: str = Field(default="ok")
+
+
+class MessageBlob(SQLModel, table=True):
+    """Compressed message list, message or response text, stored once per distinct content."""
+    
+    # The hash is the row key, so no separate rowid or primary key index is kept.
+    __table_args__ = {"sqlite_with_rowid": False}
+    
+    hash: str = Field(primary_key=True)
+    codec: str
+    size: int
+    data: bytes
+
+
+class RateLimitState(SQLModel, table=True):
+    """Snapshot of one client/model pair of rate limit buckets."""
+    
+    client: str = Field(primary_key=True)
+    model: str = Field(primary_key=True)
+    requests: float
+    tokens: float
+    updated_at: float
+
+
+class BatchJob(SQLModel, table=True):
+    """Offline batch job and its last checkpoint."""
+    
+    id: str = Field(primary_key=True)
+    status: str = Field(index=True)
+    input_file: str
+    output_file: str
+    model: str
+    parallelism: int
+    total: int
+    next_line: int = 1
+    input_offset: int = 0
+    output_offset: int = 0
+    completed: int = 0
+    failed: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    owner: Optional[str] = None
+    lease_until: float = 0.0
+    created_at: float
+    updated_at: float
+    run_started_at: Optional[float] = None
+    run_start_done: int = 0
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+
+
+AUDIT_COLUMNS = [
+    "timestamp", "messages_hash", "response_hash", "prompt_tokens",
+    "completion_tokens", "latency_ms", "model", "original_model",
+    "queue_wait_ms", "connect_ms", "ttfb_ms", "ttft_ms",
+    "inter_token_ms", "tokens_per_second", "status",
+]
+
+
+def _add_missing_columns(engine) -> None:
+    """
+    Add RequestLog columns introduced after an existing database was created.
+    
+    create_all only creates missing tables, so older databases are
+    upgraded in place with nullable columns.
+    
+    Args:
+        engine: Engine bound to the request log database
+    """
+    table = RequestLog.__table__
+    existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    with engine.begin() as connection:
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(engine.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+
+def _migrate_message_bodies(engine) -> None:
+    """
+    Move the message bodies of a database created before the blob table into it.
+    
+    Such databases keep the first message and the response as text in
+    every request log row, with an index on the message. The table is
+    rebuilt with blob references in one transaction, so other processes
+    see either the old or the new schema, and the file is then vacuumed
+    to return the freed space. Only the first message of those requests
+    was logged, so each is migrated as a one-message list.
+    
+    Args:
+        engine: Engine bound to the request log database
+    """
+    table = RequestLog.__table__
+    inspector = inspect(engine)
+    if not inspector.has_table(table.name):
+        return
+    if "user_message" not in {column["name"] for column in inspector.get_columns(table.name)}:
+        return
+    
+    start = time.perf_counter()
+    legacy = f"{table.name}_legacy"
+    connection = sqlite3.connect(Config.DB_PATH, isolation_level=None, timeout=300.0)
+    try:
+        connection.execute("BEGIN IMMEDIATE")
+        existing = [row[1] for row in connection.execute(f"PRAGMA table_info({table.name})")]
+        if "user_message" not in existing:
+            # Another process migrated the database meanwhile.
+            connection.execute("ROLLBACK")
+            return
+        
+        try:
+            indexes = connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                (table.name,),
+            ).fetchall()
+            for (index,) in indexes:
+                connection.execute(f"DROP INDEX {index}")
+            connection.execute(f"ALTER TABLE {table.name} RENAME TO {legacy}")
+            connection.execute(str(CreateTable(MessageBlob.__table__, if_not_exists=True).compile(engine)))
+            connection.execute(str(CreateTable(table).compile(engine)))
+            for index in table.indexes:
+                connection.execute(str(CreateIndex(index).compile(engine)))
+            
+            # Required columns the old table lacks, and those added to it by
+            # _add_missing_columns as nullable, get the model's default.
+            defaults = {
+                column.name: column.default.arg if column.default is not None and column.default.is_scalar else None
+                for column in table.columns if not column.nullable
+            }
+            copied = [column.name for column in table.columns if column.name in existing]
+            filled = [
+                name for name, default in defaults.items()
+                if name not in existing and default is not None
+            ]
+            columns = copied + filled + ["messages_hash", "response_hash"]
+            insert_row = (
+                f"INSERT INTO {table.name} ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)})"
+            )
+            insert_blob = (
+                f"INSERT OR IGNORE INTO {MessageBlob.__tablename__} ({', '.join(BLOB_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in BLOB_COLUMNS)})"
+            )
+            
+            encoder = BlobEncoder()
+            cursor = connection.execute(
+                f"SELECT {', '.join(copied)}, user_message, assistant_message FROM {legacy}"
+            )
+            migrated = 0
+            while True:
+                chunk = cursor.fetchmany(1000)
+                if not chunk:
+                    break
+                entries = [dict(zip(copied + ["user_message", "assistant_message"], row)) for row in chunk]
+                rows, blobs = encoder.encode(entries)
+                connection.executemany(insert_blob, blobs)
+                connection.executemany(insert_row, [
+                    tuple(defaults.get(column) if row.get(column) is None else row[column] for column in columns)
+                    for row in rows
+                ])
+                encoder.remember(blobs)
+                migrated += len(rows)
+            
+            connection.execute(f"DROP TABLE {legacy}")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        logger.info(
+            f"Moved the message bodies of {migrated} request log rows to {MessageBlob.__tablename__} "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+        
+        try:
+            connection.execute("VACUUM")
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Could not vacuum the database after migrating it, run VACUUM later: {str(e)}")
+    finally:
+        connection.close()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """
+    Get the request log engine, creating the database schema on first use.
+    
+    Returns:
+        Engine: SQLAlchemy engine, or None if OR_DB_PATH is not set
+    """
+    global _engine
+    if _engine is None and Config.DB_PATH:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_engine(f"sqlite:///{Config.DB_PATH}", echo=False)
+                _migrate_message_bodies(engine)
+                SQLModel.metadata.create_all(engine)
+                _add_missing_columns(engine)
+                _engine = engine
+    return _engine
+
+
+_audit_writer: Optional[SQLiteAuditWriter] = None
+_blob_encoder = BlobEncoder()
 
 
-engine = None
-if Config.DB_PATH:
-    engine = create_engine(f"sqlite:///{Config.DB_PATH}", echo=False)
-    SQLModel.metadata.create_all(engine)
+def get_audit_writer() -> SQLiteAuditWriter:
+    """
+    Get the bulk audit writer, creating its connection on first use.
+    
+    Returns:
+        SQLiteAuditWriter: Writer for the request log table
+    """
+    global _audit_writer
+    if _audit_writer is None:
+        get_engine()
+        _audit_writer = SQLiteAuditWriter(
+            Config.DB_PATH, RequestLog.__tablename__, AUDIT_COLUMNS,
+            MessageBlob.__tablename__, BLOB_COLUMNS,
+        )
+    return _audit_writer
+
+
+def close_audit_writer() -> None:
+    """Close the bulk audit writer connection if it was opened."""
+    global _audit_writer
+    if _audit_writer is not None:
+        _audit_writer.close()
+        _audit_writer = None
 
 
 def log_request(
@@ -39,32 +287,266 @@ def log_request(
     latency_ms: int,
     model: str,
     original_model: str = "",
+    messages: Optional[List[Dict]] = None,
 ) -> None:
     """
     Log a request to the database if DB_PATH is set.
     
     Args:
-        user_message: The user's message
+        user_message: The user's message, stored if messages is not given
         assistant_message: The assistant's response
         prompt_tokens: Number of tokens in the prompt
         completion_tokens: Number of tokens in the completion
         latency_ms: Latency in milliseconds
         model: The model used (orcestator)
         original_model: The original model used (e.g., openai/gpt-4o)
+        messages: The full message list of the request
+    """
+    log_requests([{
+        "messages": messages,
+        "user_message": user_message,
+        "assistant_message": assistant_message,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "latency_ms": latency_ms,
+        "model": model,
+        "original_model": original_model,
+    }])
+
+
+def log_requests(entries: List[Dict]) -> None:
+    """
+    Log a batch of requests to the database in a single transaction.
+    
+    Message lists and responses not stored yet are written to the blob
+    table in the same transaction as the rows referencing them.
+    
+    Args:
+        entries: Dicts with the same fields as log_request, optionally
+            including a timestamp, the timing columns and a status
     """
+    if not entries:
+        return
+    engine = get_engine()
     if not engine:
         return
     
-    log_entry = RequestLog(
-        user_message=user_message,
-        assistant_message=assistant_message,
-        prompt_tokens=prompt_tokens,
-        completion_tokens=completion_tokens,
-        latency_ms=latency_ms,
-        model=model,
-        original_model=original_model,
-    )
+    rows, blobs = _blob_encoder.encode(entries)
+    if Config.DB_BACKEND == "bulk":
+        now = datetime.datetime.utcnow()
+        for row in rows:
+            row.setdefault("timestamp", now)
+            row.setdefault("status", "ok")
+        get_audit_writer().write_batch(rows, blobs)
+        _blob_encoder.remember(blobs)
+        return
+    
+    with Session(engine) as session:
+        if blobs:
+            session.exec(
+                sqlite_insert(MessageBlob)
+                .values([dict(zip(BLOB_COLUMNS, blob)) for blob in blobs])
+                .on_conflict_do_nothing()
+            )
+        session.add_all([RequestLog(**row) for row in rows])
+        session.commit()
+    _blob_encoder.remember(blobs)
+
+
+def get_request_bodies(request_id: int) -> Optional[Dict]:
+    """
+    Load the message list and response of a logged request.
+    
+    Args:
+        request_id: RequestLog row ID
+    
+    Returns:
+        Optional[Dict]: `messages` and `assistant_message`, or None if
+        there is no such row
+    """
+    engine = get_engine()
+    if not engine:
+        return None
+    
+    with Session(engine) as session:
+        row = session.get(RequestLog, request_id)
+        if row is None:
+            return None
+        
+        def load(digest: str) -> bytes:
+            blob = session.get(MessageBlob, digest)
+            return decompress(blob.codec, blob.data)
+        
+        return {
+            "messages": decode_messages(load(row.messages_hash), load),
+            "assistant_message": load(row.response_hash).decode(),
+        }
+
+
+def load_rate_limit_state() -> List[Dict]:
+    """
+    Load the rate limit bucket snapshots.
+    
+    Returns:
+        List[Dict]: Rows with client, model, requests, tokens and updated_at
+    """
+    engine = get_engine()
+    if not engine:
+        return []
     
     with Session(engine) as session:
-        session.add(log_entry)
+        return [row.dict() for row in session.exec(select(RateLimitState))]
+
+
+def save_rate_limit_state(rows: List[Dict]) -> None:
+    """
+    Replace the stored rate limit snapshots for the given buckets.
+    
+    Args:
+        rows: Dicts with the RateLimitState fields
+    """
+    if not rows:
+        return
+    engine = get_engine()
+    if not engine:
+        return
+    
+    with Session(engine) as session:
+        for row in rows:
+            session.merge(RateLimitState(**row))
+        session.commit()
+
+
+def create_batch_job(row: Dict) -> None:
+    """
+    Store a new batch job.
+    
+    Args:
+        row: Dict with the BatchJob fields
+    """
+    with Session(get_engine()) as session:
+        session.add(BatchJob(**row))
+        session.commit()
+
+
+def get_batch_job(job_id: str) -> Optional[Dict]:
+    """
+    Load a batch job.
+    
+    Args:
+        job_id: Job ID
+    
+    Returns:
+        Optional[Dict]: The job's fields, or None if there is no such job
+    """
+    with Session(get_engine()) as session:
+        job = session.get(BatchJob, job_id)
+        return job.dict() if job is not None else None
+
+
+def list_batch_jobs(limit: int = 100) -> List[Dict]:
+    """
+    Load the most recently created batch jobs.
+    
+    Args:
+        limit: Maximum number of jobs
+    
+    Returns:
+        List[Dict]: Job fields, newest first
+    """
+    with Session(get_engine()) as session:
+        query = select(BatchJob).order_by(BatchJob.created_at.desc()).limit(limit)
+        return [job.dict() for job in session.exec(query)]
+
+
+def checkpoint_batch_job(job_id: str, owner: str, fields: Dict) -> bool:
+    """
+    Save the progress of a running batch job.
+    
+    Args:
+        job_id: Job ID
+        owner: Process running the job
+        fields: BatchJob fields to update
+    
+    Returns:
+        bool: False if the job was cancelled or taken over by another
+        process, which means the caller must stop running it
+    """
+    with Session(get_engine()) as session:
+        result = session.exec(
+            update(BatchJob)
+            .where(BatchJob.id == job_id, BatchJob.owner == owner, BatchJob.status == "in_progress")
+            .values(**fields)
+        )
+        session.commit()
+        return result.rowcount == 1
+
+
+def claim_batch_jobs(owner: str, now: float, lease: float) -> List[Dict]:
+    """
+    Take over the unfinished batch jobs whose owner stopped checkpointing.
+    
+    Each job is claimed with a conditional update, so when several
+    processes share the database every job is resumed by only one.
+    
+    Args:
+        owner: Process claiming the jobs
+        now: Current time
+        lease: Seconds the claim is valid without a checkpoint
+    
+    Returns:
+        List[Dict]: Fields of the claimed jobs
+    """
+    claimed = []
+    with Session(get_engine()) as session:
+        query = select(BatchJob.id).where(BatchJob.status == "in_progress", BatchJob.lease_until < now)
+        for job_id in session.exec(query).all():
+            result = session.exec(
+                update(BatchJob)
+                .where(BatchJob.id == job_id, BatchJob.status == "in_progress", BatchJob.lease_until < now)
+                .values(owner=owner, lease_until=now + lease)
+            )
+            session.commit()
+            if result.rowcount == 1:
+                claimed.append(session.get(BatchJob, job_id).dict())
+    return claimed
+
+
+def release_batch_jobs(owner: str) -> None:
+    """
+    Give up the leases of a process's running batch jobs so they can be resumed at once.
+    
+    Args:
+        owner: Process that is shutting down
+    """
+    with Session(get_engine()) as session:
+        session.exec(
+            update(BatchJob)
+            .where(BatchJob.owner == owner, BatchJob.status == "in_progress")
+            .values(lease_until=0.0)
+        )
+        session.commit()
+
+
+def cancel_batch_job(job_id: str, now: float) -> Optional[Dict]:
+    """
+    Mark a batch job cancelled unless it has already finished.
+    
+    The process running it notices at its next checkpoint.
+    
+    Args:
+        job_id: Job ID
+        now: Current time
+    
+    Returns:
+        Optional[Dict]: The job's fields, or None if there is no such job
+    """
+    with Session(get_engine()) as session:
+        session.exec(
+            update(BatchJob)
+            .where(BatchJob.id == job_id, BatchJob.status == "in_progress")
+            .values(status="cancelled", finished_at=now, updated_at=now)
+        )
         session.commit()
+        job = session.get(BatchJob, job_id)
+        return job.dict() if job is not None else None
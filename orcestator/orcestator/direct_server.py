@@ -0,0 +1,217 @@
+"""
+Single-process OpenAI-compatible API server for Orcestator.
+Serves /v1/models, /v1/chat/completions and /v1/batches by calling the
+proxy in-process, bypassing the FastChat controller and worker hops.
+"""
+
+import argparse
+import logging
+import sys
+import time
+from typing import AsyncGenerator, List, Optional
+
+import httpx
+import uvicorn
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from fastapi.security.http import HTTPAuthorizationCredentials, HTTPBearer
+from starlette.background import BackgroundTask
+
+from orcestator.aliases import get_alias_registry, models_response
+from orcestator.batch import BatchRunner, batch_response
+from orcestator.config import Config
+from orcestator.limiter import AdmissionTimeout
+from orcestator.logger import shutdown_logging, start_metrics_server
+from orcestator.proxy import OpenRouterProxy
+from orcestator.ratelimit import RateLimiter, RateLimitMiddleware
+from orcestator.streaming import ClosingStreamingResponse
+
+logger = logging.getLogger("orcestator")
+
+app = FastAPI(title="Orcestator Direct API Server")
+proxy: Optional[OpenRouterProxy] = None
+batches: Optional[BatchRunner] = None
+api_keys: List[str] = []
+
+get_bearer_token = HTTPBearer(auto_error=False)
+
+
+async def check_api_key(
+    auth: Optional[HTTPAuthorizationCredentials] = Depends(get_bearer_token),
+) -> Optional[str]:
+    """
+    Check the bearer token against the configured API keys.
+    
+    Args:
+        auth: Parsed Authorization header
+        
+    Returns:
+        Optional[str]: The client's API key, if any
+    """
+    if not api_keys:
+        return None
+    if auth is None or auth.credentials not in api_keys:
+        raise HTTPException(
+            status_code=401,
+            detail={"error": {"message": "Invalid API key", "type": "invalid_request_error", "code": "invalid_api_key"}},
+        )
+    return auth.credentials
+
+
+def error_response(status_code: int, message: str) -> JSONResponse:
+    """
+    Build an OpenAI-style error response.
+    
+    Args:
+        status_code: HTTP status code
+        message: Error message
+        
+    Returns:
+        JSONResponse: Error response
+    """
+    return JSONResponse(
+        status_code=status_code,
+        content={"error": {"message": message, "type": "upstream_error", "code": status_code}},
+    )
+
+
+@app.get("/v1/models", dependencies=[Depends(check_api_key)])
+async def list_models(request: Request) -> Response:
+    """List the model aliases served by Orcestator."""
+    return models_response(request.headers.get("if-none-match"))
+
+
+@app.post("/v1/chat/completions", dependencies=[Depends(check_api_key)])
+async def create_chat_completion(request: Request):
+    """Proxy a chat completion straight to the upstream."""
+    body = await request.json()
+    
+    try:
+        if not body.get("stream"):
+            return JSONResponse(await proxy.chat_completion(body))
+        
+        frames = proxy.stream_chat_completion(body)
+        # Pull the first frame before answering so upstream errors still
+        # produce a proper status code instead of a broken stream.
+        first_frame = await frames.__anext__()
+    except AdmissionTimeout as e:
+        response = error_response(503, str(e))
+        response.headers["Retry-After"] = "1"
+        return response
+    except httpx.HTTPStatusError as e:
+        return error_response(e.response.status_code, e.response.text)
+    except httpx.HTTPError as e:
+        logger.error(f"Upstream request failed: {str(e)}")
+        return error_response(502, str(e))
+    except StopAsyncIteration:
+        first_frame = b"data: [DONE]\n\n"
+        frames = None
+    
+    async def relay() -> AsyncGenerator[bytes, None]:
+        yield first_frame
+        if frames is not None:
+            async for frame in frames:
+                yield frame
+    
+    # The upstream stream is already open, so it is closed even if the
+    # client leaves before relay() starts.
+    return ClosingStreamingResponse(
+        relay(),
+        media_type="text/event-stream",
+        background=BackgroundTask(frames.aclose) if frames is not None else None,
+    )
+
+
+@app.post("/v1/batches", dependencies=[Depends(check_api_key)])
+async def create_batch(request: Request) -> JSONResponse:
+    """Create a batch job from a JSONL file in OR_BATCH_DIR."""
+    return await batch_response(batches, "submit", await request.json())
+
+
+@app.get("/v1/batches", dependencies=[Depends(check_api_key)])
+async def list_batches() -> JSONResponse:
+    """List the most recent batch jobs."""
+    return await batch_response(batches, "list")
+
+
+@app.get("/v1/batches/{batch_id}", dependencies=[Depends(check_api_key)])
+async def get_batch(batch_id: str) -> JSONResponse:
+    """Get a batch job's progress, throughput and ETA."""
+    return await batch_response(batches, "status", batch_id)
+
+
+@app.post("/v1/batches/{batch_id}/cancel", dependencies=[Depends(check_api_key)])
+async def cancel_batch(batch_id: str) -> JSONResponse:
+    """Cancel a batch job."""
+    return await batch_response(batches, "cancel", batch_id)
+
+
+async def on_startup() -> None:
+    """Load the model aliases, warm the upstream connection pool and resume batch jobs."""
+    start = time.perf_counter()
+    get_alias_registry()
+    await proxy.warm_up()
+    if batches is not None:
+        batches.start()
+    logger.info(f"Direct API server ready in {time.perf_counter() - start:.2f}s")
+
+
+async def on_shutdown() -> None:
+    """Stop the batch jobs so another process can resume them."""
+    if batches is not None:
+        await batches.close()
+
+
+def run_direct_server():
+    """
+    Run the single-process API server.
+    """
+    global proxy, batches, api_keys
+    
+    if not Config.validate():
+        sys.exit(1)
+    
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default=Config.HOST)
+    parser.add_argument("--port", type=int, default=Config.PORT)
+    parser.add_argument("--allowed-origins", type=str, default="*")
+    parser.add_argument("--api-keys", type=str)
+    parser.add_argument("--metrics-port", type=int, default=8001)
+    
+    args = parser.parse_args()
+    
+    if args.api_keys:
+        api_keys = args.api_keys.split(",")
+    
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=args.allowed_origins.split(","),
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    
+    if Config.RATE_LIMIT_ENABLED:
+        app.add_middleware(
+            RateLimitMiddleware,
+            limiter=RateLimiter(persist=Config.RATE_LIMIT_PERSIST),
+            api_keys=api_keys,
+        )
+    
+    start_metrics_server(args.metrics_port)
+    
+    proxy = OpenRouterProxy()
+    if Config.DB_PATH:
+        batches = BatchRunner(proxy)
+    app.router.on_startup.append(on_startup)
+    app.router.on_shutdown.append(on_shutdown)
+    
+    logger.info(f"Starting Orcestator direct API server at {args.host}:{args.port}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="info")
+    
+    shutdown_logging()
+
+
+if __name__ == "__main__":
+    run_direct_server()
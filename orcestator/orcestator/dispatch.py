@@ -0,0 +1,169 @@
+"""
+Worker dispatch for Orcestator.
+Picks the proxy worker with the shortest expected wait for a model from
+the load the workers report to the controller, and caches the
+controller's worker list in the API server so requests are dispatched
+without a controller round trip.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from orcestator.logger import WORKER_RESOLUTIONS
+
+logger = logging.getLogger("orcestator")
+
+# Assumed service time of a worker that has not finished a request yet.
+DEFAULT_SERVICE_TIME = 1.0
+
+
+def expected_wait(in_flight: float, capacity: float, service_time: Optional[float]) -> float:
+    """
+    Estimate how long a new request would take on a worker.
+    
+    Args:
+        in_flight: Requests running or queued on the worker
+        capacity: Requests the worker runs concurrently
+        service_time: Average seconds per request, or None if unknown
+    
+    Returns:
+        float: Relative expected completion time of one more request
+    """
+    return (in_flight + 1) / max(1.0, capacity) * (service_time or DEFAULT_SERVICE_TIME)
+
+
+def pick_worker(workers: List[Dict], assigned: Dict[str, int]) -> Dict:
+    """
+    Choose the worker with the shortest expected wait, breaking ties at random.
+    
+    Args:
+        workers: Worker entries from /list_workers
+        assigned: Requests sent to each worker since its load was reported
+    
+    Returns:
+        Dict: The chosen worker entry
+    """
+    best: List[Dict] = []
+    best_wait = 0.0
+    for worker in workers:
+        wait = expected_wait(
+            worker["in_flight"] + assigned.get(worker["address"], 0),
+            worker["capacity"],
+            worker["service_time"],
+        )
+        if not best or wait < best_wait:
+            best, best_wait = [worker], wait
+        elif wait == best_wait:
+            best.append(worker)
+    return best[0] if len(best) == 1 else random.choice(best)
+
+
+class WorkerResolver:
+    """
+    Cached model-to-worker resolution for the API server.
+    
+    The controller's worker list, with the load each worker last
+    reported, is fetched at most once per `ttl` and shared by concurrent
+    requests. Between fetches the resolver counts the requests it
+    dispatched to each worker itself, so a burst spreads over the workers
+    instead of piling onto the one that was idle at the last fetch.
+    Models missing from the list, and controllers without /list_workers,
+    are resolved by the controller as before.
+    """
+    
+    def __init__(
+        self,
+        controller_address: str,
+        ttl: float,
+        fallback: Callable[[str], Awaitable[str]],
+    ):
+        """
+        Initialize the resolver.
+        
+        Args:
+            controller_address: Base URL of the controller
+            ttl: Seconds a fetched worker list is used
+            fallback: Asks the controller for a worker of a model
+        """
+        self.controller_address = controller_address
+        self.ttl = ttl
+        self.fallback = fallback
+        self.supported = True
+        self._workers: Dict[str, List[Dict]] = {}
+        self._assigned: Dict[str, int] = {}
+        self._fetched = 0.0
+        self._refresh: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    async def _fetch(self) -> None:
+        """Replace the cached worker list with the controller's."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=5.0)
+        try:
+            response = await self._client.post(self.controller_address + "/list_workers")
+            if response.status_code == 404:
+                logger.warning("The controller has no /list_workers; resolving every request through it")
+                self.supported = False
+                return
+            response.raise_for_status()
+            workers = response.json()["workers"]
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            logger.error(f"Failed to fetch the worker list: {e}")
+            workers = {}
+        
+        self._workers = workers
+        self._assigned = {}
+        self._fetched = time.monotonic()
+    
+    async def workers(self) -> Dict[str, List[Dict]]:
+        """
+        Get the cached worker list, fetching it when it has expired.
+        
+        Returns:
+            Dict[str, List[Dict]]: Worker entries by model name
+        """
+        if time.monotonic() - self._fetched >= self.ttl:
+            if self._refresh is None or self._refresh.done():
+                self._refresh = asyncio.create_task(self._fetch())
+            await asyncio.shield(self._refresh)
+        return self._workers
+    
+    async def get_worker_address(self, model_name: str) -> str:
+        """
+        Get the address of the worker to send a request to.
+        
+        Args:
+            model_name: Model requested by the client
+        
+        Returns:
+            str: Worker address
+        
+        Raises:
+            ValueError: If no worker serves the model
+        """
+        candidates = (await self.workers()).get(model_name) if self.supported else None
+        if not candidates:
+            WORKER_RESOLUTIONS.labels(source="controller").inc()
+            return await self.fallback(model_name)
+        
+        worker = pick_worker(candidates, self._assigned)
+        self._assigned[worker["address"]] = self._assigned.get(worker["address"], 0) + 1
+        WORKER_RESOLUTIONS.labels(source="cache").inc()
+        return worker["address"]
+    
+    async def has_model(self, model_name: str) -> bool:
+        """
+        Check whether a cached worker serves a model.
+        
+        Args:
+            model_name: Model requested by the client
+        
+        Returns:
+            bool: True if the model is known; False means ask the controller
+        """
+        return self.supported and bool((await self.workers()).get(model_name))
@@ -0,0 +1,245 @@
+"""
+Hedged upstream requests for Orcestator.
+Sends a second copy of a streaming request when its first token is late
+compared to recent requests for the same model, keeps whichever copy
+answers first and cancels the other.
+"""
+
+import asyncio
+from collections import deque
+from contextlib import aclosing
+from typing import AsyncGenerator, AsyncIterator, Callable, Dict, Optional
+
+from orcestator.logger import HEDGED_REQUESTS
+
+_END = object()
+
+
+class LatencyWindow:
+    """Most recent time-to-first-token samples of one target model."""
+    
+    def __init__(self, size: int):
+        """
+        Initialize an empty window.
+        
+        Args:
+            size: Number of samples kept
+        """
+        self._samples = deque(maxlen=max(1, size))
+    
+    def __len__(self) -> int:
+        return len(self._samples)
+    
+    def add(self, seconds: float) -> None:
+        """
+        Add a sample, dropping the oldest one if the window is full.
+        
+        Args:
+            seconds: Observed time to first token
+        """
+        self._samples.append(seconds)
+    
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        Get a percentile of the samples.
+        
+        Args:
+            q: Percentile between 0 and 1
+        
+        Returns:
+            Optional[float]: The sample at that rank, or None if empty
+        """
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class HedgeBudget:
+    """
+    Caps hedges at a fraction of requests.
+    
+    Every request earns `ratio` credits up to `burst`, and every hedge
+    spends one, so over time at most `ratio` of requests are hedged even
+    if the upstream slows down as a whole.
+    """
+    
+    def __init__(self, ratio: float, burst: float):
+        """
+        Initialize a full budget.
+        
+        Args:
+            ratio: Hedges allowed per request
+            burst: Maximum saved credits
+        """
+        self.ratio = ratio
+        self.burst = burst
+        self.credits = burst
+    
+    def on_request(self) -> None:
+        """Earn credits for one request."""
+        self.credits = min(self.burst, self.credits + self.ratio)
+    
+    def try_spend(self) -> bool:
+        """
+        Spend one credit for a hedge.
+        
+        Returns:
+            bool: True if the hedge may be sent
+        """
+        if self.credits < 1.0:
+            return False
+        self.credits -= 1.0
+        return True
+
+
+class Hedger:
+    """
+    Races a delayed duplicate against slow streaming requests.
+    
+    A request is hedged once it has waited longer than the configured
+    percentile of recent time to first token for its model, no less than
+    `min_delay`, and only when the budget allows. Until `min_samples`
+    requests have been observed for a model, its requests are not hedged.
+    """
+    
+    def __init__(
+        self,
+        percentile: float,
+        min_delay: float,
+        min_samples: int,
+        window: int,
+        budget: HedgeBudget,
+    ):
+        """
+        Initialize the hedger.
+        
+        Args:
+            percentile: TTFT percentile after which a hedge is sent
+            min_delay: Minimum seconds before hedging
+            min_samples: Samples needed before a model is hedged
+            window: Samples kept per model
+            budget: Budget shared by all models
+        """
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.window = window
+        self.budget = budget
+        self._windows: Dict[str, LatencyWindow] = {}
+    
+    def delay(self, model: str) -> Optional[float]:
+        """
+        Get the hedging delay of a model.
+        
+        Args:
+            model: Upstream model name
+        
+        Returns:
+            Optional[float]: Seconds to wait for the first token before
+            hedging, or None while there are too few samples
+        """
+        window = self._windows.get(model)
+        if window is None or len(window) < self.min_samples:
+            return None
+        return max(self.min_delay, window.percentile(self.percentile))
+    
+    def observe(self, model: str, seconds: float) -> None:
+        """
+        Record the time to first token a client saw.
+        
+        Args:
+            model: Upstream model name
+            seconds: Time to first token
+        """
+        window = self._windows.get(model)
+        if window is None:
+            window = self._windows[model] = LatencyWindow(self.window)
+        window.add(seconds)
+    
+    @staticmethod
+    async def _pump(name: str, factory: Callable[[], AsyncIterator[Dict]], queue: asyncio.Queue) -> None:
+        """
+        Forward the items of one contender to the race queue.
+        
+        Args:
+            name: Contender name
+            factory: Creates the contender's item iterator
+            queue: Queue of (name, item) pairs; errors are sent as items
+        """
+        try:
+            async with aclosing(factory()) as items:
+                async for item in items:
+                    queue.put_nowait((name, item))
+        except Exception as e:
+            queue.put_nowait((name, e))
+        else:
+            queue.put_nowait((name, _END))
+    
+    async def race(
+        self,
+        model: str,
+        primary: Callable[[], AsyncIterator[Dict]],
+        hedge: Callable[[], AsyncIterator[Dict]],
+    ) -> AsyncGenerator[Dict, None]:
+        """
+        Run a request, hedging it if its first item is late.
+        
+        Args:
+            model: Upstream model name, for the delay and metrics
+            primary: Creates the item iterator of the original request
+            hedge: Creates the item iterator of the duplicate
+        
+        Yields:
+            Dict: Items of whichever request produced an item first
+        """
+        self.budget.on_request()
+        delay = self.delay(model)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        queue: asyncio.Queue = asyncio.Queue()
+        tasks: Dict[str, asyncio.Task] = {"primary": asyncio.create_task(self._pump("primary", primary, queue))}
+        hedged = False
+        
+        try:
+            while True:
+                timeout = None
+                if delay is not None:
+                    timeout = max(0.0, started + delay - loop.time())
+                try:
+                    name, item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    delay = None
+                    if self.budget.try_spend():
+                        hedged = True
+                        tasks["hedge"] = asyncio.create_task(self._pump("hedge", hedge, queue))
+                        HEDGED_REQUESTS.labels(model=model, event="sent").inc()
+                    else:
+                        HEDGED_REQUESTS.labels(model=model, event="denied").inc()
+                    continue
+                
+                if isinstance(item, Exception):
+                    del tasks[name]
+                    if tasks:
+                        # The other request may still succeed.
+                        continue
+                    raise item
+                break
+            
+            winner = name
+            self.observe(model, loop.time() - started)
+            if hedged:
+                HEDGED_REQUESTS.labels(model=model, event="won" if winner == "hedge" else "wasted").inc()
+            for loser in [other for other in tasks if other != winner]:
+                tasks.pop(loser).cancel()
+            
+            while item is not _END:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+                name, item = await queue.get()
+                while name != winner:
+                    name, item = await queue.get()
+        finally:
+            for task in tasks.values():
+                task.cancel()
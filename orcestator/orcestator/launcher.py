@@ -0,0 +1,297 @@
+"""
+Single-command launcher for Orcestator.
+Starts the controller, the proxy worker (or a worker pool) and the API
+server as child processes, reports when the stack can serve requests and
+restarts any component that exits, backing off when it keeps crashing.
+
+Usage:
+    orcestator serve --port 8000 --num-workers 2
+"""
+
+import argparse
+import logging
+import signal
+import subprocess
+import sys
+import time
+from typing import List, Optional
+
+import httpx
+
+from orcestator.config import Config
+
+# Only the configuration and httpx are imported here; each component
+# imports FastChat in its own process.
+
+logger = logging.getLogger("orcestator")
+
+# Restart delays double from RESTART_DELAY up to RESTART_MAX_DELAY; a
+# component that stayed up for STABLE_UPTIME seconds starts over.
+RESTART_DELAY = 1.0
+RESTART_MAX_DELAY = 30.0
+STABLE_UPTIME = 60.0
+
+
+class Component:
+    """One supervised child process."""
+    
+    def __init__(self, name: str, command: List[str]):
+        """
+        Initialize a component that is not running yet.
+        
+        Args:
+            name: Name used in log messages
+            command: Command line that runs the component
+        """
+        self.name = name
+        self.command = command
+        self.process: Optional[subprocess.Popen] = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.restart_at: Optional[float] = None
+    
+    def start(self) -> None:
+        """Start the process."""
+        self.process = subprocess.Popen(self.command)
+        self.started_at = time.monotonic()
+        self.restart_at = None
+        logger.info(f"Started {self.name} (pid {self.process.pid})")
+    
+    def schedule_restart(self, now: float) -> float:
+        """
+        Schedule a restart after the process exited, backing off on repeated crashes.
+        
+        Args:
+            now: Current monotonic time
+        
+        Returns:
+            float: Seconds until the restart
+        """
+        if now - self.started_at >= STABLE_UPTIME:
+            self.restarts = 0
+        delay = min(RESTART_MAX_DELAY, RESTART_DELAY * 2 ** self.restarts)
+        self.restarts += 1
+        self.restart_at = now + delay
+        return delay
+    
+    def exited(self) -> Optional[int]:
+        """
+        Check whether the process has exited.
+        
+        Returns:
+            Optional[int]: Exit code, or None while it is running
+        """
+        return self.process.poll() if self.process is not None else None
+    
+    def stop(self, timeout: float = 10.0) -> None:
+        """
+        Stop the process, forcefully if it does not exit in time.
+        
+        Args:
+            timeout: Seconds to wait for a graceful exit
+        """
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+def build_components(args) -> List[Component]:
+    """
+    Build the command lines of the stack's components.
+    
+    Args:
+        args: `serve` command line arguments
+    
+    Returns:
+        List[Component]: Controller, worker and API server, in start order
+    """
+    python = sys.executable
+    controller = f"http://localhost:{args.controller_port}"
+    
+    worker_module = "orcestator.worker_pool" if args.num_workers > 1 else "orcestator.proxy_worker"
+    worker = [
+        python, "-m", worker_module,
+        "--port", str(args.worker_port),
+        "--controller-address", controller,
+        "--model-id", args.model_id,
+        "--limit-worker-concurrency", str(args.limit_worker_concurrency),
+    ]
+    if args.num_workers > 1:
+        worker += ["--num-workers", str(args.num_workers)]
+    
+    api_server = [
+        python, "-m", "orcestator.api_server",
+        "--host", args.host,
+        "--port", str(args.port),
+        "--controller-address", controller,
+    ]
+    if args.api_keys:
+        api_server += ["--api-keys", args.api_keys]
+    
+    return [
+        Component("controller", [
+            python, "-m", "orcestator.controller_patch",
+            "--host", "localhost",
+            "--port", str(args.controller_port),
+        ]),
+        Component("worker", worker),
+        Component("api_server", api_server),
+    ]
+
+
+def probe_url(host: str, port: int) -> str:
+    """
+    Build the URL of the API server's readiness endpoint.
+    
+    Servers bound to all interfaces are probed on loopback, others on the
+    address they were bound to.
+    
+    Args:
+        host: Host the API server binds to
+        port: Port the API server listens on
+    
+    Returns:
+        str: URL of /health
+    """
+    if host in ("", "0.0.0.0"):
+        host = "127.0.0.1"
+    elif host == "::":
+        host = "::1"
+    if ":" in host:
+        host = f"[{host}]"
+    return f"http://{host}:{port}/health"
+
+
+def is_ready(url: str) -> bool:
+    """
+    Check the API server's readiness endpoint.
+    
+    Args:
+        url: URL of /health
+    
+    Returns:
+        bool: True once a warmed-up worker is registered
+    """
+    try:
+        return httpx.get(url, timeout=2.0).status_code == 200
+    except httpx.HTTPError:
+        return False
+
+
+def serve(args) -> int:
+    """
+    Run the whole stack until interrupted.
+    
+    All components start at once; the worker keeps retrying registration
+    until the controller is up and registers only after warming its
+    upstream pool, so /health turning 200 means requests can be served.
+    
+    Args:
+        args: `serve` command line arguments
+    
+    Returns:
+        int: Process exit code
+    """
+    if not Config.validate():
+        return 1
+    
+    components = build_components(args)
+    health_url = probe_url(args.host, args.port)
+    stopping = False
+    
+    def _stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+    
+    signal.signal(signal.SIGTERM, _stop)
+    
+    start = time.perf_counter()
+    ready = False
+    for component in components:
+        component.start()
+    
+    try:
+        while not stopping:
+            now = time.monotonic()
+            for component in components:
+                if component.restart_at is not None:
+                    if now >= component.restart_at:
+                        component.start()
+                    continue
+                
+                code = component.exited()
+                if code is None:
+                    continue
+                if component.restarts >= args.max_restarts and now - component.started_at < STABLE_UPTIME:
+                    logger.error(
+                        f"{component.name} exited with code {code} after {component.restarts} "
+                        f"restart(s), stopping"
+                    )
+                    return 1
+                delay = component.schedule_restart(now)
+                logger.warning(f"{component.name} exited with code {code}, restarting in {delay:.0f}s")
+            
+            if not ready:
+                if is_ready(health_url):
+                    ready = True
+                    logger.info(
+                        f"Orcestator ready at http://{args.host}:{args.port}/v1 "
+                        f"in {time.perf_counter() - start:.2f}s"
+                    )
+                elif time.perf_counter() - start > args.ready_timeout:
+                    logger.error(f"Orcestator not ready after {args.ready_timeout:.0f}s, stopping")
+                    return 1
+            time.sleep(0.1 if not ready else 0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for component in reversed(components):
+            component.stop()
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Build the launcher command line parser.
+    
+    Returns:
+        argparse.ArgumentParser: Parser with the `serve` command
+    """
+    parser = argparse.ArgumentParser(prog="orcestator")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    serve_parser = commands.add_parser("serve", help="Run the controller, worker and API server")
+    serve_parser.add_argument("--host", type=str, default=Config.HOST)
+    serve_parser.add_argument("--port", type=int, default=Config.PORT)
+    serve_parser.add_argument("--controller-port", type=int, default=Config.CONTROLLER_PORT)
+    serve_parser.add_argument("--worker-port", type=int, default=Config.WORKER_PORT)
+    serve_parser.add_argument("--num-workers", type=int, default=1)
+    serve_parser.add_argument("--model-id", type=str, default="orcestator")
+    serve_parser.add_argument("--limit-worker-concurrency", type=int, default=5)
+    serve_parser.add_argument("--api-keys", type=str)
+    serve_parser.add_argument("--ready-timeout", type=float, default=120.0, help="Seconds to wait for readiness")
+    serve_parser.add_argument(
+        "--max-restarts", type=int, default=5,
+        help="Restarts of a crashing component before the stack is stopped",
+    )
+    return parser
+
+
+def main() -> None:
+    """Entry point of the `orcestator` command."""
+    logging.basicConfig(
+        level=getattr(logging, Config.LOG_LEVEL),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    args = build_parser().parse_args()
+    if args.command == "serve":
+        sys.exit(serve(args))
+
+
+if __name__ == "__main__":
+    main()
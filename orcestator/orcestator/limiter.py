@@ -0,0 +1,228 @@
+"""
+Adaptive concurrency limiting for Orcestator.
+Admits upstream requests through a priority queue whose capacity follows
+an AIMD limit driven by upstream latency and overload responses.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from typing import List, Optional, Tuple
+
+from orcestator.logger import ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTED, ADMISSION_WAIT, CONCURRENCY_LIMIT
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BATCH: "batch"}
+
+
+class AdmissionTimeout(Exception):
+    """Raised when a request waits in the admission queue past its deadline."""
+
+
+class AIMDLimit:
+    """
+    Additive-increase/multiplicative-decrease concurrency limit.
+    
+    The limit grows by about one per round of requests while the limit is
+    actually being used and latency stays within `latency_tolerance` times
+    the observed baseline. It is multiplied by `backoff` on overload
+    (429/503, timeouts) or latency above that bound, at most once per
+    baseline latency so a burst of slow responses counts as one signal.
+    """
+    
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int,
+        max_limit: int,
+        latency_tolerance: float = 2.0,
+        backoff: float = 0.9,
+    ):
+        """
+        Initialize the limit.
+        
+        Args:
+            initial: Starting limit
+            min_limit: Lowest allowed limit
+            max_limit: Highest allowed limit
+            latency_tolerance: Allowed ratio of latency to the baseline
+            backoff: Factor applied on a decrease
+        """
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.baseline: Optional[float] = None
+        self._last_decrease = 0.0
+        CONCURRENCY_LIMIT.set(self.limit)
+    
+    @property
+    def value(self) -> int:
+        """Current limit as a whole number of requests."""
+        return max(self.min_limit, int(self.limit))
+    
+    def _decrease(self) -> None:
+        """Apply a multiplicative decrease unless one happened very recently."""
+        now = time.monotonic()
+        if now - self._last_decrease < max(self.baseline or 0.0, 0.1):
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_limit), self.limit * self.backoff)
+        CONCURRENCY_LIMIT.set(self.limit)
+    
+    def on_sample(self, latency: Optional[float], overloaded: bool, saturated: bool) -> None:
+        """
+        Update the limit after a request finished.
+        
+        Args:
+            latency: Time to first token, or None if not measured
+            overloaded: Whether the upstream signalled overload
+            saturated: Whether the limit was fully used when the request ran
+        """
+        if overloaded:
+            self._decrease()
+            return
+        
+        if latency is not None:
+            if self.baseline is None or latency < self.baseline:
+                self.baseline = latency
+            else:
+                # Let the baseline drift up slowly so it tracks real changes.
+                self.baseline += 0.01 * (latency - self.baseline)
+            
+            if latency > self.baseline * self.latency_tolerance:
+                self._decrease()
+                return
+        
+        if saturated:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            CONCURRENCY_LIMIT.set(self.limit)
+
+
+class Permit:
+    """A granted admission slot; report its first token time before release."""
+    
+    def __init__(self, priority: int, saturated: bool):
+        self.priority = priority
+        self.saturated = saturated
+        self.start_time = time.perf_counter()
+        self.queue_wait = 0.0
+        self.ttft: Optional[float] = None
+    
+    def mark_first_token(self) -> None:
+        """Record time to first token for the latency signal."""
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.start_time
+
+
+class AdmissionQueue:
+    """
+    Priority admission queue bounded by an AIMD limit.
+    
+    Lower priority numbers are admitted first, in arrival order within a
+    priority. A waiter that is not admitted before its deadline gets
+    AdmissionTimeout instead of waiting indefinitely.
+    """
+    
+    def __init__(self, limit: AIMDLimit):
+        """
+        Initialize the queue.
+        
+        Args:
+            limit: Adaptive limit on requests in flight
+        """
+        self.limit = limit
+        self.in_flight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+    
+    def __len__(self) -> int:
+        return len(self._waiters)
+    
+    def _update_depth(self) -> None:
+        """Export queue depth per priority."""
+        for priority, name in PRIORITY_NAMES.items():
+            depth = sum(1 for p, _, f in self._waiters if p == priority and not f.done())
+            ADMISSION_QUEUE_DEPTH.labels(priority=name).set(depth)
+    
+    def _grant(self, priority: int) -> Permit:
+        """Take a slot and create its permit."""
+        self.in_flight += 1
+        return Permit(priority, saturated=self.in_flight >= self.limit.value)
+    
+    async def acquire(self, priority: int, deadline: float) -> Permit:
+        """
+        Wait for an admission slot.
+        
+        Args:
+            priority: PRIORITY_INTERACTIVE or PRIORITY_BATCH
+            deadline: Maximum seconds to wait in the queue
+            
+        Returns:
+            Permit: The granted slot
+        """
+        name = PRIORITY_NAMES.get(priority, str(priority))
+        start = time.perf_counter()
+        
+        if self.in_flight < self.limit.value and not self._waiters:
+            ADMISSION_WAIT.labels(priority=name).observe(0.0)
+            return self._grant(priority)
+        
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        self._update_depth()
+        try:
+            permit = await asyncio.wait_for(asyncio.shield(future), timeout=deadline)
+        except asyncio.TimeoutError:
+            self._abandon(future)
+            ADMISSION_REJECTED.labels(priority=name).inc()
+            raise AdmissionTimeout(f"Request waited more than {deadline:.1f}s for an upstream slot")
+        except asyncio.CancelledError:
+            self._abandon(future)
+            raise
+        finally:
+            self._update_depth()
+        
+        permit.queue_wait = time.perf_counter() - start
+        ADMISSION_WAIT.labels(priority=name).observe(permit.queue_wait)
+        return permit
+    
+    def _abandon(self, future: asyncio.Future) -> None:
+        """
+        Remove a waiter that gave up, returning its slot if it was admitted.
+        
+        Args:
+            future: The waiter's future
+        """
+        if future.done() and not future.cancelled():
+            # Admitted just as it gave up; hand the slot back untouched.
+            self.in_flight -= 1
+        future.cancel()
+        self._waiters = [w for w in self._waiters if w[2] is not future]
+        heapq.heapify(self._waiters)
+        self._admit()
+    
+    def _admit(self) -> None:
+        """Admit waiters in priority order while the limit allows."""
+        while self._waiters and self.in_flight < self.limit.value:
+            priority, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            future.set_result(self._grant(priority))
+    
+    def release(self, permit: Permit, overloaded: bool) -> None:
+        """
+        Return a slot, update the limit and admit waiting requests.
+        
+        Args:
+            permit: Slot being returned
+            overloaded: Whether the upstream signalled overload
+        """
+        self.in_flight -= 1
+        self.limit.on_sample(permit.ttft, overloaded, permit.saturated)
+        self._admit()
+        self._update_depth()
@@ -3,18 +3,23 @@ Logging module for Orcestator.
 Provides text logging and Prometheus metrics.
 """
 
-import csv
+import asyncio
+import atexit
+import json
 import logging
 import os
+import queue
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
-from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, multiprocess, start_http_server
 
 from orcestator.config import Config
-from orcestator.db import log_request
+from orcestator.logstore import SegmentLog
 
 
 logging.basicConfig(
@@ -23,7 +28,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger("orcestator")
 
-os.makedirs(os.path.dirname(Config.LOG_FILE), exist_ok=True)
+# prometheus_client picks its value storage at import time from this variable.
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
 
 REQUEST_COUNT = Counter(
     "orcestator_requests_total", 
@@ -40,6 +46,11 @@ COMPLETION_TOKENS = Counter(
     "Total number of completion tokens processed",
     ["model"]
 )
+CANCELLED_REQUESTS = Counter(
+    "orcestator_cancelled_requests_total",
+    "Streaming requests stopped early because the client disconnected",
+    ["model"]
+)
 LATENCY = Histogram(
     "orcestator_request_latency_seconds", 
     "Request latency in seconds",
@@ -48,21 +59,672 @@ LATENCY = Histogram(
 ACTIVE_REQUESTS = Gauge(
     "orcestator_active_requests", 
     "Number of active requests",
+    ["model"],
+    multiprocess_mode="livesum"
+)
+CACHE_HITS = Counter(
+    "orcestator_cache_hits_total",
+    "Total number of response cache hits",
+    ["tier"]
+)
+CACHE_MISSES = Counter(
+    "orcestator_cache_misses_total",
+    "Total number of response cache misses"
+)
+CACHE_EVICTIONS = Counter(
+    "orcestator_cache_evictions_total",
+    "Total number of response cache evictions",
+    ["reason"]
+)
+SEMANTIC_CACHE_SIMILARITY = Histogram(
+    "orcestator_semantic_cache_similarity",
+    "Similarity of the nearest semantic cache entry per lookup",
+    ["model"],
+    buckets=(0.5, 0.7, 0.8, 0.85, 0.9, 0.93, 0.95, 0.97, 0.98, 0.99, 1.0)
+)
+ESTIMATED_TOKENS = Counter(
+    "orcestator_estimated_tokens_total",
+    "Tokens counted locally because the upstream sent no usage",
+    ["model", "kind"]
+)
+CONTEXT_TRIMMED_REQUESTS = Counter(
+    "orcestator_context_trimmed_requests_total",
+    "Total number of requests trimmed to the context budget",
+    ["model"]
+)
+CONTEXT_TRIMMED_TOKENS = Counter(
+    "orcestator_context_trimmed_tokens_total",
+    "Prompt tokens removed to fit the context budget",
     ["model"]
 )
+COALESCED_REQUESTS = Counter(
+    "orcestator_coalesced_requests_total",
+    "Total number of requests served by in-flight coalescing",
+    ["role"]
+)
+HEDGED_REQUESTS = Counter(
+    "orcestator_hedged_requests_total",
+    "Hedged streaming requests by event: sent, won, wasted or denied by the budget",
+    ["model", "event"]
+)
+WORKER_RESOLUTIONS = Counter(
+    "orcestator_worker_resolutions_total",
+    "Worker lookups by the API server, from the cached worker list or the controller",
+    ["source"]
+)
+BATCH_REQUESTS = Counter(
+    "orcestator_batch_requests_total",
+    "Requests of offline batch jobs by outcome: completed, failed or retried",
+    ["outcome"]
+)
+UPSTREAM_REQUESTS = Counter(
+    "orcestator_upstream_requests_total",
+    "Total number of upstream attempts by outcome",
+    ["upstream", "outcome"]
+)
+UPSTREAM_TTFT_EWMA = Gauge(
+    "orcestator_upstream_ttft_ewma_seconds",
+    "Moving average of time to first token per upstream",
+    ["upstream"],
+    multiprocess_mode="livemostrecent"
+)
+UPSTREAM_CIRCUIT_OPEN = Gauge(
+    "orcestator_upstream_circuit_open",
+    "Whether the upstream circuit breaker is open (1) or closed (0)",
+    ["upstream"],
+    multiprocess_mode="livemax"
+)
+CONCURRENCY_LIMIT = Gauge(
+    "orcestator_concurrency_limit",
+    "Current adaptive limit on upstream requests in flight",
+    multiprocess_mode="livesum"
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "orcestator_admission_queue_depth",
+    "Number of requests waiting for an upstream slot",
+    ["priority"],
+    multiprocess_mode="livesum"
+)
+ADMISSION_WAIT = Histogram(
+    "orcestator_admission_wait_seconds",
+    "Time requests waited for an upstream slot",
+    ["priority"]
+)
+ADMISSION_REJECTED = Counter(
+    "orcestator_admission_rejected_total",
+    "Total number of requests rejected after their queue deadline",
+    ["priority"]
+)
+RATE_LIMITED = Counter(
+    "orcestator_rate_limited_total",
+    "Total number of requests rejected by a rate limit",
+    ["model", "limit"]
+)
+QUOTA_REQUESTS = Counter(
+    "orcestator_quota_requests_total",
+    "Total number of requests admitted per client key",
+    ["client", "model"]
+)
+QUOTA_TOKENS = Counter(
+    "orcestator_quota_tokens_total",
+    "Total number of tokens charged per client key",
+    ["client", "model"]
+)
+QUEUE_WAIT = Histogram(
+    "orcestator_queue_wait_seconds",
+    "Time a request waited for an upstream slot",
+    ["model", "target_model"]
+)
+UPSTREAM_CONNECT = Histogram(
+    "orcestator_upstream_connect_seconds",
+    "Time spent opening the upstream connection (zero when a pooled one was reused)",
+    ["model", "target_model"],
+    buckets=(0.0, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+TIME_TO_FIRST_BYTE = Histogram(
+    "orcestator_time_to_first_byte_seconds",
+    "Time from sending the upstream request to its response headers",
+    ["model", "target_model"]
+)
+TIME_TO_FIRST_TOKEN = Histogram(
+    "orcestator_time_to_first_token_seconds",
+    "Time from receiving a request to its first generated token",
+    ["model", "target_model"]
+)
+INTER_TOKEN_LATENCY = Histogram(
+    "orcestator_inter_token_latency_seconds",
+    "Gap between consecutive streamed chunks",
+    ["model", "target_model"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+TOKENS_PER_SECOND = Histogram(
+    "orcestator_tokens_per_second",
+    "Completion tokens per second after the first token",
+    ["model", "target_model"],
+    buckets=(1, 5, 10, 20, 35, 50, 75, 100, 150, 250, 500)
+)
+UPSTREAM_POOL_WAIT = Histogram(
+    "orcestator_upstream_pool_wait_seconds",
+    "Time spent waiting for an upstream connection from the pool"
+)
+UPSTREAM_CONNECTIONS_IN_USE = Gauge(
+    "orcestator_upstream_connections_in_use",
+    "Number of upstream connections currently serving requests",
+    multiprocess_mode="livesum"
+)
+UPSTREAM_CONNECTIONS_OPEN = Gauge(
+    "orcestator_upstream_connections_open",
+    "Number of open upstream connections, idle or busy",
+    multiprocess_mode="livesum"
+)
+LOG_QUEUE_DEPTH = Gauge(
+    "orcestator_log_queue_depth",
+    "Number of traffic log entries waiting to be written",
+    multiprocess_mode="livesum"
+)
+LOG_ENTRIES_WRITTEN = Counter(
+    "orcestator_log_entries_written_total",
+    "Total number of traffic log entries written"
+)
+LOG_ENTRIES_DROPPED = Counter(
+    "orcestator_log_entries_dropped_total",
+    "Total number of traffic log entries dropped by the overflow policy",
+    ["reason"]
+)
 
 
 def start_metrics_server(port: int = 8001) -> None:
     """
     Start the Prometheus metrics server.
     
+    In multi-process mode (PROMETHEUS_MULTIPROC_DIR set) the server
+    aggregates the metrics of every process sharing that directory.
+    
     Args:
         port: Port to run the metrics server on
     """
-    start_http_server(port)
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        start_http_server(port, registry=registry)
+    else:
+        start_http_server(port)
     logger.info(f"Prometheus metrics server started on port {port}")
 
 
+_sampled_gauges: List[Tuple[Gauge, Callable[[], float]]] = []
+
+
+def track_gauge(gauge: Gauge, function: Callable[[], float]) -> None:
+    """
+    Report a gauge from a function of the current state.
+    
+    In a single process the function is called at scrape time. In
+    multi-process mode the scrape happens elsewhere, so a background
+    thread samples the function once per second instead.
+    
+    Args:
+        gauge: Unlabelled gauge
+        function: Returns the current value
+    """
+    if not MULTIPROCESS:
+        gauge.set_function(function)
+        return
+    
+    _sampled_gauges.append((gauge, function))
+    if len(_sampled_gauges) == 1:
+        threading.Thread(target=_sample_gauges, name="orcestator-gauges", daemon=True).start()
+
+
+def _sample_gauges() -> None:
+    """Update the tracked gauges once per second."""
+    while True:
+        for gauge, function in list(_sampled_gauges):
+            try:
+                gauge.set(function())
+            except Exception:
+                # The sampled state may change under us; the next pass retries.
+                continue
+        time.sleep(1.0)
+
+
+LOG_HEADER = [
+    "timestamp", "user", "assistant", "prompt_tokens",
+    "completion_tokens", "latency_ms", "model", "original_model",
+    "queue_wait_ms", "connect_ms", "ttfb_ms", "ttft_ms",
+    "inter_token_ms", "tokens_per_second", "status"
+]
+
+TIMING_FIELDS = [
+    "queue_wait_ms", "connect_ms", "ttfb_ms", "ttft_ms",
+    "inter_token_ms", "tokens_per_second",
+]
+
+
+class TrafficLogWriter:
+    """
+    Background writer for the traffic log.
+    
+    Entries are put on a bounded queue and written by a dedicated thread
+    in batches, to a rotating segment log (see orcestator.logstore) and in
+    one database transaction per batch. A batch is flushed when it reaches
+    `batch_size` entries or `flush_interval` seconds after its first entry.
+    
+    When the queue is full, `overflow_policy` decides what happens:
+    "drop" discards the new entry, "block" waits up to one flush interval
+    for space before dropping, and "sample" starts keeping only every
+    `sample_every`-th entry once the queue is three quarters full. Called
+    on an event loop, "block" hands the entry to a thread that does the
+    waiting, so requests are never held up by the log.
+    """
+    
+    def __init__(
+        self,
+        log_file: str,
+        queue_size: int,
+        batch_size: int,
+        flush_interval: float,
+        overflow_policy: str = "drop",
+        sample_every: int = 10,
+        segments: Optional[SegmentLog] = None,
+    ):
+        """
+        Initialize the writer. The thread starts on the first submitted entry.
+        
+        Args:
+            log_file: Path to the traffic log file
+            queue_size: Maximum number of pending entries
+            batch_size: Maximum number of entries written per batch
+            flush_interval: Maximum seconds an entry waits before being written
+            overflow_policy: One of "drop", "block" or "sample"
+            sample_every: Keep one in this many entries when sampling
+            segments: Segment log to write to; a plain CSV log without
+                rotation when omitted
+        """
+        self.log_file = Path(log_file)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.sample_every = max(1, sample_every)
+        
+        self._queue: "queue.Queue[Optional[Dict]]" = queue.Queue(maxsize=queue_size)
+        self._high_water = max(1, queue_size * 3 // 4)
+        self._sample_count = 0
+        self._segments = segments or SegmentLog(str(log_file), LOG_HEADER, format_log_row, log_record)
+        self._thread: Optional[threading.Thread] = None
+        self._handoff: Optional[ThreadPoolExecutor] = None
+        self._waiting = 0
+        self._lock = threading.Lock()
+        self._closed = False
+    
+    def start(self) -> None:
+        """Start the writer thread if it is not running yet."""
+        with self._lock:
+            if self._thread is not None or self._closed:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="orcestator-traffic-log", daemon=True
+            )
+            self._thread.start()
+            track_gauge(LOG_QUEUE_DEPTH, self._queue.qsize)
+    
+    def submit(self, entry: Dict) -> bool:
+        """
+        Queue an entry for writing without touching the disk.
+        
+        Args:
+            entry: Log fields as accepted by log_to_file, plus a timestamp
+            
+        Returns:
+            bool: True if the entry was queued or handed off, False if it
+            was dropped
+        """
+        if self._closed:
+            LOG_ENTRIES_DROPPED.labels(reason="closed").inc()
+            return False
+        
+        if self._thread is None:
+            self.start()
+        
+        if self.overflow_policy == "sample" and self._queue.qsize() >= self._high_water:
+            self._sample_count += 1
+            if self._sample_count % self.sample_every:
+                LOG_ENTRIES_DROPPED.labels(reason="sampled").inc()
+                return False
+        
+        try:
+            self._queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            pass
+        
+        if self.overflow_policy == "block":
+            return self._block(entry)
+        LOG_ENTRIES_DROPPED.labels(reason="overflow").inc()
+        return False
+    
+    def _block(self, entry: Dict) -> bool:
+        """
+        Wait for space in the full queue, off the event loop if called on one.
+        
+        At most `queue_size` entries wait in the handoff thread; beyond
+        that they are dropped, as with the "drop" policy.
+        
+        Args:
+            entry: Log entry
+        
+        Returns:
+            bool: True if the entry was queued or handed off, False if it was dropped
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return self._put_waiting(entry)
+        
+        with self._lock:
+            if self._closed or self._waiting >= self._queue.maxsize:
+                LOG_ENTRIES_DROPPED.labels(reason="overflow").inc()
+                return False
+            if self._handoff is None:
+                self._handoff = ThreadPoolExecutor(max_workers=1, thread_name_prefix="orcestator-traffic-log-handoff")
+            self._waiting += 1
+            self._handoff.submit(self._handoff_put, entry)
+        return True
+    
+    def _put_waiting(self, entry: Dict) -> bool:
+        """Queue an entry, waiting up to one flush interval for space."""
+        try:
+            self._queue.put(entry, timeout=self.flush_interval)
+        except queue.Full:
+            LOG_ENTRIES_DROPPED.labels(reason="overflow").inc()
+            return False
+        return True
+    
+    def _handoff_put(self, entry: Dict) -> None:
+        """Queue a handed-off entry from the handoff thread."""
+        try:
+            self._put_waiting(entry)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+    
+    def close(self, timeout: float = 10.0) -> None:
+        """
+        Flush pending entries and stop the writer thread.
+        
+        Args:
+            timeout: Maximum seconds to wait for the final flush
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+            handoff = self._handoff
+        
+        if handoff is not None:
+            # Handed-off entries go in before the sentinel.
+            handoff.shutdown(wait=True)
+        if thread is None:
+            return
+        
+        # The sentinel must get through even if the queue is full.
+        while thread.is_alive():
+            try:
+                self._queue.put(None, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        thread.join(timeout)
+    
+    def _run(self) -> None:
+        """Drain the queue in batches until the shutdown sentinel arrives."""
+        running = True
+        while running:
+            entry = self._queue.get()
+            if entry is None:
+                break
+            
+            batch = [entry]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is None:
+                    running = False
+                    break
+                batch.append(entry)
+            
+            self._write_batch(batch)
+        
+        try:
+            self._segments.close()
+        except Exception as e:
+            logger.error(f"Failed to close traffic log: {str(e)}")
+        if Config.DB_PATH:
+            from orcestator.db import close_audit_writer
+            
+            close_audit_writer()
+    
+    def _write_batch(self, batch: List[Dict]) -> None:
+        """
+        Write one batch to the log file and the database.
+        
+        Args:
+            batch: Queued log entries
+        """
+        try:
+            self._segments.write(batch)
+        except Exception as e:
+            logger.error(f"Failed to write traffic log: {str(e)}")
+        
+        if Config.DB_PATH:
+            # SQLAlchemy is only imported by processes that write the database.
+            from orcestator.db import log_requests
+            
+            try:
+                log_requests(batch)
+            except Exception as e:
+                logger.error(f"Failed to write request log to database: {str(e)}")
+        
+        LOG_ENTRIES_WRITTEN.inc(len(batch))
+
+
+def _shorten(message: Union[str, List]) -> str:
+    """Shorten a message to 100 characters on a single line; content part lists are logged as JSON."""
+    if not isinstance(message, str):
+        message = json.dumps(message, ensure_ascii=False)
+    message_short = (message[:100] + "...") if len(message) > 100 else message
+    return message_short.replace("\n", " ")
+
+
+def format_log_row(entry: Dict) -> List[str]:
+    """
+    Format a log entry as a traffic log row with shortened messages.
+    
+    Args:
+        entry: Log entry fields
+        
+    Returns:
+        List[str]: Row values in LOG_HEADER order
+    """
+    return [
+        entry["timestamp"].isoformat(),
+        _shorten(entry["user_message"]),
+        _shorten(entry["assistant_message"]),
+        str(entry["prompt_tokens"]),
+        str(entry["completion_tokens"]),
+        str(entry["latency_ms"]),
+        entry["model"],
+        entry["original_model"],
+    ] + ["" if entry.get(field) is None else str(entry[field]) for field in TIMING_FIELDS] + [
+        entry.get("status", "ok")
+    ]
+
+
+def log_record(entry: Dict) -> Dict:
+    """
+    Convert a log entry to typed column values for columnar segments.
+    
+    Args:
+        entry: Log entry fields
+    
+    Returns:
+        Dict: Values by LOG_HEADER column, messages shortened as in the CSV
+    """
+    record = {
+        "timestamp": entry["timestamp"],
+        "user": _shorten(entry["user_message"]),
+        "assistant": _shorten(entry["assistant_message"]),
+        "prompt_tokens": entry["prompt_tokens"],
+        "completion_tokens": entry["completion_tokens"],
+        "latency_ms": entry["latency_ms"],
+        "model": entry["model"],
+        "original_model": entry["original_model"],
+    }
+    for field in TIMING_FIELDS:
+        record[field] = entry.get(field)
+    record["status"] = entry.get("status", "ok")
+    return record
+
+
+class LogForwarder:
+    """
+    Traffic log writer stand-in for worker processes in multi-process mode.
+    
+    Entries are handed to the supervising process over a multiprocessing
+    queue, so a single TrafficLogWriter owns the log file and the database
+    and rows from different processes never interleave or contend for the
+    SQLite lock.
+    """
+    
+    def __init__(self, log_queue):
+        """
+        Initialize the forwarder.
+        
+        Args:
+            log_queue: multiprocessing queue drained by the supervisor
+        """
+        self._queue = log_queue
+        self._closed = False
+    
+    def submit(self, entry: Dict) -> bool:
+        """
+        Hand an entry to the supervisor without blocking.
+        
+        Args:
+            entry: Log fields as accepted by log_to_file, plus a timestamp
+            
+        Returns:
+            bool: True if the entry was queued, False if it was dropped
+        """
+        if self._closed:
+            LOG_ENTRIES_DROPPED.labels(reason="closed").inc()
+            return False
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            LOG_ENTRIES_DROPPED.labels(reason="overflow").inc()
+            return False
+        return True
+    
+    def close(self, timeout: float = 10.0) -> None:
+        """
+        Flush entries still buffered for the supervisor.
+        
+        Args:
+            timeout: Unused; the queue's feeder thread is joined
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.close()
+        self._queue.join_thread()
+
+
+def drain_forwarded_logs(log_queue) -> threading.Thread:
+    """
+    Write entries forwarded by worker processes until a None sentinel arrives.
+    
+    Args:
+        log_queue: multiprocessing queue the LogForwarders put entries on
+        
+    Returns:
+        threading.Thread: The started draining thread
+    """
+    writer = get_log_writer()
+    
+    def _drain() -> None:
+        while True:
+            entry = log_queue.get()
+            if entry is None:
+                break
+            writer.submit(entry)
+    
+    thread = threading.Thread(target=_drain, name="orcestator-log-drain", daemon=True)
+    thread.start()
+    return thread
+
+
+_log_writer: Optional[Union[TrafficLogWriter, LogForwarder]] = None
+
+
+def forward_logs(log_queue) -> None:
+    """
+    Send this process's traffic log entries to the supervising process.
+    
+    Args:
+        log_queue: multiprocessing queue drained by drain_forwarded_logs
+    """
+    global _log_writer
+    _log_writer = LogForwarder(log_queue)
+    atexit.register(_log_writer.close)
+
+
+def get_log_writer() -> Union[TrafficLogWriter, LogForwarder]:
+    """
+    Get the process-wide traffic log writer, creating it on first use.
+    
+    Returns:
+        TrafficLogWriter: The shared writer, or a LogForwarder in worker
+        processes of the multi-process mode
+    """
+    global _log_writer
+    if _log_writer is None:
+        _log_writer = TrafficLogWriter(
+            log_file=Config.LOG_FILE,
+            queue_size=Config.LOG_QUEUE_SIZE,
+            batch_size=Config.LOG_BATCH_SIZE,
+            flush_interval=Config.LOG_FLUSH_INTERVAL,
+            overflow_policy=Config.LOG_OVERFLOW_POLICY,
+            sample_every=Config.LOG_SAMPLE_EVERY,
+            segments=SegmentLog(
+                Config.LOG_FILE,
+                LOG_HEADER,
+                format_log_row,
+                log_record,
+                log_format=Config.LOG_FORMAT,
+                max_bytes=Config.LOG_ROTATE_BYTES,
+                max_age=Config.LOG_ROTATE_INTERVAL,
+                compress=Config.LOG_COMPRESS,
+                row_group_size=Config.LOG_ROW_GROUP_SIZE,
+            ),
+        )
+        atexit.register(_log_writer.close)
+    return _log_writer
+
+
+def shutdown_logging() -> None:
+    """Flush pending traffic log entries and stop the writer."""
+    if _log_writer is not None:
+        _log_writer.close()
+
+
 def log_to_file(
     user_message: str,
     assistant_message: str,
@@ -71,9 +733,16 @@ def log_to_file(
     latency_ms: int,
     model: str,
     original_model: str = "",
+    timings: Optional[Dict] = None,
+    status: str = "ok",
+    messages: Optional[List[Dict]] = None,
 ) -> None:
     """
-    Log request details to the configured log file.
+    Queue request details for the traffic log file and database.
+    
+    The entry is written in the background by the TrafficLogWriter, so
+    this call never blocks on disk I/O (unless the "block" overflow
+    policy is configured and the queue is full).
     
     Args:
         user_message: The user's message
@@ -83,46 +752,27 @@ def log_to_file(
         latency_ms: Latency in milliseconds
         model: The model used (orcestator)
         original_model: The original model used (e.g., openai/gpt-4o)
+        timings: Phase timings keyed by TIMING_FIELDS, as returned by
+            RequestTimer.observe
+        status: "ok", or "cancelled" if the client disconnected mid-stream
+        messages: The full message list, stored in the database; the log
+            file only shows user_message
     """
-    timestamp = datetime.utcnow().isoformat()
-    
-    user_message_short = (user_message[:100] + "...") if len(user_message) > 100 else user_message
-    assistant_message_short = (assistant_message[:100] + "...") if len(assistant_message) > 100 else assistant_message
-    
-    log_entry = [
-        timestamp,
-        user_message_short.replace("\n", " "),
-        assistant_message_short.replace("\n", " "),
-        str(prompt_tokens),
-        str(completion_tokens),
-        str(latency_ms),
-        model,
-        original_model
-    ]
-    
-    log_file = Path(Config.LOG_FILE)
-    log_file.parent.mkdir(parents=True, exist_ok=True)
-    
-    file_exists = log_file.exists()
-    
-    with open(log_file, "a", newline="") as f:
-        writer = csv.writer(f, delimiter="|")
-        if not file_exists:
-            writer.writerow([
-                "timestamp", "user", "assistant", "prompt_tokens", 
-                "completion_tokens", "latency_ms", "model", "original_model"
-            ])
-        writer.writerow(log_entry)
-    
-    log_request(
-        user_message=user_message,
-        assistant_message=assistant_message,
-        prompt_tokens=prompt_tokens,
-        completion_tokens=completion_tokens,
-        latency_ms=latency_ms,
-        model=model,
-        original_model=original_model,
-    )
+    entry = {
+        "timestamp": datetime.utcnow(),
+        "messages": messages,
+        "user_message": user_message,
+        "assistant_message": assistant_message,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "latency_ms": latency_ms,
+        "model": model,
+        "original_model": original_model,
+        "status": status,
+    }
+    if timings:
+        entry.update(timings)
+    get_log_writer().submit(entry)
 
 
 def update_metrics(
@@ -130,51 +780,156 @@ def update_metrics(
     prompt_tokens: int,
     completion_tokens: int,
     latency_seconds: float,
+    status: str = "ok",
 ) -> None:
     """
     Update Prometheus metrics.
     
+    Tokens of cancelled requests are counted too, since the upstream
+    bills for what it generated before the stream was closed.
+    
     Args:
         model: The model used
         prompt_tokens: Number of tokens in the prompt
         completion_tokens: Number of tokens in the completion
         latency_seconds: Latency in seconds
+        status: "ok", or "cancelled" if the client disconnected mid-stream
     """
     REQUEST_COUNT.labels(model=model).inc()
     PROMPT_TOKENS.labels(model=model).inc(prompt_tokens)
     COMPLETION_TOKENS.labels(model=model).inc(completion_tokens)
     LATENCY.labels(model=model).observe(latency_seconds)
+    if status == "cancelled":
+        CANCELLED_REQUESTS.labels(model=model).inc()
+
+
+def _milliseconds(seconds: Optional[float]) -> Optional[int]:
+    """Convert seconds to whole milliseconds, keeping None."""
+    return None if seconds is None else int(seconds * 1000)
 
 
 class RequestTimer:
-    """Context manager for timing requests and updating metrics."""
+    """
+    Context manager timing one request and tracking active requests.
     
-    def __init__(self, model: str):
+    Besides total latency it collects the phases of a streamed request:
+    queue wait, upstream connect and time to first byte (reported by the
+    upstream call through mark_upstream), time to first token and the gaps
+    between chunks (marked as chunks are handed on through mark_token).
+    """
+    
+    def __init__(self, model: str, target_model: str = ""):
         """
         Initialize the timer.
         
         Args:
             model: The model being used
+            target_model: The upstream model, for the phase histograms
         """
         self.model = model
-        self.start_time = None
-        self.latency_seconds = 0
+        self.target_model = target_model
+        self.start_time: Optional[float] = None
+        self.end_time: Optional[float] = None
+        self.queue_wait: Optional[float] = None
+        self.connect: Optional[float] = None
+        self.ttfb: Optional[float] = None
+        self.ttft: Optional[float] = None
+        self.chunks = 0
+        self._last_token_time: Optional[float] = None
+        self._gap_total = 0.0
+        self._inter_token = INTER_TOKEN_LATENCY.labels(model=model, target_model=target_model)
     
     def __enter__(self) -> "RequestTimer":
         """Start the timer and increment active requests."""
-        self.start_time = time.time()
+        self.start_time = time.perf_counter()
         ACTIVE_REQUESTS.labels(model=self.model).inc()
         return self
     
     def __exit__(self, exc_type, exc_val, exc_tb) -> None:
         """
-        Stop the timer, calculate latency, and decrement active requests.
+        Stop the timer and decrement active requests.
         
         Args:
             exc_type: Exception type if an exception was raised
             exc_val: Exception value if an exception was raised
             exc_tb: Exception traceback if an exception was raised
         """
-        if self.start_time is not None:
-            self.latency_seconds = time.time() - self.start_time
+        if self.start_time is not None and self.end_time is None:
+            self.end_time = time.perf_counter()
             ACTIVE_REQUESTS.labels(model=self.model).dec()
+    
+    @property
+    def latency_seconds(self) -> float:
+        """Seconds since the timer started, or the total once it has stopped."""
+        if self.start_time is None:
+            return 0.0
+        end = self.end_time if self.end_time is not None else time.perf_counter()
+        return end - self.start_time
+    
+    def mark_upstream(
+        self,
+        queue_wait: Optional[float],
+        connect: Optional[float],
+        ttfb: Optional[float],
+    ) -> None:
+        """
+        Record the upstream phases of the request.
+        
+        Args:
+            queue_wait: Seconds spent waiting for an upstream slot
+            connect: Seconds spent opening the upstream connection
+            ttfb: Seconds from sending the upstream request to its headers
+        """
+        self.queue_wait = queue_wait
+        self.connect = connect
+        self.ttfb = ttfb
+    
+    def mark_token(self) -> None:
+        """Record that a chunk of generated text was handed on."""
+        now = time.perf_counter()
+        if self._last_token_time is None:
+            self.ttft = now - self.start_time
+        else:
+            gap = now - self._last_token_time
+            self._gap_total += gap
+            self._inter_token.observe(gap)
+        self._last_token_time = now
+        self.chunks += 1
+    
+    def observe(self, completion_tokens: int) -> Dict:
+        """
+        Export the phase histograms for a finished request.
+        
+        Args:
+            completion_tokens: Number of tokens in the completion
+            
+        Returns:
+            Dict: Phase timings keyed by TIMING_FIELDS, None where unknown
+        """
+        labels = {"model": self.model, "target_model": self.target_model}
+        
+        tokens_per_second = None
+        if self.ttft is not None and completion_tokens:
+            # A single chunk means a non-streamed body: rate over the whole call.
+            window = self.latency_seconds - self.ttft if self.chunks > 1 else self.latency_seconds
+            if window > 0:
+                tokens_per_second = completion_tokens / window
+        
+        for histogram, value in (
+            (QUEUE_WAIT, self.queue_wait),
+            (UPSTREAM_CONNECT, self.connect),
+            (TIME_TO_FIRST_BYTE, self.ttfb),
+            (TIME_TO_FIRST_TOKEN, self.ttft),
+            (TOKENS_PER_SECOND, tokens_per_second),
+        ):
+            if value is not None:
+                histogram.labels(**labels).observe(value)
+        
+        return {
+            "queue_wait_ms": _milliseconds(self.queue_wait),
+            "connect_ms": _milliseconds(self.connect),
+            "ttfb_ms": _milliseconds(self.ttfb),
+            "ttft_ms": _milliseconds(self.ttft),
+            "inter_token_ms": _milliseconds(self._gap_total / (self.chunks - 1)) if self.chunks > 1 else None,
+            "tokens_per_second": None if tokens_per_second is None else round(tokens_per_second, 2),
+        }
@@ -0,0 +1,298 @@
+"""
+Query command for the Orcestator traffic log.
+Streams rows from every log segment (CSV, gzipped CSV, Arrow IPC or
+Parquet) and prints request counts, token totals and latency percentiles
+per group, in constant memory per group.
+
+Usage:
+    orcestator-logs --since 7d --group-by model
+    orcestator-logs --since 2024-05-01 --until 2024-05-02 --model openai/gpt-4o --json
+"""
+
+import argparse
+import json
+import math
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional
+
+from orcestator.config import Config
+from orcestator.logstore import list_segments, read_segment
+
+QUERY_COLUMNS = [
+    "timestamp", "model", "original_model", "prompt_tokens",
+    "completion_tokens", "latency_ms", "ttft_ms", "tokens_per_second", "status",
+]
+
+GROUP_KEYS = {
+    "model": lambda row: row["model"],
+    "original_model": lambda row: row.get("original_model") or "",
+    "day": lambda row: row["timestamp"].strftime("%Y-%m-%d"),
+    "hour": lambda row: row["timestamp"].strftime("%Y-%m-%d %H:00"),
+    # Rows written before the status column was added are completed requests.
+    "status": lambda row: row.get("status") or "ok",
+    "none": lambda row: "all",
+}
+
+_DURATION = re.compile(r"^(\d+(?:\.\d+)?)([smhdw])$")
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+class QuantileSketch:
+    """
+    Streaming quantile estimate with bounded relative error.
+    
+    Values are counted in logarithmic buckets, so memory grows with the
+    value range rather than the number of values, and every quantile is
+    within `relative_accuracy` of the exact one.
+    """
+    
+    def __init__(self, relative_accuracy: float = 0.01):
+        """
+        Initialize an empty sketch.
+        
+        Args:
+            relative_accuracy: Maximum relative error of a quantile
+        """
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self._buckets: Dict[int, int] = {}
+        self._zeros = 0
+        self.count = 0
+    
+    def add(self, value: float) -> None:
+        """
+        Add a value.
+        
+        Args:
+            value: Non-negative value
+        """
+        self.count += 1
+        if value <= 0:
+            self._zeros += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self._buckets[index] = self._buckets.get(index, 0) + 1
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate a quantile.
+        
+        Args:
+            q: Quantile between 0 and 1
+        
+        Returns:
+            Optional[float]: The estimate, or None if the sketch is empty
+        """
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self._zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if rank < seen:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self._buckets) / (self.gamma + 1)
+
+
+class GroupStats:
+    """Running aggregates of one group of requests."""
+    
+    def __init__(self):
+        self.requests = 0
+        self.cancelled = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency = QuantileSketch()
+        self.ttft = QuantileSketch()
+        self._tokens_per_second = 0.0
+        self._tokens_per_second_count = 0
+    
+    def add(self, row: Dict) -> None:
+        """
+        Add one request.
+        
+        Args:
+            row: Traffic log row
+        """
+        self.requests += 1
+        if row.get("status") == "cancelled":
+            self.cancelled += 1
+        self.prompt_tokens += row.get("prompt_tokens") or 0
+        self.completion_tokens += row.get("completion_tokens") or 0
+        if row.get("latency_ms") is not None:
+            self.latency.add(row["latency_ms"])
+        if row.get("ttft_ms") is not None:
+            self.ttft.add(row["ttft_ms"])
+        if row.get("tokens_per_second") is not None:
+            self._tokens_per_second += row["tokens_per_second"]
+            self._tokens_per_second_count += 1
+    
+    def summary(self) -> Dict:
+        """
+        Get the aggregates.
+        
+        Returns:
+            Dict: Request and cancellation counts, token totals, latency
+            and TTFT percentiles in milliseconds and the mean generation speed
+        """
+        def _round(value: Optional[float]) -> Optional[float]:
+            return None if value is None else round(value, 1)
+        
+        return {
+            "requests": self.requests,
+            "cancelled": self.cancelled,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "latency_p50_ms": _round(self.latency.quantile(0.5)),
+            "latency_p95_ms": _round(self.latency.quantile(0.95)),
+            "latency_p99_ms": _round(self.latency.quantile(0.99)),
+            "ttft_p50_ms": _round(self.ttft.quantile(0.5)),
+            "ttft_p95_ms": _round(self.ttft.quantile(0.95)),
+            "tokens_per_second": _round(
+                self._tokens_per_second / self._tokens_per_second_count
+                if self._tokens_per_second_count else None
+            ),
+        }
+
+
+def parse_time(value: str, now: datetime) -> datetime:
+    """
+    Parse a relative duration ("7d", "24h", "30m") or an ISO date/time.
+    
+    Args:
+        value: Command line value
+        now: Reference time for relative durations (UTC, naive)
+    
+    Returns:
+        datetime: Naive UTC time, as stored in the log
+    """
+    match = _DURATION.match(value.strip())
+    if match:
+        return now - timedelta(seconds=float(match.group(1)) * _UNITS[match.group(2)])
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def iter_rows(
+    log_file: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    model: Optional[str] = None,
+) -> Iterator[Dict]:
+    """
+    Stream the matching rows of all segments of a traffic log.
+    
+    Segments that start after `until`, or whose successor starts before
+    `since`, are skipped without being opened.
+    
+    Args:
+        log_file: Configured traffic log path
+        since: Earliest timestamp, inclusive
+        until: Latest timestamp, exclusive
+        model: Keep only rows of this model or original model
+    
+    Yields:
+        Dict: Row values by column name
+    """
+    segments = list_segments(log_file)
+    since_ts = since.replace(tzinfo=timezone.utc).timestamp() if since else None
+    until_ts = until.replace(tzinfo=timezone.utc).timestamp() if until else None
+    
+    for position, (started, path) in enumerate(segments):
+        if until_ts is not None and started >= until_ts:
+            continue
+        if since_ts is not None and position + 1 < len(segments) and segments[position + 1][0] < since_ts:
+            continue
+        
+        for row in read_segment(path, QUERY_COLUMNS):
+            timestamp = row["timestamp"]
+            if since and timestamp < since:
+                continue
+            if until and timestamp >= until:
+                continue
+            if model and model not in (row["model"], row.get("original_model")):
+                continue
+            yield row
+
+
+def aggregate(rows: Iterator[Dict], group_by: str) -> Dict[str, Dict]:
+    """
+    Aggregate rows per group.
+    
+    Args:
+        rows: Traffic log rows
+        group_by: One of GROUP_KEYS
+    
+    Returns:
+        Dict[str, Dict]: Summary per group key, sorted by key
+    """
+    key = GROUP_KEYS[group_by]
+    groups: Dict[str, GroupStats] = {}
+    for row in rows:
+        name = key(row)
+        stats = groups.get(name)
+        if stats is None:
+            stats = groups[name] = GroupStats()
+        stats.add(row)
+    return {name: groups[name].summary() for name in sorted(groups)}
+
+
+def print_table(results: Dict[str, Dict], group_by: str) -> None:
+    """
+    Print summaries as a text table.
+    
+    Args:
+        results: Summary per group
+        group_by: Grouping, used as the first column title
+    """
+    columns = ["requests", "cancelled", "prompt_tokens", "completion_tokens", "latency_p50_ms",
+               "latency_p95_ms", "latency_p99_ms", "ttft_p50_ms", "ttft_p95_ms", "tokens_per_second"]
+    titles = ["requests", "cancelled", "prompt", "completion", "lat p50", "lat p95", "lat p99", "ttft p50", "ttft p95", "tok/s"]
+    width = max([len(group_by)] + [len(name) for name in results])
+    
+    print(f"{group_by:<{width}} " + " ".join(f"{title:>10}" for title in titles))
+    for name, summary in results.items():
+        values = ["-" if summary[column] is None else str(summary[column]) for column in columns]
+        print(f"{name:<{width}} " + " ".join(f"{value:>10}" for value in values))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Run the orcestator-logs command.
+    
+    Args:
+        argv: Command line arguments; sys.argv when omitted
+    """
+    parser = argparse.ArgumentParser(prog="orcestator-logs", description="Summarise the Orcestator traffic log")
+    parser.add_argument("--log-file", default=Config.LOG_FILE, help="Traffic log path (default: OR_LOG_FILE)")
+    parser.add_argument("--since", help="Start time: duration such as 7d or 24h, or ISO date/time (UTC)")
+    parser.add_argument("--until", help="End time: duration or ISO date/time (UTC)")
+    parser.add_argument("--model", help="Only requests for this model or original model")
+    parser.add_argument("--group-by", choices=sorted(GROUP_KEYS), default="model")
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+    args = parser.parse_args(argv)
+    
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    try:
+        since = parse_time(args.since, now) if args.since else None
+        until = parse_time(args.until, now) if args.until else None
+    except ValueError as e:
+        parser.error(str(e))
+    
+    results = aggregate(iter_rows(args.log_file, since, until, args.model), args.group_by)
+    
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        print_table(results, args.group_by)
+
+
+if __name__ == "__main__":
+    main()
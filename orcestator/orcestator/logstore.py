@@ -0,0 +1,493 @@
+"""
+Segmented traffic log storage for Orcestator.
+Rotates the traffic log by size and age, compresses closed CSV segments and
+can write columnar segments (Arrow IPC or Parquet) instead of CSV. Also
+reads the segments back for the orcestator-logs query command.
+"""
+
+import csv
+import gzip
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("orcestator")
+
+SEGMENT_TIME_FORMAT = "%Y%m%dT%H%M%SZ"
+
+COLUMNAR_FORMATS = ("arrow", "parquet")
+
+INTEGER_COLUMNS = (
+    "prompt_tokens", "completion_tokens", "latency_ms",
+    "queue_wait_ms", "connect_ms", "ttfb_ms", "ttft_ms", "inter_token_ms",
+)
+FLOAT_COLUMNS = ("tokens_per_second",)
+
+
+def columnar_available(log_format: str) -> bool:
+    """
+    Check whether a columnar log format can be used.
+    
+    Args:
+        log_format: Configured format
+    
+    Returns:
+        bool: True if the format is columnar and pyarrow is installed
+    """
+    if log_format not in COLUMNAR_FORMATS:
+        return False
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        logger.warning(f"OR_LOG_FORMAT={log_format} needs pyarrow, which is not installed; writing CSV")
+        return False
+    return True
+
+
+def arrow_schema(header: Sequence[str]):
+    """
+    Build the Arrow schema of the traffic log columns.
+    
+    Args:
+        header: Column names in log order
+    
+    Returns:
+        pyarrow.Schema: Typed schema
+    """
+    import pyarrow as pa
+    
+    fields = []
+    for name in header:
+        if name == "timestamp":
+            fields.append(pa.field(name, pa.timestamp("us")))
+        elif name in INTEGER_COLUMNS:
+            fields.append(pa.field(name, pa.int64()))
+        elif name in FLOAT_COLUMNS:
+            fields.append(pa.field(name, pa.float64()))
+        else:
+            fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+
+def _convert(entries: List[Dict], convert: Callable[[Dict], Any]) -> Iterator[Any]:
+    """
+    Convert entries for a segment, skipping the ones that cannot be converted.
+    
+    Args:
+        entries: Log entries
+        convert: Row or record conversion
+    
+    Yields:
+        Converted entries
+    """
+    for entry in entries:
+        try:
+            yield convert(entry)
+        except Exception as e:
+            logger.error(f"Skipping traffic log entry that cannot be written: {e!r}")
+
+
+class _CsvSegment:
+    """Pipe-delimited CSV segment with a header row."""
+    
+    def __init__(self, path: Path, header: List[str], format_row: Callable[[Dict], List[str]]):
+        self.path = path
+        self.format_row = format_row
+        self._file = open(path, "a", newline="")
+        self._writer = csv.writer(self._file, delimiter="|")
+        if self._file.tell() == 0:
+            self._writer.writerow(header)
+    
+    def write(self, entries: List[Dict]) -> None:
+        self._writer.writerows(_convert(entries, self.format_row))
+        self._file.flush()
+    
+    def size(self) -> int:
+        return self._file.tell()
+    
+    def close(self) -> None:
+        self._file.close()
+
+
+class _ArrowSegment:
+    """
+    Arrow IPC stream segment.
+    
+    Every batch is appended as a record batch and is readable right away,
+    since the stream format has no footer.
+    """
+    
+    def __init__(self, path: Path, header: List[str], to_record: Callable[[Dict], Dict]):
+        import pyarrow as pa
+        
+        self.path = path
+        self.to_record = to_record
+        self.schema = arrow_schema(header)
+        self._sink = pa.OSFile(str(path), "wb")
+        self._writer = pa.ipc.new_stream(
+            self._sink, self.schema, options=pa.ipc.IpcWriteOptions(compression="zstd")
+        )
+    
+    def write(self, entries: List[Dict]) -> None:
+        import pyarrow as pa
+        
+        batch = pa.RecordBatch.from_pylist(list(_convert(entries, self.to_record)), schema=self.schema)
+        self._writer.write_batch(batch)
+        self._sink.flush()
+    
+    def size(self) -> int:
+        return self._sink.tell()
+    
+    def close(self) -> None:
+        self._writer.close()
+        self._sink.close()
+
+
+class _ParquetSegment:
+    """
+    Parquet segment written as `<name>.inprogress` and renamed when closed.
+    
+    Rows are buffered into row groups of `row_group_size`, so up to that
+    many rows live only in memory until the group is written.
+    """
+    
+    def __init__(
+        self,
+        path: Path,
+        header: List[str],
+        to_record: Callable[[Dict], Dict],
+        row_group_size: int,
+    ):
+        import pyarrow.parquet as pq
+        
+        self.path = path
+        self.to_record = to_record
+        self.row_group_size = max(1, row_group_size)
+        self.schema = arrow_schema(header)
+        self._partial = path.with_name(path.name + ".inprogress")
+        self._writer = pq.ParquetWriter(str(self._partial), self.schema, compression="zstd")
+        self._pending: List[Dict] = []
+    
+    def write(self, entries: List[Dict]) -> None:
+        self._pending.extend(_convert(entries, self.to_record))
+        if len(self._pending) >= self.row_group_size:
+            self._flush()
+    
+    def _flush(self) -> None:
+        import pyarrow as pa
+        
+        if self._pending:
+            self._writer.write_table(pa.Table.from_pylist(self._pending, schema=self.schema))
+            self._pending = []
+    
+    def size(self) -> int:
+        return self._partial.stat().st_size
+    
+    def close(self) -> None:
+        self._flush()
+        self._writer.close()
+        os.replace(self._partial, self.path)
+
+
+class SegmentLog:
+    """
+    Traffic log split into time-stamped segments.
+    
+    In CSV format the active segment is the configured log file itself;
+    when it exceeds `max_bytes` or gets older than `max_age` seconds it is
+    renamed to `<stem>.<start time>.log` and, with `compress`, gzipped in
+    the background. Columnar segments are named `<stem>.<start time>.arrow`
+    or `.parquet` from the start and compressed with zstd internally.
+    """
+    
+    def __init__(
+        self,
+        log_file: str,
+        header: List[str],
+        format_row: Callable[[Dict], List[str]],
+        to_record: Callable[[Dict], Dict],
+        log_format: str = "csv",
+        max_bytes: int = 0,
+        max_age: float = 0.0,
+        compress: bool = True,
+        row_group_size: int = 10000,
+    ):
+        """
+        Initialize the log. Segments are opened on the first write.
+        
+        Args:
+            log_file: Path of the active CSV log; its directory and stem
+                name all segments
+            header: Column names in log order
+            format_row: Converts an entry to CSV values
+            to_record: Converts an entry to typed column values
+            log_format: "csv", "arrow" or "parquet"
+            max_bytes: Rotate when a segment reaches this size (0 disables)
+            max_age: Rotate when a segment is this many seconds old (0 disables)
+            compress: Gzip closed CSV segments
+            row_group_size: Rows per Parquet row group
+        """
+        self.log_file = Path(log_file)
+        self.header = header
+        self.format_row = format_row
+        self.to_record = to_record
+        self.log_format = log_format if columnar_available(log_format) else "csv"
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compress = compress
+        self.row_group_size = row_group_size
+        
+        self._segment = None
+        self._started = 0.0
+        self._compressors: List[threading.Thread] = []
+    
+    def write(self, entries: List[Dict]) -> None:
+        """
+        Append entries to the active segment, rotating it when due.
+        
+        Args:
+            entries: Log entries
+        """
+        if self._segment is None:
+            self._open()
+        self._segment.write(entries)
+        
+        if (self.max_bytes and self._segment.size() >= self.max_bytes) or (
+            self.max_age and time.time() - self._started >= self.max_age
+        ):
+            self.rotate()
+    
+    def rotate(self) -> None:
+        """Close the active segment; the next write starts a new one."""
+        if self._segment is None:
+            return
+        self._segment.close()
+        self._segment = None
+        
+        if self.log_format == "csv":
+            self._retire_csv(self._started)
+    
+    def close(self) -> None:
+        """Close the active segment and wait for pending compression."""
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+        for thread in self._compressors:
+            thread.join()
+        self._compressors = []
+    
+    def _open(self) -> None:
+        """Open a new active segment."""
+        self.log_file.parent.mkdir(parents=True, exist_ok=True)
+        
+        if self.log_format == "csv":
+            self._started = self._adopt_csv()
+            self._segment = _CsvSegment(self.log_file, self.header, self.format_row)
+            return
+        
+        self._started = time.time()
+        path = segment_path(self.log_file, self._started, f".{self.log_format}")
+        if self.log_format == "arrow":
+            self._segment = _ArrowSegment(path, self.header, self.to_record)
+        else:
+            self._segment = _ParquetSegment(path, self.header, self.to_record, self.row_group_size)
+    
+    def _adopt_csv(self) -> float:
+        """
+        Continue an existing active CSV file, or retire it if it cannot be.
+        
+        A file written with different columns, or already past its age, is
+        rotated out first.
+        
+        Returns:
+            float: Start time of the active segment
+        """
+        now = time.time()
+        if not self.log_file.exists() or self.log_file.stat().st_size == 0:
+            return now
+        
+        header, started = _read_csv_start(self.log_file)
+        started = started or now
+        
+        if header != self.header or (self.max_age and now - started >= self.max_age):
+            self._retire_csv(started)
+            return now
+        return started
+    
+    def _retire_csv(self, started: float) -> None:
+        """
+        Rename the active CSV file to a closed segment and compress it.
+        
+        Args:
+            started: Start time of the segment
+        """
+        closed = segment_path(self.log_file, started, self.log_file.suffix or ".log")
+        os.replace(self.log_file, closed)
+        if self.compress:
+            thread = threading.Thread(
+                target=_gzip_file, args=(closed,), name="orcestator-log-compress", daemon=True
+            )
+            thread.start()
+            self._compressors = [t for t in self._compressors if t.is_alive()] + [thread]
+
+
+def segment_path(log_file: Path, started: float, suffix: str) -> Path:
+    """
+    Get the path of a segment of a traffic log.
+    
+    Args:
+        log_file: Configured traffic log path
+        started: Segment start time
+        suffix: File suffix including the dot
+    
+    Returns:
+        Path: `<dir>/<stem>.<start time><suffix>`, made unique if taken
+    """
+    stamp = datetime.fromtimestamp(started, tz=timezone.utc).strftime(SEGMENT_TIME_FORMAT)
+    path = log_file.with_name(f"{log_file.stem}.{stamp}{suffix}")
+    counter = 1
+    while path.exists() or path.with_name(path.name + ".gz").exists():
+        path = log_file.with_name(f"{log_file.stem}.{stamp}-{counter}{suffix}")
+        counter += 1
+    return path
+
+
+def _gzip_file(path: Path) -> None:
+    """
+    Replace a file with its gzip-compressed version.
+    
+    Args:
+        path: File to compress
+    """
+    target = path.with_name(path.name + ".gz")
+    partial = path.with_name(target.name + ".inprogress")
+    try:
+        with open(path, "rb") as src, gzip.open(partial, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(partial, target)
+        os.remove(path)
+    except OSError as e:
+        logger.error(f"Failed to compress traffic log segment {path}: {str(e)}")
+
+
+def _read_csv_start(path: Path) -> Tuple[List[str], Optional[float]]:
+    """
+    Read the header and the first timestamp of a CSV segment.
+    
+    Args:
+        path: Uncompressed CSV file
+    
+    Returns:
+        Tuple[List[str], Optional[float]]: Header and the time of the first
+        row, None if the file has no valid rows
+    """
+    with open(path, newline="") as f:
+        reader = csv.reader(f, delimiter="|")
+        header = next(reader, [])
+        first = next(reader, None)
+    
+    if first:
+        try:
+            return header, datetime.fromisoformat(first[0]).replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            pass
+    return header, None
+
+
+def list_segments(log_file: str) -> List[Tuple[float, Path]]:
+    """
+    Find the segments of a traffic log, oldest first.
+    
+    Args:
+        log_file: Configured traffic log path
+    
+    Returns:
+        List[Tuple[float, Path]]: Start time and path of each closed or
+        active segment; the active CSV file sorts last
+    """
+    log_file = Path(log_file)
+    prefix = f"{log_file.stem}."
+    segments = []
+    if not log_file.parent.is_dir():
+        return segments
+    
+    for path in log_file.parent.iterdir():
+        name = path.name
+        if not name.startswith(prefix) or name.endswith(".inprogress") or path == log_file:
+            continue
+        stamp = name[len(prefix):].split(".", 1)[0].split("-", 1)[0]
+        try:
+            started = datetime.strptime(stamp, SEGMENT_TIME_FORMAT).replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            continue
+        segments.append((started, path))
+    
+    segments.sort()
+    if log_file.exists():
+        started = _read_csv_start(log_file)[1]
+        segments.append((started or time.time(), log_file))
+    return segments
+
+
+def _parse_csv_row(row: Dict[str, str]) -> Dict:
+    """Convert one CSV row to typed values; missing timing columns become None."""
+    record: Dict = dict(row)
+    record["timestamp"] = datetime.fromisoformat(row["timestamp"])
+    for name in INTEGER_COLUMNS:
+        value = row.get(name)
+        record[name] = int(value) if value else None
+    for name in FLOAT_COLUMNS:
+        value = row.get(name)
+        record[name] = float(value) if value else None
+    return record
+
+
+def read_segment(path: Path, columns: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+    """
+    Stream the rows of one segment without loading it whole.
+    
+    Columnar segments are memory-mapped and only `columns` are decoded.
+    
+    Args:
+        path: Segment file
+        columns: Columns to read; all when omitted (CSV always reads all)
+    
+    Yields:
+        Dict: Row values by column name
+    """
+    name = path.name
+    if name.endswith((".arrow", ".parquet")):
+        import pyarrow as pa
+        
+        if name.endswith(".arrow"):
+            with pa.memory_map(str(path)) as source:
+                try:
+                    reader = pa.ipc.open_stream(source)
+                    for batch in reader:
+                        if columns:
+                            batch = batch.select([c for c in columns if c in batch.schema.names])
+                        yield from batch.to_pylist()
+                except pa.ArrowInvalid:
+                    # A segment still being written may end mid-batch.
+                    return
+        else:
+            import pyarrow.parquet as pq
+            
+            parquet = pq.ParquetFile(str(path), memory_map=True)
+            names = [c for c in columns if c in parquet.schema_arrow.names] if columns else None
+            for batch in parquet.iter_batches(columns=names):
+                yield from batch.to_pylist()
+        return
+    
+    opener = gzip.open if name.endswith(".gz") else open
+    with opener(path, "rt", newline="") as f:
+        for row in csv.DictReader(f, delimiter="|"):
+            try:
+                yield _parse_csv_row(row)
+            except (KeyError, TypeError, ValueError):
+                continue
@@ -0,0 +1,941 @@
+"""
+Core proxy logic for Orcestator.
+Builds upstream requests, streams completions from OpenRouter and records
+metrics and traffic logs. Independent of FastChat, so it can be used by the
+FastChat worker and by the direct API server alike.
+"""
+
+import asyncio
+import json
+import logging
+from contextlib import aclosing, asynccontextmanager
+from typing import TYPE_CHECKING, AsyncGenerator, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from orcestator.aliases import get_alias_registry
+from orcestator.cache import ResponseCache, cache_key, is_deterministic
+from orcestator.coalesce import SingleFlight
+from orcestator.config import Config
+from orcestator.hedge import HedgeBudget, Hedger
+from orcestator.limiter import AIMDLimit, AdmissionQueue, Permit, PRIORITY_BATCH, PRIORITY_INTERACTIVE
+from orcestator.logger import (
+    CONTEXT_TRIMMED_REQUESTS,
+    CONTEXT_TRIMMED_TOKENS,
+    ESTIMATED_TOKENS,
+    RequestTimer,
+    log_to_file,
+    update_metrics,
+)
+from orcestator.router import Upstream, UpstreamRouter
+from orcestator.sse import iter_sse_data, loads
+from orcestator.tokens import TokenEstimator
+from orcestator.upstream import warm_up
+
+if TYPE_CHECKING:
+    from orcestator.semantic_cache import SemanticCache
+
+logger = logging.getLogger("orcestator")
+
+
+class OpenRouterProxy:
+    """
+    Proxies chat completions to OpenRouter.
+    Holds the upstream router, exact and semantic response caches,
+    in-flight coalescing table, hedger, adaptive admission queue and
+    token estimator.
+    """
+
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
+        """
+        Initialize the proxy.
+        
+        Args:
+            client: Single upstream client to use; when omitted, a router over
+                the upstreams configured in Config is created
+        """
+        if client is not None:
+            self.router = UpstreamRouter([Upstream("default", client)])
+        else:
+            if not Config.API_KEY and not Config.UPSTREAMS:
+                raise ValueError("OR_API_KEY environment variable is required")
+            self.router = UpstreamRouter.from_config()
+        
+        self.cache: Optional[ResponseCache] = None
+        if Config.CACHE_ENABLED:
+            self.cache = ResponseCache(
+                ttl=Config.CACHE_TTL,
+                max_entries=Config.CACHE_MAX_ENTRIES,
+                max_bytes=Config.CACHE_MAX_BYTES,
+                cache_dir=Config.CACHE_DIR,
+            )
+        
+        self.semantic_cache: Optional["SemanticCache"] = None
+        if Config.SEMANTIC_CACHE_ENABLED:
+            # Imported here so numpy is only loaded when the cache is enabled.
+            from orcestator.semantic_cache import SemanticCache, semantic_cache_available
+            
+            if semantic_cache_available():
+                self.semantic_cache = SemanticCache(
+                    ttl=Config.SEMANTIC_CACHE_TTL,
+                    max_entries=Config.SEMANTIC_CACHE_MAX_ENTRIES,
+                    dim=Config.SEMANTIC_CACHE_DIM,
+                    threshold=Config.semantic_threshold,
+                )
+        
+        self.flights: Optional[SingleFlight] = SingleFlight() if Config.COALESCE_ENABLED else None
+        
+        self.hedger: Optional[Hedger] = None
+        if Config.HEDGE_ENABLED:
+            self.hedger = Hedger(
+                percentile=Config.HEDGE_PERCENTILE,
+                min_delay=Config.HEDGE_MIN_DELAY,
+                min_samples=Config.HEDGE_MIN_SAMPLES,
+                window=Config.HEDGE_WINDOW,
+                budget=HedgeBudget(Config.HEDGE_BUDGET, Config.HEDGE_BURST),
+            )
+        
+        self.tokens = TokenEstimator()
+        
+        self.admission: Optional[AdmissionQueue] = None
+        if Config.LIMITER_ENABLED:
+            self.admission = AdmissionQueue(AIMDLimit(
+                initial=Config.LIMITER_INITIAL,
+                min_limit=Config.LIMITER_MIN,
+                max_limit=Config.LIMITER_MAX,
+                latency_tolerance=Config.LIMITER_LATENCY_TOLERANCE,
+            ))
+
+    @staticmethod
+    def resolve_model(model_name: str) -> str:
+        """
+        Map a requested model name to the upstream model.
+        
+        Aliases with several targets pick one by weight on every call.
+        
+        Args:
+            model_name: Model requested by the client
+            
+        Returns:
+            str: Upstream model name
+        """
+        return get_alias_registry().resolve(model_name)[0]
+
+    def _build_request(self, params: Dict, stream: bool) -> Tuple[List[Dict], str, str, Dict]:
+        """
+        Build the OpenRouter request body from FastChat generation parameters.
+        
+        Args:
+            params: Parameters for the generation
+            stream: Whether to request an SSE stream
+            
+        Returns:
+            Tuple: Messages, requested model name, target model and request body
+        """
+        context = params.get("prompt", "")
+        temperature = float(params.get("temperature", 1.0))
+        top_p = float(params.get("top_p", 1.0))
+        max_tokens = params.get("max_new_tokens", 2048)
+        stop_str = params.get("stop", None)
+        
+        messages = params.get("messages", [])
+        if not messages and context:
+            messages = [{"role": "user", "content": context}]
+        
+        model_name = params.get("model", "orcestator")
+        target_model, overrides = get_alias_registry().resolve(model_name)
+        
+        request_data = {
+            "model": target_model,
+            "messages": messages,
+            "temperature": temperature,
+            "top_p": top_p,
+            "max_tokens": max_tokens,
+            "stream": stream,
+        }
+        
+        if stop_str:
+            request_data["stop"] = stop_str if isinstance(stop_str, list) else [stop_str]
+        
+        request_data.update(overrides)
+        
+        return messages, model_name, target_model, request_data
+
+    def _record_request(
+        self,
+        messages: List[Dict],
+        response_text: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        timer: RequestTimer,
+        model_name: str,
+        target_model: str,
+        status: str = "ok",
+    ) -> None:
+        """
+        Update metrics and write the traffic log entry for a finished request.
+        
+        Args:
+            messages: Messages sent upstream
+            response_text: Full assistant response
+            prompt_tokens: Number of tokens in the prompt
+            completion_tokens: Number of tokens in the completion
+            timer: Timer of the request, with its phases marked
+            model_name: The requested model (orcestator)
+            target_model: The upstream model (e.g., openai/gpt-4o)
+            status: "ok", or "cancelled" if the client disconnected
+        """
+        user_message = messages[0]["content"] if messages else ""
+        latency_seconds = timer.latency_seconds
+        
+        update_metrics(
+            model=model_name,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            latency_seconds=latency_seconds,
+            status=status,
+        )
+        
+        log_to_file(
+            user_message=user_message,
+            assistant_message=response_text,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            latency_ms=int(latency_seconds * 1000),
+            model=model_name,
+            original_model=target_model,
+            timings=timer.observe(completion_tokens),
+            status=status,
+            messages=messages,
+        )
+
+    async def warm_up(self) -> None:
+        """Open upstream connections and load the default model's tokenizer before the first request arrives."""
+        for upstream in self.router.upstreams:
+            await warm_up(upstream.client, Config.UPSTREAM_WARM_CONNECTIONS)
+        await asyncio.to_thread(self.tokens.encoder, Config.DEFAULT_MODEL)
+
+    def _request_key(self, request_data: Dict) -> Optional[str]:
+        """
+        Get the canonical key used for caching and coalescing a request.
+        
+        Args:
+            request_data: Upstream request body
+            
+        Returns:
+            Optional[str]: Request key, or None if neither applies
+        """
+        if self.cache is None and self.flights is None:
+            return None
+        if not is_deterministic(request_data):
+            return None
+        return cache_key(request_data)
+
+    async def _lookup_cached(self, key: Optional[str], request_data: Dict) -> Optional[Dict]:
+        """
+        Look up a completion in the exact cache, then in the semantic cache.
+        
+        Args:
+            key: Request key, or None if the request is not cacheable
+            request_data: Upstream request body
+        
+        Returns:
+            Optional[Dict]: Cached completion entry, or None on a miss
+        """
+        if key is not None and self.cache is not None:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                return cached
+        
+        if self.semantic_cache is not None and is_deterministic(request_data):
+            return await self.semantic_cache.get(request_data)
+        return None
+    
+    async def _store_cached(self, key: Optional[str], request_data: Dict, completion: Dict) -> None:
+        """
+        Store a finished completion in the response caches if it may be reused.
+        
+        Args:
+            key: Request key, or None if the request is not cacheable
+            request_data: Upstream request body
+            completion: Text, token counts and finish reason
+        """
+        if completion["finish_reason"] not in ("stop", "length"):
+            return
+        if key is not None and self.cache is not None:
+            await self.cache.put(key, completion)
+        if self.semantic_cache is not None and is_deterministic(request_data):
+            await self.semantic_cache.put(request_data, completion)
+
+    async def _replay_cached(
+        self,
+        cached: Dict,
+        messages: List[Dict],
+        model_name: str,
+        target_model: str,
+    ) -> AsyncGenerator[Dict, None]:
+        """
+        Replay a cached completion as a synthetic stream.
+        
+        Args:
+            cached: Cached completion entry
+            messages: Messages of the current request
+            model_name: The requested model (orcestator)
+            target_model: The upstream model (e.g., openai/gpt-4o)
+            
+        Yields:
+            Dict: Responses carrying the next piece of the cached text
+        """
+        with RequestTimer(model=model_name, target_model=target_model) as timer:
+            text = cached["text"]
+            step = max(1, Config.CACHE_REPLAY_CHUNK)
+            for start in range(0, len(text), step):
+                timer.mark_token()
+                yield {"text": text[start:start + step], "error_code": 0}
+            
+            self._record_request(
+                messages=messages,
+                response_text=text,
+                prompt_tokens=cached["prompt_tokens"],
+                completion_tokens=cached["completion_tokens"],
+                timer=timer,
+                model_name=model_name,
+                target_model=target_model,
+            )
+
+    async def _fit_context(self, request_data: Dict) -> Dict:
+        """
+        Trim the messages of a request to the target model's context budget.
+        
+        Args:
+            request_data: Upstream request body
+            
+        Returns:
+            Dict: The request to send; a trimmed copy if it was over budget
+        """
+        model = request_data["model"]
+        budget = Config.context_budget(model)
+        messages = request_data.get("messages")
+        if budget <= 0 or not messages:
+            return request_data
+        
+        fitted, prompt_tokens, removed = await asyncio.to_thread(self.tokens.fit, model, messages, budget)
+        if not removed:
+            return request_data
+        
+        CONTEXT_TRIMMED_REQUESTS.labels(model=model).inc()
+        CONTEXT_TRIMMED_TOKENS.labels(model=model).inc(removed)
+        logger.info(
+            f"Trimmed {removed} prompt tokens for {model}: "
+            f"{len(messages)} -> {len(fitted)} messages, {prompt_tokens} tokens"
+        )
+        return dict(request_data, messages=fitted)
+
+    def _count_missing_tokens(
+        self,
+        request_data: Dict,
+        text: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+    ) -> Tuple[int, int]:
+        """
+        Estimate the token counts the upstream did not report.
+        
+        Args:
+            request_data: Upstream request body as sent
+            text: Completion text
+            prompt_tokens: Prompt tokens from the upstream usage, or 0
+            completion_tokens: Completion tokens from the upstream usage, or 0
+            
+        Returns:
+            Tuple[int, int]: Prompt and completion tokens
+        """
+        model = request_data["model"]
+        if not prompt_tokens and request_data.get("messages"):
+            prompt_tokens = self.tokens.count_messages(model, request_data["messages"])
+            ESTIMATED_TOKENS.labels(model=model, kind="prompt").inc(prompt_tokens)
+        if not completion_tokens and text:
+            completion_tokens = self.tokens.count_text(model, text)
+            ESTIMATED_TOKENS.labels(model=model, kind="completion").inc(completion_tokens)
+        return prompt_tokens, completion_tokens
+
+    async def _token_counts(
+        self,
+        request_data: Dict,
+        text: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+    ) -> Tuple[int, int]:
+        """
+        Estimate the missing token counts in a thread, off the event loop.
+        
+        Args:
+            request_data: Upstream request body as sent
+            text: Completion text
+            prompt_tokens: Prompt tokens from the upstream usage, or 0
+            completion_tokens: Completion tokens from the upstream usage, or 0
+            
+        Returns:
+            Tuple[int, int]: Prompt and completion tokens
+        """
+        return await asyncio.to_thread(
+            self._count_missing_tokens, request_data, text, prompt_tokens, completion_tokens
+        )
+
+    def _record_cancelled(
+        self,
+        messages: List[Dict],
+        request_data: Dict,
+        response_text: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        timer: RequestTimer,
+        model_name: str,
+        target_model: str,
+    ) -> None:
+        """
+        Record the partial usage of a stream whose client disconnected.
+        
+        Called while the stream is being cancelled or closed, where nothing
+        may be awaited, so missing token counts are estimated inline.
+        
+        Args:
+            messages: Messages sent upstream
+            request_data: Upstream request body as sent
+            response_text: Text streamed before the disconnect
+            prompt_tokens: Prompt tokens from the upstream usage, or 0
+            completion_tokens: Completion tokens from the upstream usage, or 0
+            timer: Timer of the request
+            model_name: The requested model (orcestator)
+            target_model: The upstream model (e.g., openai/gpt-4o)
+        """
+        prompt_tokens, completion_tokens = self._count_missing_tokens(
+            request_data, response_text, prompt_tokens, completion_tokens
+        )
+        logger.info(
+            f"Client disconnected from a {target_model} stream after "
+            f"{completion_tokens} completion tokens; upstream call closed"
+        )
+        self._record_request(
+            messages=messages,
+            response_text=response_text,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            timer=timer,
+            model_name=model_name,
+            target_model=target_model,
+            status="cancelled",
+        )
+
+    @asynccontextmanager
+    async def _admission(self, priority: int) -> AsyncIterator[Permit]:
+        """
+        Hold an upstream slot from the adaptive admission queue.
+        
+        Overload responses (429/503) and timeouts raised inside the block
+        shrink the concurrency limit.
+        
+        Args:
+            priority: PRIORITY_INTERACTIVE or PRIORITY_BATCH
+            
+        Yields:
+            Permit: The slot; report the first token on it
+        """
+        if self.admission is None:
+            yield Permit(priority, saturated=False)
+            return
+        
+        deadline = (
+            Config.QUEUE_DEADLINE_INTERACTIVE if priority == PRIORITY_INTERACTIVE
+            else Config.QUEUE_DEADLINE_BATCH
+        )
+        permit = await self.admission.acquire(priority, deadline)
+        overloaded = False
+        try:
+            yield permit
+        except httpx.HTTPStatusError as e:
+            overloaded = e.response.status_code in (429, 503)
+            raise
+        except httpx.TimeoutException:
+            overloaded = True
+            raise
+        finally:
+            self.admission.release(permit, overloaded)
+
+    async def _stream_upstream(
+        self,
+        request_data: Dict,
+        used: Optional[Set[str]] = None,
+    ) -> AsyncGenerator[Dict, None]:
+        """
+        Stream a completion from OpenRouter over SSE.
+        
+        Args:
+            request_data: Upstream request body with stream=True
+            used: Upstreams serving other copies of the request, avoided
+                if possible; the upstream chosen here is added to it
+            
+        Yields:
+            Dict: `{"content": ...}` for each text chunk, then one final
+            `{"done": True, ...}` item with token counts, finish reason and
+            the upstream phase timings
+        """
+        async with self._admission(PRIORITY_INTERACTIVE) as permit, \
+                self.router.stream("/chat/completions", request_data, avoid=used) as call:
+            response = call.response
+            if used is not None:
+                used.add(call.upstream.name)
+            
+            prompt_tokens = 0
+            completion_tokens = 0
+            finish_reason = None
+            
+            async for data in iter_sse_data(response.aiter_bytes()):
+                try:
+                    chunk = loads(data)
+                except ValueError:
+                    logger.error(f"Failed to parse JSON: {data!r}")
+                    continue
+                
+                usage = chunk.get("usage")
+                if usage:
+                    prompt_tokens = usage.get("prompt_tokens", 0)
+                    completion_tokens = usage.get("completion_tokens", 0)
+                
+                choices = chunk.get("choices") or [{}]
+                delta = choices[0].get("delta") or {}
+                content = delta.get("content", "")
+                finish_reason = choices[0].get("finish_reason") or finish_reason
+                
+                if content:
+                    call.mark_first_token()
+                    permit.mark_first_token()
+                    yield {"content": content}
+            
+            yield {
+                "done": True,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "finish_reason": finish_reason,
+                "timings": {
+                    "queue_wait": permit.queue_wait,
+                    "connect": call.connect,
+                    "ttfb": call.ttfb,
+                },
+            }
+
+    async def _post_upstream(self, request_data: Dict) -> AsyncGenerator[Dict, None]:
+        """
+        Fetch a completion from OpenRouter with a single non-streaming POST.
+        
+        Args:
+            request_data: Upstream request body with stream=False
+            
+        Yields:
+            Dict: The same items as _stream_upstream, with all text in one chunk
+        """
+        async with self._admission(PRIORITY_BATCH) as permit:
+            response = await self.router.post("/chat/completions", request_data)
+        body = response.json()
+        trace = response.request.extensions["trace"]
+        
+        choices = body.get("choices") or [{}]
+        message = choices[0].get("message") or {}
+        text = message.get("content") or ""
+        usage = body.get("usage") or {}
+        
+        if text:
+            yield {"content": text}
+        
+        yield {
+            "done": True,
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "completion_tokens": usage.get("completion_tokens", 0),
+            "finish_reason": choices[0].get("finish_reason"),
+            "timings": {
+                "queue_wait": permit.queue_wait,
+                "connect": trace.connect,
+                "ttfb": trace.ttfb,
+            },
+        }
+
+    def _hedged_stream(self, request_data: Dict) -> AsyncIterator[Dict]:
+        """
+        Stream a completion, racing a duplicate against it if the first token is late.
+        
+        The duplicate goes to the model from OR_HEDGE_MODELS, or the same
+        model, preferably on another upstream.
+        
+        Args:
+            request_data: Upstream request body with stream=True
+            
+        Returns:
+            AsyncIterator[Dict]: Items as produced by _stream_upstream
+        """
+        used: Set[str] = set()
+        hedge_request = dict(request_data, model=Config.hedge_model(request_data["model"]))
+        return self.hedger.race(
+            request_data["model"],
+            lambda: self._stream_upstream(request_data, used),
+            lambda: self._stream_upstream(hedge_request, used),
+        )
+
+    def _upstream_items(self, request_data: Dict, key: Optional[str]) -> AsyncIterator[Dict]:
+        """
+        Get the upstream items for a request, sharing in-flight calls when possible.
+        
+        Args:
+            request_data: Upstream request body
+            key: Request key, or None if the request must not be coalesced
+            
+        Returns:
+            AsyncIterator[Dict]: Items as produced by _stream_upstream
+        """
+        stream = request_data["stream"]
+        if not stream:
+            factory = self._post_upstream
+        elif self.hedger is not None:
+            factory = self._hedged_stream
+        else:
+            factory = self._stream_upstream
+        
+        if key is None or self.flights is None:
+            return factory(request_data)
+        
+        flight_key = f"{'stream' if stream else 'post'}:{key}"
+        return self.flights.subscribe(flight_key, lambda: factory(request_data))
+
+    async def generate_stream(
+        self,
+        params: Dict,
+        **kwargs,
+    ) -> AsyncGenerator[Dict, None]:
+        """
+        Generate a stream of responses by proxying to OpenRouter.
+        
+        Each response carries only the text generated since the previous
+        one; the worker gate turns them into FastChat's cumulative format.
+        
+        Args:
+            params: Parameters for the generation
+            
+        Yields:
+            Dict: Generated responses
+        """
+        messages, model_name, target_model, request_data = self._build_request(params, stream=True)
+        
+        key = self._request_key(request_data)
+        cached = await self._lookup_cached(key, request_data)
+        if cached is not None:
+            async for event in self._replay_cached(cached, messages, model_name, target_model):
+                yield event
+            return
+        
+        upstream_request = await self._fit_context(request_data)
+        
+        with RequestTimer(model=model_name, target_model=target_model) as timer:
+            try:
+                chunks: List[str] = []
+                result: Dict = {}
+                
+                try:
+                    # Closing this generator on a client disconnect closes
+                    # the upstream stream right away instead of at GC.
+                    async with aclosing(self._upstream_items(upstream_request, key)) as items:
+                        async for item in items:
+                            if item.get("done"):
+                                result = item
+                                timer.mark_upstream(**item["timings"])
+                                continue
+                            
+                            content = item["content"]
+                            chunks.append(content)
+                            timer.mark_token()
+                            
+                            yield {"text": content, "error_code": 0}
+                except (asyncio.CancelledError, GeneratorExit):
+                    self._record_cancelled(
+                        messages, upstream_request, "".join(chunks),
+                        result.get("prompt_tokens", 0), result.get("completion_tokens", 0),
+                        timer, model_name, target_model,
+                    )
+                    raise
+                
+                text = "".join(chunks)
+                prompt_tokens, completion_tokens = await self._token_counts(
+                    upstream_request, text, result.get("prompt_tokens", 0), result.get("completion_tokens", 0)
+                )
+                completion = {
+                    "text": text,
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "finish_reason": result.get("finish_reason"),
+                }
+                self._record_request(
+                    messages=messages,
+                    response_text=completion["text"],
+                    prompt_tokens=completion["prompt_tokens"],
+                    completion_tokens=completion["completion_tokens"],
+                    timer=timer,
+                    model_name=model_name,
+                    target_model=target_model,
+                )
+                await self._store_cached(key, request_data, completion)
+            
+            except Exception as e:
+                logger.error(f"Error in generate_stream: {str(e)}")
+                yield {"text": f"Error: {str(e)}", "error_code": 1}
+
+    @staticmethod
+    def _completion_result(completion: Dict) -> Dict:
+        """
+        Build the non-streaming worker response for a completion.
+        
+        Args:
+            completion: Text, token counts and finish reason
+            
+        Returns:
+            Dict: Worker response with usage
+        """
+        prompt_tokens = completion["prompt_tokens"]
+        completion_tokens = completion["completion_tokens"]
+        return {
+            "text": completion["text"],
+            "error_code": 0,
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+            "finish_reason": completion["finish_reason"],
+        }
+
+    async def generate(
+        self,
+        params: Dict,
+        **kwargs,
+    ) -> Dict:
+        """
+        Generate a response by proxying to OpenRouter (non-streaming).
+        
+        Sends a single `stream: false` request and reads text and usage
+        from one JSON body instead of draining an SSE stream.
+        
+        Args:
+            params: Parameters for the generation
+            
+        Returns:
+            Dict: Generated response
+        """
+        messages, model_name, target_model, request_data = self._build_request(params, stream=False)
+        
+        key = self._request_key(request_data)
+        cached = await self._lookup_cached(key, request_data)
+        if cached is not None:
+            with RequestTimer(model=model_name, target_model=target_model) as timer:
+                self._record_request(
+                    messages=messages,
+                    response_text=cached["text"],
+                    prompt_tokens=cached["prompt_tokens"],
+                    completion_tokens=cached["completion_tokens"],
+                    timer=timer,
+                    model_name=model_name,
+                    target_model=target_model,
+                )
+            return self._completion_result(cached)
+        
+        upstream_request = await self._fit_context(request_data)
+        
+        with RequestTimer(model=model_name, target_model=target_model) as timer:
+            try:
+                chunks: List[str] = []
+                result: Dict = {}
+                
+                async for item in self._upstream_items(upstream_request, key):
+                    if item.get("done"):
+                        result = item
+                        timer.mark_upstream(**item["timings"])
+                    else:
+                        chunks.append(item["content"])
+                        timer.mark_token()
+                
+                text = "".join(chunks)
+                prompt_tokens, completion_tokens = await self._token_counts(
+                    upstream_request, text, result.get("prompt_tokens", 0), result.get("completion_tokens", 0)
+                )
+                completion = {
+                    "text": text,
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "finish_reason": result.get("finish_reason"),
+                }
+                self._record_request(
+                    messages=messages,
+                    response_text=completion["text"],
+                    prompt_tokens=completion["prompt_tokens"],
+                    completion_tokens=completion["completion_tokens"],
+                    timer=timer,
+                    model_name=model_name,
+                    target_model=target_model,
+                )
+                await self._store_cached(key, request_data, completion)
+                
+                return self._completion_result(completion)
+            
+            except Exception as e:
+                logger.error(f"Error in generate: {str(e)}")
+                return {"text": f"Error: {str(e)}", "error_code": 1}
+
+    def _passthrough_request(self, body: Dict, stream: bool) -> Tuple[List[Dict], str, str, Dict]:
+        """
+        Build the upstream request for an OpenAI chat completion body.
+        
+        Unlike _build_request, every field of the client body is forwarded
+        unchanged apart from the model name, the stream flag and the
+        alias's parameter overrides.
+        
+        Args:
+            body: OpenAI-compatible chat completion request
+            stream: Whether to request an SSE stream
+            
+        Returns:
+            Tuple: Messages, requested model name, target model and request body
+        """
+        model_name = body.get("model") or "orcestator"
+        target_model, overrides = get_alias_registry().resolve(model_name)
+        
+        request_data = dict(body)
+        request_data.update(overrides)
+        request_data["model"] = target_model
+        request_data["stream"] = stream
+        
+        return body.get("messages", []), model_name, target_model, request_data
+
+    async def stream_chat_completion(self, body: Dict) -> AsyncGenerator[bytes, None]:
+        """
+        Proxy an OpenAI chat completion and pass the upstream SSE frames through.
+        
+        Each frame is forwarded as received, with only its `model` field
+        rewritten to the requested model name. Upstream HTTP errors are
+        raised before the first frame is yielded.
+        
+        Args:
+            body: OpenAI-compatible chat completion request
+            
+        Yields:
+            bytes: SSE frames, ending with `data: [DONE]`
+        """
+        messages, model_name, target_model, request_data = self._passthrough_request(body, stream=True)
+        request_data = await self._fit_context(request_data)
+        model_field = f'"model":{json.dumps(model_name)}'.encode()
+        
+        with RequestTimer(model=model_name, target_model=target_model) as timer:
+            chunks: List[str] = []
+            prompt_tokens = 0
+            completion_tokens = 0
+            try:
+                async with self._admission(PRIORITY_INTERACTIVE) as permit, \
+                        self.router.stream("/chat/completions", request_data) as call:
+                    response = call.response
+                    timer.mark_upstream(permit.queue_wait, call.connect, call.ttfb)
+                    
+                    async for data in iter_sse_data(response.aiter_bytes()):
+                        try:
+                            chunk = loads(data)
+                        except ValueError:
+                            logger.error(f"Failed to parse JSON: {data!r}")
+                            continue
+                        
+                        usage = chunk.get("usage")
+                        if usage:
+                            prompt_tokens = usage.get("prompt_tokens", 0)
+                            completion_tokens = usage.get("completion_tokens", 0)
+                        
+                        choices = chunk.get("choices") or [{}]
+                        content = (choices[0].get("delta") or {}).get("content")
+                        if content:
+                            call.mark_first_token()
+                            permit.mark_first_token()
+                            timer.mark_token()
+                            chunks.append(content)
+                        
+                        upstream_model = chunk.get("model")
+                        if upstream_model is not None and upstream_model != model_name:
+                            # Rewrite the model in place; re-encode only if the
+                            # upstream used a different JSON layout.
+                            upstream_value = json.dumps(upstream_model)
+                            for upstream_field in (f'"model":{upstream_value}', f'"model": {upstream_value}'):
+                                upstream_field = upstream_field.encode()
+                                if upstream_field in data:
+                                    data = data.replace(upstream_field, model_field, 1)
+                                    break
+                            else:
+                                chunk["model"] = model_name
+                                data = json.dumps(chunk).encode()
+                        
+                        yield b"data: " + data + b"\n\n"
+                    
+                    yield b"data: [DONE]\n\n"
+            except (asyncio.CancelledError, GeneratorExit):
+                self._record_cancelled(
+                    messages, request_data, "".join(chunks), prompt_tokens, completion_tokens,
+                    timer, model_name, target_model,
+                )
+                raise
+            
+            response_text = "".join(chunks)
+            prompt_tokens, completion_tokens = await self._token_counts(
+                request_data, response_text, prompt_tokens, completion_tokens
+            )
+            self._record_request(
+                messages=messages,
+                response_text=response_text,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                timer=timer,
+                model_name=model_name,
+                target_model=target_model,
+            )
+
+    async def chat_completion(self, body: Dict) -> Dict:
+        """
+        Proxy a non-streaming OpenAI chat completion.
+        
+        Args:
+            body: OpenAI-compatible chat completion request
+            
+        Returns:
+            Dict: Upstream response with the model rewritten
+        """
+        messages, model_name, target_model, request_data = self._passthrough_request(body, stream=False)
+        request_data = await self._fit_context(request_data)
+        
+        with RequestTimer(model=model_name, target_model=target_model) as timer:
+            async with self._admission(PRIORITY_BATCH) as permit:
+                response = await self.router.post("/chat/completions", request_data)
+            result = response.json()
+            result["model"] = model_name
+            
+            trace = response.request.extensions["trace"]
+            timer.mark_upstream(permit.queue_wait, trace.connect, trace.ttfb)
+            
+            choices = result.get("choices") or [{}]
+            usage = result.get("usage") or {}
+            response_text = (choices[0].get("message") or {}).get("content") or ""
+            if response_text:
+                timer.mark_token()
+            
+            prompt_tokens, completion_tokens = await self._token_counts(
+                request_data, response_text, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+            )
+            self._record_request(
+                messages=messages,
+                response_text=response_text,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                timer=timer,
+                model_name=model_name,
+                target_model=target_model,
+            )
+            
+            return result
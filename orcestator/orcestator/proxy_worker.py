@@ -5,24 +5,58 @@ Custom FastChat worker that proxies requests to OpenRouter.
 import argparse
 import asyncio
 import json
+import threading
 import time
-from typing import AsyncGenerator, Dict, List, Optional, Union
+from contextlib import aclosing
+from typing import AsyncGenerator, Dict, List, Optional
 
-import httpx
-from fastchat.serve.base_model_worker import BaseModelWorker
-from fastchat.serve.model_worker import app
+import requests
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from fastchat.conversation import Conversation, SeparatorStyle, register_conv_template
+from fastchat.serve import base_model_worker
+from fastchat.serve.base_model_worker import (
+    BaseModelWorker,
+    acquire_worker_semaphore,
+    app,
+    create_background_tasks,
+    release_worker_semaphore,
+)
 from fastchat.utils import build_logger
 
+from orcestator.aliases import AliasTable, get_alias_registry
+from orcestator.batch import BatchRunner, batch_response
 from orcestator.config import Config
-from orcestator.logger import RequestTimer, log_to_file, update_metrics
+from orcestator.logger import shutdown_logging
+from orcestator.proxy import OpenRouterProxy
+from orcestator.streaming import ClosingStreamingResponse
+from orcestator.tokens import heuristic_tokens
 
 logger = build_logger("proxy_worker", "proxy_worker.log")
 
+# Upstream models have their own chat templates; this one only renders the
+# prompt FastChat uses for length checks and plain-prompt requests.
+CONV_TEMPLATE = "orcestator"
+register_conv_template(
+    Conversation(
+        name=CONV_TEMPLATE,
+        roles=("user", "assistant"),
+        sep_style=SeparatorStyle.ADD_COLON_SINGLE,
+        sep="\n",
+    ),
+    override=True,
+)
 
-class ProxyWorker(BaseModelWorker):
+# Reported to the API server as the context length; the upstream enforces
+# the real limit of each model.
+CONTEXT_LENGTH = 128000
+
+
+class ProxyWorker(BaseModelWorker, OpenRouterProxy):
     """
     Custom worker that proxies requests to OpenRouter.
-    Inherits from FastChat's BaseModelWorker.
+    Inherits from FastChat's BaseModelWorker; the proxying itself comes
+    from OpenRouterProxy.
     """
 
     def __init__(
@@ -43,164 +77,281 @@ class ProxyWorker(BaseModelWorker):
             worker_id: ID of this worker
             model_names: List of model names this worker serves
             limit_worker_concurrency: Maximum number of concurrent requests
-            no_register: Whether to register with the controller
+            no_register: Whether to skip registering with the controller
         """
+        self.base_model_names = list(model_names)
+        aliases = get_alias_registry()
+        model_names = self._served_names(aliases.table)
+        
         super().__init__(
             controller_addr=controller_addr,
             worker_addr=worker_addr,
             worker_id=worker_id,
+            model_path=model_names[0],
             model_names=model_names,
             limit_worker_concurrency=limit_worker_concurrency,
-            no_register=no_register,
+            conv_template=CONV_TEMPLATE,
         )
+        self.context_len = CONTEXT_LENGTH
         
-        if not Config.API_KEY:
-            raise ValueError("OR_API_KEY environment variable is required")
-        
-        self.client = httpx.AsyncClient(
-            base_url="https://openrouter.ai/api/v1",
-            timeout=60.0,
-            headers={
-                "Authorization": f"Bearer {Config.API_KEY}",
-                "HTTP-Referer": "https://github.com/OleynikAleksandr/orchestrator_proxy_agent",
-                "X-Title": "Orcestator Proxy",
-            },
-        )
+        OpenRouterProxy.__init__(self)
+        
+        self.service_time: Optional[float] = None
+        self._load_thread: Optional[threading.Thread] = None
+        self.no_register = no_register
+        self.registered = False
+        self.batches = BatchRunner(self) if Config.DB_PATH else None
+        aliases.on_change(self._on_aliases_changed)
         
         logger.info(f"ProxyWorker initialized with models: {model_names}")
-
-    async def generate_stream(
-        self,
-        params: Dict,
-        **kwargs,
-    ) -> AsyncGenerator[Dict, None]:
+    
+    def _served_names(self, table: AliasTable) -> List[str]:
         """
-        Generate a stream of responses by proxying to OpenRouter.
+        Get the model names to register: the command line names and every alias.
         
         Args:
-            params: Parameters for the generation
-            
-        Yields:
-            Dict: Generated responses
-        """
-        context = params.get("prompt", "")
-        temperature = float(params.get("temperature", 1.0))
-        top_p = float(params.get("top_p", 1.0))
-        max_tokens = params.get("max_new_tokens", 2048)
-        echo = params.get("echo", False)
-        stop_str = params.get("stop", None)
-        stop_token_ids = params.get("stop_token_ids", None)
-        
-        messages = params.get("messages", [])
-        if not messages and context:
-            messages = [{"role": "user", "content": context}]
-        
-        model_name = params.get("model", "orcestator")
-        target_model = Config.DEFAULT_MODEL if model_name == "orcestator" else model_name
-        
-        request_data = {
-            "model": target_model,
-            "messages": messages,
-            "temperature": temperature,
-            "top_p": top_p,
-            "max_tokens": max_tokens,
-            "stream": True,
-        }
+            table: Current alias table
+        
+        Returns:
+            List[str]: Model names
+        """
+        return self.base_model_names + [name for name in table.names if name not in self.base_model_names]
+    
+    def _on_aliases_changed(self, table: AliasTable) -> None:
+        """
+        Register the new alias names with the controller.
+        
+        Args:
+            table: Newly loaded alias table
+        """
+        self.model_names = self._served_names(table)
+        if self.registered:
+            self.register_to_controller()
+        logger.info(f"ProxyWorker now serves models: {self.model_names}")
+    
+    @property
+    def capacity(self) -> int:
+        """Requests this worker runs concurrently."""
+        if self.admission is not None:
+            return self.admission.limit.value
+        return self.limit_worker_concurrency
+    
+    def get_status(self) -> Dict:
+        """
+        Get the status sent when registering with the controller.
+        
+        Returns:
+            Dict: FastChat's status plus capacity and service time
+        """
+        status = super().get_status()
+        status["capacity"] = self.capacity
+        status["service_time"] = self.service_time
+        return status
+    
+    def _observe_service_time(self, seconds: float) -> None:
+        """
+        Update the moving average of request duration.
         
-        if stop_str:
-            request_data["stop"] = stop_str if isinstance(stop_str, list) else [stop_str]
+        Args:
+            seconds: Duration of a completed request
+        """
+        if self.service_time is None:
+            self.service_time = seconds
+        else:
+            alpha = Config.ROUTER_EWMA_ALPHA
+            self.service_time = alpha * seconds + (1 - alpha) * self.service_time
+    
+    def init_heart_beat(self) -> None:
+        """Register with the controller and start heartbeats and load reports."""
+        super().init_heart_beat()
+        self._load_thread = threading.Thread(target=self._report_loads, name="orcestator-load", daemon=True)
+        self._load_thread.start()
+    
+    async def start_serving(self, server) -> None:
+        """
+        Warm up, then register with the controller once the server accepts connections.
+        
+        Until it is registered the controller sends the worker no requests,
+        so nothing is dispatched to a port that is not listening yet or to
+        a cold upstream pool.
         
-        with RequestTimer(model=model_name) as timer:
+        Args:
+            server: The uvicorn server running the worker's app
+        """
+        start = time.perf_counter()
+        await self.warm_up()
+        if self.batches is not None:
+            self.batches.start()
+        while not server.started:
+            await asyncio.sleep(0.05)
+        while not self.no_register and not self.registered:
             try:
-                async with self.client.stream(
-                    "POST",
-                    "/chat/completions",
-                    json=request_data,
-                    timeout=60.0,
-                ) as response:
-                    response.raise_for_status()
-                    
-                    full_response = ""
-                    prompt_tokens = 0
-                    completion_tokens = 0
-                    
-                    async for line in response.aiter_lines():
-                        if not line or line.startswith(":"):
-                            continue
-                        
-                        if line.startswith("data: "):
-                            line = line[6:]  # Remove "data: " prefix
-                        
-                        if line.strip() == "[DONE]":
-                            break
-                        
-                        try:
-                            chunk = json.loads(line)
-                            
-                            if "usage" in chunk:
-                                usage = chunk["usage"]
-                                prompt_tokens = usage.get("prompt_tokens", 0)
-                                completion_tokens = usage.get("completion_tokens", 0)
-                            
-                            delta = chunk.get("choices", [{}])[0].get("delta", {})
-                            content = delta.get("content", "")
-                            
-                            if content:
-                                full_response += content
-                            
-                            if "model" in chunk:
-                                chunk["model"] = "orcestator"
-                            
-                            yield {"text": full_response, "error_code": 0}
-                        
-                        except json.JSONDecodeError:
-                            logger.error(f"Failed to parse JSON: {line}")
-                            continue
-                    
-                    user_message = messages[0]["content"] if messages else ""
-                    latency_ms = int(timer.latency_seconds * 1000)
-                    
-                    update_metrics(
-                        model=model_name,
-                        prompt_tokens=prompt_tokens,
-                        completion_tokens=completion_tokens,
-                        latency_seconds=timer.latency_seconds,
-                    )
-                    
-                    log_to_file(
-                        user_message=user_message,
-                        assistant_message=full_response,
-                        prompt_tokens=prompt_tokens,
-                        completion_tokens=completion_tokens,
-                        latency_ms=latency_ms,
-                        model=model_name,
-                        original_model=target_model,
-                    )
-            
-            except Exception as e:
-                logger.error(f"Error in generate_stream: {str(e)}")
-                yield {"text": f"Error: {str(e)}", "error_code": 1}
-
-    async def generate(
-        self,
-        params: Dict,
-        **kwargs,
-    ) -> Dict:
+                await asyncio.to_thread(self.init_heart_beat)
+                self.registered = True
+            except (requests.exceptions.RequestException, AssertionError) as e:
+                # The controller may still be starting.
+                logger.warning(f"Registration with the controller failed, retrying: {e}")
+                await asyncio.sleep(1.0)
+        logger.info(f"ProxyWorker ready in {time.perf_counter() - start:.2f}s")
+    
+    def report_load(self) -> bool:
+        """
+        Send the current load to the controller.
+        
+        Returns:
+            bool: False if the controller does not accept load reports
         """
-        Generate a response by proxying to OpenRouter (non-streaming).
+        data = {
+            "worker_name": self.worker_addr,
+            "in_flight": self.get_queue_length(),
+            "capacity": self.capacity,
+            "service_time": self.service_time,
+        }
+        try:
+            response = requests.post(self.controller_addr + "/report_load", json=data, timeout=2)
+            if response.status_code == 404:
+                logger.info("The controller does not accept load reports; relying on heartbeats")
+                return False
+            if not response.json()["exist"]:
+                self.register_to_controller()
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            logger.error(f"Load report failed: {e}")
+        return True
+    
+    def _report_loads(self) -> None:
+        """Report the load every OR_LOAD_REPORT_INTERVAL seconds."""
+        while self.report_load():
+            time.sleep(Config.LOAD_REPORT_INTERVAL)
+    
+    def make_conv_template(self, conv_template: str = None, model_path: str = None) -> Conversation:
+        """
+        Get the conversation template without loading FastChat's model adapters.
         
         Args:
-            params: Parameters for the generation
-            
+            conv_template: Template name
+            model_path: Unused; there is no local model
+        
         Returns:
-            Dict: Generated response
+            Conversation: The registered template
+        """
+        from fastchat.conversation import get_conv_template
+        
+        return get_conv_template(conv_template or CONV_TEMPLATE)
+    
+    def count_token(self, params: Dict) -> Dict:
+        """
+        Estimate the prompt length for FastChat's context length check.
+        
+        Args:
+            params: Request with the rendered prompt
+        
+        Returns:
+            Dict: Approximate token count
+        """
+        return {"count": heuristic_tokens(params.get("prompt", "")), "error_code": 0}
+    
+    async def generate_stream_gate(self, params: Dict) -> AsyncGenerator[bytes, None]:
         """
-        full_response = ""
-        async for chunk in self.generate_stream(params, **kwargs):
-            if chunk.get("error_code", 0) == 0:
-                full_response = chunk["text"]
+        Stream a completion in FastChat's worker wire format.
+        
+        FastChat expects every response to carry the whole text so far,
+        which is kept as a running string. With OR_STREAM_DELTAS only the
+        new text is sent, marked as a delta, and the Orcestator API server
+        rebuilds the whole text instead.
+        
+        Args:
+            params: Generation parameters from the API server
+        
+        Yields:
+            bytes: JSON responses, each terminated by a NUL byte
+        """
+        started = time.monotonic()
+        text = ""
+        # Closed as soon as this generator is, so a disconnect stops the upstream call.
+        async with aclosing(self.generate_stream(params)) as outputs:
+            async for output in outputs:
+                if output["error_code"] == 0:
+                    if Config.STREAM_DELTAS:
+                        output["delta"] = True
+                    else:
+                        text += output["text"]
+                        output["text"] = text
+                yield json.dumps(output).encode() + b"\0"
+        self._observe_service_time(time.monotonic() - started)
+    
+    async def generate_gate(self, params: Dict) -> Dict:
+        """
+        Generate a complete response for /worker_generate.
+        
+        Args:
+            params: Generation parameters from the API server
         
-        return {"text": full_response, "error_code": 0}
+        Returns:
+            Dict: Generated response
+        """
+        started = time.monotonic()
+        output = await self.generate(params)
+        self._observe_service_time(time.monotonic() - started)
+        return output
+
+
+# FastChat runs /worker_generate in a thread, for blocking local models; the
+# proxy is async and shares one upstream client, so it is awaited instead.
+# Its /worker_generate_stream leaves the stream running after the API server
+# disconnects, so both routes are replaced.
+app.router.routes[:] = [
+    route for route in app.router.routes
+    if getattr(route, "path", None) not in ("/worker_generate", "/worker_generate_stream")
+]
+
+
+@app.post("/worker_generate_stream")
+async def api_generate_stream(request: Request) -> ClosingStreamingResponse:
+    """Stream a response within the worker's concurrency limit, stopping it if the client disconnects."""
+    params = await request.json()
+    await acquire_worker_semaphore()
+    return ClosingStreamingResponse(
+        base_model_worker.worker.generate_stream_gate(params),
+        background=create_background_tasks(),
+    )
+
+
+@app.post("/worker_generate")
+async def api_generate(request: Request) -> JSONResponse:
+    """Generate a complete response within the worker's concurrency limit."""
+    params = await request.json()
+    await acquire_worker_semaphore()
+    try:
+        output = await base_model_worker.worker.generate_gate(params)
+    finally:
+        release_worker_semaphore()
+    return JSONResponse(output)
+
+
+@app.post("/worker_create_batch")
+async def api_create_batch(request: Request) -> JSONResponse:
+    """Create a batch job run by this worker."""
+    return await batch_response(base_model_worker.worker.batches, "submit", await request.json())
+
+
+@app.post("/worker_get_batch")
+async def api_get_batch(request: Request) -> JSONResponse:
+    """Get a batch job's status."""
+    params = await request.json()
+    return await batch_response(base_model_worker.worker.batches, "status", params.get("id"))
+
+
+@app.post("/worker_cancel_batch")
+async def api_cancel_batch(request: Request) -> JSONResponse:
+    """Cancel a batch job."""
+    params = await request.json()
+    return await batch_response(base_model_worker.worker.batches, "cancel", params.get("id"))
+
+
+@app.post("/worker_list_batches")
+async def api_list_batches() -> JSONResponse:
+    """List the most recent batch jobs."""
+    return await batch_response(base_model_worker.worker.batches, "list")
 
 
 def create_worker(args):
@@ -221,7 +372,13 @@ def create_worker(args):
     return worker
 
 
-if __name__ == "__main__":
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Build the proxy worker command line parser.
+    
+    Returns:
+        argparse.ArgumentParser: Parser for the worker options
+    """
     parser = argparse.ArgumentParser()
     parser.add_argument("--controller-address", type=str, default=f"http://localhost:{Config.CONTROLLER_PORT}")
     parser.add_argument("--worker-address", type=str, default=f"http://localhost:{Config.WORKER_PORT}")
@@ -231,14 +388,30 @@ if __name__ == "__main__":
     parser.add_argument("--limit-worker-concurrency", type=int, default=5)
     parser.add_argument("--no-register", action="store_true")
     parser.add_argument("--port", type=int, default=Config.WORKER_PORT)
+    return parser
+
+
+def serve(args) -> None:
+    """
+    Create a proxy worker and serve it until shutdown.
     
-    args = parser.parse_args()
-    
+    Args:
+        args: Command line arguments from build_parser
+    """
     if args.model_names is None:
         args.model_names = [args.model_id]
     
     args.worker_address = f"http://localhost:{args.port}"
     
+    if Config.LIMITER_ENABLED and args.limit_worker_concurrency < Config.LIMITER_MAX:
+        # The adaptive limiter does the admission control; FastChat's fixed
+        # semaphore must not cap concurrency below it.
+        logger.info(
+            f"Raising --limit-worker-concurrency to {Config.LIMITER_MAX} "
+            f"for the adaptive limiter"
+        )
+        args.limit_worker_concurrency = Config.LIMITER_MAX
+    
     worker = create_worker(args)
     
     app.title = "Orcestator Proxy Worker"
@@ -249,6 +422,24 @@ if __name__ == "__main__":
         "timeout_keep_alive": 60,
     }
     
-    app.worker = worker
     import uvicorn
-    uvicorn.run(app, **uvicorn_kwargs)
+    server = uvicorn.Server(uvicorn.Config(app, **uvicorn_kwargs))
+    
+    async def on_startup() -> None:
+        # Runs in the background so uvicorn starts listening meanwhile.
+        worker.startup_task = asyncio.create_task(worker.start_serving(server))
+    
+    async def on_shutdown() -> None:
+        if worker.batches is not None:
+            await worker.batches.close()
+    
+    app.worker = worker
+    app.router.on_startup.append(on_startup)
+    app.router.on_shutdown.append(on_shutdown)
+    server.run()
+    
+    shutdown_logging()
+
+
+if __name__ == "__main__":
+    serve(build_parser().parse_args())
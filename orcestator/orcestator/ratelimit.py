@@ -0,0 +1,429 @@
+"""
+Per-client rate limiting for Orcestator.
+Token buckets per client API key and requested model bound requests per second
+and tokens per minute. Over-limit requests are answered with 429 at the API
+server, before they reach a worker or the upstream. Requests with an unknown
+API key are left to the server to reject and are not counted.
+"""
+
+import atexit
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from orcestator.aliases import get_alias_registry
+from orcestator.config import Config
+from orcestator.logger import QUOTA_REQUESTS, QUOTA_TOKENS, RATE_LIMITED
+from orcestator.tokens import heuristic_tokens
+
+logger = logging.getLogger("orcestator")
+
+RATE_LIMITED_PATHS = ("/v1/chat/completions", "/v1/completions")
+
+# Bucket key shared by all models that are neither aliases nor configured.
+OTHER_MODELS = "other"
+
+
+def client_id(api_key: Optional[str]) -> str:
+    """
+    Get a stable, non-secret identifier for a client API key.
+    
+    Args:
+        api_key: Bearer token sent by the client, if any
+        
+    Returns:
+        str: Short hash of the key, or "anonymous"
+    """
+    if not api_key:
+        return "anonymous"
+    return hashlib.sha256(api_key.encode()).hexdigest()[:12]
+
+
+def limited_model(model: str) -> str:
+    """
+    Get the bucket key of a requested model.
+    
+    Aliases and models listed in OR_RATE_LIMIT_MODELS have buckets of
+    their own. Any other name shares one key, so clients cannot grow the
+    buckets and metric label sets by sending arbitrary model names.
+    
+    Args:
+        model: Model requested by the client
+        
+    Returns:
+        str: The model, or OTHER_MODELS
+    """
+    if model in get_alias_registry().table.aliases or Config.has_rate_limits(model):
+        return model
+    return OTHER_MODELS
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` units per second."""
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.balance = capacity
+        self.updated = time.monotonic()
+    
+    def refill(self, now: float) -> None:
+        """Add the units accrued since the last update."""
+        # A bucket created after `now` was read has nothing to add yet.
+        if now > self.updated:
+            self.balance = min(self.capacity, self.balance + (now - self.updated) * self.rate)
+            self.updated = now
+    
+    def wait_time(self, amount: float, now: float) -> float:
+        """
+        Get how long until `amount` units are available.
+        
+        Args:
+            amount: Units needed
+            now: Current monotonic time
+            
+        Returns:
+            float: Seconds to wait, 0 if available now
+        """
+        self.refill(now)
+        if self.balance >= amount:
+            return 0.0
+        return (amount - self.balance) / self.rate
+
+
+class RateLimiter:
+    """
+    Request and token buckets per (client, requested model) pair.
+    
+    A request is admitted when its request bucket holds one request and
+    its token bucket is not overdrawn. Token usage is only known once the
+    response is finished, so it is charged afterwards and may take the
+    token bucket below zero, which then blocks the pair until it refills.
+    """
+    
+    def __init__(self, persist: bool = False):
+        """
+        Initialize the limiter.
+        
+        Args:
+            persist: Restore bucket balances from the database and
+                snapshot them every Config.RATE_LIMIT_SNAPSHOT_INTERVAL seconds
+        """
+        self._buckets: Dict[Tuple[str, str], Tuple[Optional[TokenBucket], Optional[TokenBucket]]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        
+        if persist:
+            self.restore()
+            thread = threading.Thread(target=self._snapshot_loop, name="orcestator-rate-limit", daemon=True)
+            thread.start()
+            atexit.register(self.close)
+    
+    def _pair(self, client: str, model: str) -> Tuple[Optional[TokenBucket], Optional[TokenBucket]]:
+        """Get the buckets of a pair, creating them from the configured limits."""
+        buckets = self._buckets.get((client, model))
+        if buckets is None:
+            limits = Config.rate_limits(model)
+            requests = TokenBucket(limits["rps"], max(1, limits["burst"])) if limits["rps"] > 0 else None
+            tokens = TokenBucket(limits["tpm"] / 60.0, limits["tpm"]) if limits["tpm"] > 0 else None
+            buckets = self._buckets[(client, model)] = (requests, tokens)
+        return buckets
+    
+    def check(self, client: str, model: str) -> float:
+        """
+        Admit one request for a pair if its limits allow it.
+        
+        Args:
+            client: Client identifier from client_id
+            model: Model or alias requested by the client
+            
+        Returns:
+            float: 0 if admitted, otherwise seconds until a retry may succeed
+        """
+        now = time.monotonic()
+        with self._lock:
+            requests, tokens = self._pair(client, model)
+            
+            if tokens is not None:
+                wait = tokens.wait_time(1, now)
+                if wait > 0:
+                    RATE_LIMITED.labels(model=model, limit="tokens").inc()
+                    return wait
+            
+            if requests is not None:
+                wait = requests.wait_time(1, now)
+                if wait > 0:
+                    RATE_LIMITED.labels(model=model, limit="requests").inc()
+                    return wait
+                requests.balance -= 1
+        
+        QUOTA_REQUESTS.labels(client=client, model=model).inc()
+        return 0.0
+    
+    def charge(self, client: str, model: str, tokens_used: int) -> None:
+        """
+        Charge the tokens of a finished request.
+        
+        Args:
+            client: Client identifier from client_id
+            model: Model or alias requested by the client
+            tokens_used: Prompt plus completion tokens
+        """
+        if tokens_used <= 0:
+            return
+        
+        with self._lock:
+            _, tokens = self._pair(client, model)
+            if tokens is not None:
+                tokens.refill(time.monotonic())
+                tokens.balance -= tokens_used
+        QUOTA_TOKENS.labels(client=client, model=model).inc(tokens_used)
+    
+    def snapshot(self) -> None:
+        """Store the current bucket balances in the database."""
+        now = time.monotonic()
+        wall = time.time()
+        rows: List[Dict] = []
+        with self._lock:
+            for (client, model), (requests, tokens) in self._buckets.items():
+                for bucket in (requests, tokens):
+                    if bucket is not None:
+                        bucket.refill(now)
+                rows.append({
+                    "client": client,
+                    "model": model,
+                    "requests": requests.balance if requests is not None else 0.0,
+                    "tokens": tokens.balance if tokens is not None else 0.0,
+                    "updated_at": wall,
+                })
+        
+        from orcestator.db import save_rate_limit_state
+        
+        try:
+            save_rate_limit_state(rows)
+        except Exception as e:
+            logger.error(f"Failed to snapshot rate limits: {str(e)}")
+    
+    def restore(self) -> None:
+        """Load bucket balances from the database, refilled for the time since."""
+        from orcestator.db import load_rate_limit_state
+        
+        try:
+            rows = load_rate_limit_state()
+        except Exception as e:
+            logger.error(f"Failed to restore rate limits: {str(e)}")
+            return
+        
+        now = time.monotonic()
+        wall = time.time()
+        with self._lock:
+            for row in rows:
+                if limited_model(row["model"]) != row["model"]:
+                    continue
+                requests, tokens = self._pair(row["client"], row["model"])
+                elapsed = max(0.0, wall - row["updated_at"])
+                for bucket, balance in ((requests, row["requests"]), (tokens, row["tokens"])):
+                    if bucket is not None:
+                        bucket.balance = min(bucket.capacity, balance + elapsed * bucket.rate)
+                        bucket.updated = now
+        logger.info(f"Restored rate limits for {len(rows)} client/model pair(s)")
+    
+    def _snapshot_loop(self) -> None:
+        """Snapshot periodically until closed."""
+        while not self._stop.wait(Config.RATE_LIMIT_SNAPSHOT_INTERVAL):
+            self.snapshot()
+    
+    def close(self) -> None:
+        """Stop the snapshot thread and write a final snapshot."""
+        if not self._stop.is_set():
+            self._stop.set()
+            self.snapshot()
+
+
+def _estimate_prompt_tokens(request: Dict) -> int:
+    """Roughly estimate prompt tokens without a tokenizer."""
+    tokens = heuristic_tokens(str(request.get("prompt", "")))
+    for message in request.get("messages") or []:
+        content = message.get("content") if isinstance(message, dict) else None
+        tokens += heuristic_tokens(content) if isinstance(content, str) else 0
+    return tokens
+
+
+class _UsageMeter:
+    """Reads token usage from a chat completion response as it is sent."""
+    
+    def __init__(self, prompt_estimate: int):
+        self.prompt_estimate = prompt_estimate
+        self.status = 200
+        self.streaming = False
+        self.frames = 0
+        self.usage: Optional[Dict] = None
+        self._body: List[bytes] = []
+    
+    def start(self, message: Dict) -> None:
+        """Record the response status and type."""
+        self.status = message["status"]
+        for name, value in message.get("headers", []):
+            if name.lower() == b"content-type":
+                self.streaming = value.startswith(b"text/event-stream")
+    
+    def feed(self, body: bytes) -> None:
+        """Inspect one chunk of the response body."""
+        if not self.streaming:
+            self._body.append(body)
+            return
+        
+        self.frames += body.count(b"data: ")
+        if b'"usage"' in body:
+            for line in body.split(b"\n"):
+                if line.startswith(b"data: {") and b'"usage"' in line:
+                    try:
+                        self.usage = json.loads(line[6:]).get("usage") or self.usage
+                    except ValueError:
+                        pass
+    
+    def total_tokens(self) -> int:
+        """
+        Get the tokens to charge for the response.
+        
+        Streams without a usage frame (such as FastChat's) are estimated
+        from the prompt length and the number of frames sent.
+        
+        Returns:
+            int: Prompt plus completion tokens
+        """
+        if self.status >= 400:
+            return 0
+        
+        if not self.streaming:
+            try:
+                self.usage = json.loads(b"".join(self._body)).get("usage")
+            except (ValueError, AttributeError):
+                pass
+        
+        if self.usage:
+            return int(self.usage.get("total_tokens") or (
+                (self.usage.get("prompt_tokens") or 0) + (self.usage.get("completion_tokens") or 0)
+            ))
+        # Every frame but the role and [DONE] frames carries about one token.
+        return self.prompt_estimate + max(0, self.frames - 2)
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware that applies a RateLimiter to completion endpoints.
+    
+    Works in front of both the FastChat API server and the direct server:
+    the client key is taken from the bearer token, the model from the
+    request body, and token usage from the response as it passes.
+    Buckets are kept per requested model or alias: an alias with several
+    targets picks one only when the worker handles the request, so the
+    middleware cannot know which target will be used.
+    
+    Only keys the server accepts get buckets of their own. Requests with
+    any other key are passed on unmetered for the server to reject, and
+    without configured keys all clients share the anonymous buckets.
+    """
+    
+    def __init__(self, app, limiter: RateLimiter, api_keys: Optional[List[str]] = None):
+        """
+        Initialize the middleware.
+        
+        Args:
+            app: Wrapped ASGI application
+            limiter: Buckets to check and charge
+            api_keys: Keys the server accepts, or None if it accepts any request
+        """
+        self.app = app
+        self.limiter = limiter
+        self.api_keys = set(api_keys) if api_keys else None
+    
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in RATE_LIMITED_PATHS:
+            await self.app(scope, receive, send)
+            return
+        
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+        
+        try:
+            request = json.loads(body)
+        except ValueError:
+            request = None
+        if not isinstance(request, dict):
+            request = {}
+        
+        replayed = False
+        
+        async def replay():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+        
+        api_key = None
+        for name, value in scope["headers"]:
+            if name == b"authorization" and value[:7].lower() == b"bearer ":
+                api_key = value[7:].decode("latin-1")
+        if self.api_keys is None:
+            client = client_id(None)
+        elif api_key in self.api_keys:
+            client = client_id(api_key)
+        else:
+            await self.app(scope, replay, send)
+            return
+        requested = str(request.get("model") or "orcestator")
+        model = limited_model(requested)
+        
+        retry_after = self.limiter.check(client, model)
+        if retry_after > 0:
+            await self._reject(send, requested, retry_after)
+            return
+        
+        meter = _UsageMeter(_estimate_prompt_tokens(request))
+        
+        async def metered_send(message):
+            if message["type"] == "http.response.start":
+                meter.start(message)
+            elif message["type"] == "http.response.body":
+                meter.feed(message.get("body", b""))
+            await send(message)
+        
+        try:
+            await self.app(scope, replay, metered_send)
+        finally:
+            self.limiter.charge(client, model, meter.total_tokens())
+    
+    @staticmethod
+    async def _reject(send, model: str, retry_after: float) -> None:
+        """Send a 429 response with Retry-After."""
+        seconds = max(1, math.ceil(retry_after))
+        content = json.dumps({
+            "error": {
+                "message": f"Rate limit exceeded for {model}, retry in {seconds}s",
+                "type": "rate_limit_error",
+                "code": 429,
+            }
+        }).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(content)).encode()),
+                (b"retry-after", str(seconds).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": content})
@@ -0,0 +1,360 @@
+"""
+Upstream routing for Orcestator.
+Spreads requests over several OpenAI-compatible upstreams by observed
+latency, error rate and load, with circuit breakers and failover.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+import httpx
+
+from orcestator.config import Config
+from orcestator.logger import UPSTREAM_CIRCUIT_OPEN, UPSTREAM_REQUESTS, UPSTREAM_TTFT_EWMA
+from orcestator.upstream import UpstreamTrace, create_upstream_client
+
+logger = logging.getLogger("orcestator")
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Check whether an upstream error may succeed on another upstream.
+    
+    Args:
+        error: Exception raised by httpx
+        
+    Returns:
+        bool: True for transport errors and overload/server error statuses
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, httpx.TransportError)
+
+
+def error_outcome(error: Exception) -> str:
+    """
+    Classify a failed upstream attempt for the upstream's statistics.
+    
+    Args:
+        error: Exception raised by httpx
+    
+    Returns:
+        str: "rejected" if the upstream refused the request itself with a
+        non-retryable 4xx status, otherwise "failure"
+    """
+    if isinstance(error, httpx.HTTPStatusError) and not is_retryable(error):
+        if error.response.status_code < 500:
+            return "rejected"
+    return "failure"
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+    
+    Opens after `failure_threshold` failures in a row and rejects traffic
+    for `cooldown` seconds. After that one trial request is let through
+    (half-open); its outcome closes or re-opens the circuit.
+    """
+    
+    def __init__(self, failure_threshold: int, cooldown: float):
+        """
+        Initialize a closed breaker.
+        
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            cooldown: Seconds the circuit stays open
+        """
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self.trial_in_flight = False
+    
+    @property
+    def is_open(self) -> bool:
+        """Whether the circuit currently rejects traffic."""
+        return self.failures >= self.failure_threshold
+    
+    def allows_request(self) -> bool:
+        """
+        Check whether a request may be sent now.
+        
+        Returns:
+            bool: True if closed, or half-open with no trial in flight
+        """
+        if not self.is_open:
+            return True
+        return time.monotonic() >= self.open_until and not self.trial_in_flight
+    
+    def on_attempt(self) -> None:
+        """Mark the half-open trial as started, if this is one."""
+        if self.is_open:
+            self.trial_in_flight = True
+    
+    def on_success(self) -> None:
+        """Close the circuit."""
+        self.failures = 0
+        self.trial_in_flight = False
+    
+    def on_failure(self) -> None:
+        """Count a failure and open the circuit at the threshold."""
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.is_open:
+            self.open_until = time.monotonic() + self.cooldown
+
+
+class Upstream:
+    """One OpenAI-compatible endpoint with its client and live statistics."""
+    
+    def __init__(self, name: str, client: httpx.AsyncClient):
+        """
+        Initialize the endpoint.
+        
+        Args:
+            name: Name used in logs and metric labels
+            client: Client bound to the endpoint's base URL and key
+        """
+        self.name = name
+        self.client = client
+        self.ttft_ewma: Optional[float] = None
+        self.error_ewma = 0.0
+        self.in_flight = 0
+        self.breaker = CircuitBreaker(Config.CIRCUIT_FAILURE_THRESHOLD, Config.CIRCUIT_COOLDOWN)
+    
+    def score(self) -> float:
+        """
+        Estimate the cost of sending the next request here; lower is better.
+        
+        Unmeasured endpoints score as fast so they get explored.
+        
+        Returns:
+            float: Expected latency weighted by load and error rate
+        """
+        ttft = self.ttft_ewma if self.ttft_ewma is not None else 0.0
+        return (ttft + 0.05) * (1 + self.in_flight) / max(0.05, 1.0 - self.error_ewma)
+    
+    def observe_ttft(self, seconds: float) -> None:
+        """
+        Fold a time-to-first-token sample into the moving average.
+        
+        Args:
+            seconds: Observed time to first token
+        """
+        alpha = Config.ROUTER_EWMA_ALPHA
+        if self.ttft_ewma is None:
+            self.ttft_ewma = seconds
+        else:
+            self.ttft_ewma = alpha * seconds + (1 - alpha) * self.ttft_ewma
+        UPSTREAM_TTFT_EWMA.labels(upstream=self.name).set(self.ttft_ewma)
+    
+    def observe_outcome(self, outcome: str) -> None:
+        """
+        Update the error rate and circuit breaker after an attempt.
+        
+        A rejected request says the upstream is up, so it counts as
+        healthy, but it is reported under its own outcome.
+        
+        Args:
+            outcome: "success", "failure" if the attempt failed on the
+                upstream's side, or "rejected" for a non-retryable 4xx
+        """
+        failed = outcome == "failure"
+        alpha = Config.ROUTER_EWMA_ALPHA
+        self.error_ewma = alpha * (1.0 if failed else 0.0) + (1 - alpha) * self.error_ewma
+        if failed:
+            self.breaker.on_failure()
+        else:
+            self.breaker.on_success()
+        UPSTREAM_REQUESTS.labels(upstream=self.name, outcome=outcome).inc()
+        UPSTREAM_CIRCUIT_OPEN.labels(upstream=self.name).set(1 if self.breaker.is_open else 0)
+
+    def observe_abandoned(self, outcome: str) -> None:
+        """
+        Record an attempt abandoned by its caller.
+        
+        Says nothing about the upstream's health, so only a half-open
+        trial is released, letting the next request probe the upstream.
+        
+        Args:
+            outcome: "cancelled" if the caller went away, or "error" if
+                it failed while handling the response
+        """
+        self.breaker.trial_in_flight = False
+        UPSTREAM_REQUESTS.labels(upstream=self.name, outcome=outcome).inc()
+
+
+class UpstreamCall:
+    """Handle for one routed upstream attempt, used to report the first token."""
+    
+    def __init__(self, upstream: Upstream, response: httpx.Response, start_time: float, trace: UpstreamTrace):
+        self.upstream = upstream
+        self.response = response
+        self.start_time = start_time
+        self.first_token_seen = False
+        # Transports without httpcore (e.g. MockTransport) emit no trace events.
+        self.connect = trace.connect
+        self.ttfb = trace.ttfb if trace.ttfb is not None else time.perf_counter() - start_time
+    
+    def mark_first_token(self) -> None:
+        """Record time to first token for the upstream's moving average."""
+        if not self.first_token_seen:
+            self.first_token_seen = True
+            self.upstream.observe_ttft(time.perf_counter() - self.start_time)
+
+
+class UpstreamRouter:
+    """
+    Chooses an upstream per request and fails over before the first byte.
+    
+    A request that fails to connect, times out or gets a retryable status
+    before any response body is read is retried on the best remaining
+    upstream, up to `Config.ROUTER_MAX_ATTEMPTS` attempts.
+    """
+    
+    def __init__(self, upstreams: List[Upstream]):
+        """
+        Initialize the router.
+        
+        Args:
+            upstreams: Endpoints to route over
+        """
+        if not upstreams:
+            raise ValueError("At least one upstream is required")
+        self.upstreams = upstreams
+    
+    @classmethod
+    def from_config(cls) -> "UpstreamRouter":
+        """
+        Build a router with one tuned client per configured endpoint.
+        
+        Returns:
+            UpstreamRouter: Router over Config.upstreams()
+        """
+        return cls([
+            Upstream(endpoint["name"], create_upstream_client(endpoint["base_url"], endpoint["api_key"]))
+            for endpoint in Config.upstreams()
+        ])
+    
+    def choose(self, exclude: Set[str]) -> Upstream:
+        """
+        Pick the upstream with the lowest score.
+        
+        Upstreams with an open circuit are skipped; if every candidate is
+        open, the one whose cooldown ends first is used anyway.
+        
+        Args:
+            exclude: Names of upstreams already tried for this request
+            
+        Returns:
+            Upstream: The chosen endpoint
+        """
+        candidates = [u for u in self.upstreams if u.name not in exclude] or self.upstreams
+        available = [u for u in candidates if u.breaker.allows_request()]
+        if available:
+            return min(available, key=lambda u: u.score())
+        return min(candidates, key=lambda u: u.breaker.open_until)
+    
+    @asynccontextmanager
+    async def stream(
+        self,
+        path: str,
+        json: Dict,
+        avoid: Optional[Set[str]] = None,
+    ) -> AsyncIterator[UpstreamCall]:
+        """
+        Open a streaming POST on the best upstream, failing over on early errors.
+        
+        Args:
+            path: Request path relative to the upstream base URL
+            json: Request body
+            avoid: Names of upstreams to use only if no other is left
+            
+        Yields:
+            UpstreamCall: The successful attempt with its open response
+        """
+        tried: Set[str] = set(avoid or ())
+        for attempt in range(1, Config.ROUTER_MAX_ATTEMPTS + 1):
+            upstream = self.choose(tried)
+            tried.add(upstream.name)
+            upstream.breaker.on_attempt()
+            upstream.in_flight += 1
+            start_time = time.perf_counter()
+            trace = UpstreamTrace()
+            opened = False
+            try:
+                async with upstream.client.stream(
+                    "POST", path, json=json, extensions={"trace": trace}
+                ) as response:
+                    if response.is_error:
+                        await response.aread()
+                        response.raise_for_status()
+                    opened = True
+                    yield UpstreamCall(upstream, response, start_time, trace)
+                upstream.observe_outcome("success")
+                return
+            except (asyncio.CancelledError, GeneratorExit):
+                # Leaving the block closes the upstream response and its connection.
+                upstream.observe_abandoned("cancelled")
+                raise
+            except httpx.HTTPError as e:
+                retryable = is_retryable(e)
+                upstream.observe_outcome(error_outcome(e))
+                if opened or not retryable or attempt == Config.ROUTER_MAX_ATTEMPTS:
+                    raise
+                logger.warning(f"Upstream {upstream.name} failed before first byte ({str(e)}), retrying")
+            except Exception:
+                upstream.observe_abandoned("error")
+                raise
+            finally:
+                upstream.in_flight -= 1
+    
+    async def post(self, path: str, json: Dict) -> httpx.Response:
+        """
+        Send a non-streaming POST on the best upstream, failing over on errors.
+        
+        The attempt's UpstreamTrace is available as
+        `response.request.extensions["trace"]`.
+        
+        Args:
+            path: Request path relative to the upstream base URL
+            json: Request body
+            
+        Returns:
+            httpx.Response: Successful response
+        """
+        tried: Set[str] = set()
+        for attempt in range(1, Config.ROUTER_MAX_ATTEMPTS + 1):
+            upstream = self.choose(tried)
+            tried.add(upstream.name)
+            upstream.breaker.on_attempt()
+            upstream.in_flight += 1
+            start_time = time.perf_counter()
+            try:
+                response = await upstream.client.post(
+                    path, json=json, extensions={"trace": UpstreamTrace()}
+                )
+                response.raise_for_status()
+                upstream.observe_ttft(time.perf_counter() - start_time)
+                upstream.observe_outcome("success")
+                return response
+            except asyncio.CancelledError:
+                upstream.observe_abandoned("cancelled")
+                raise
+            except httpx.HTTPError as e:
+                retryable = is_retryable(e)
+                upstream.observe_outcome(error_outcome(e))
+                if not retryable or attempt == Config.ROUTER_MAX_ATTEMPTS:
+                    raise
+                logger.warning(f"Upstream {upstream.name} failed ({str(e)}), retrying")
+            except Exception:
+                upstream.observe_abandoned("error")
+                raise
+            finally:
+                upstream.in_flight -= 1
@@ -0,0 +1,329 @@
+"""
+Semantic response cache for Orcestator.
+Serves deterministic chat completions whose messages differ from an earlier
+request only in whitespace, timestamps, IDs or file paths. Messages are
+embedded locally with hashed word n-grams, without any network call, and
+matched by cosine similarity in a bounded in-memory index.
+"""
+
+import asyncio
+import logging
+import re
+import threading
+import time
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+from orcestator.cache import cache_key
+from orcestator.logger import CACHE_EVICTIONS, CACHE_HITS, SEMANTIC_CACHE_SIMILARITY
+
+logger = logging.getLogger("orcestator")
+
+_UUID = re.compile(
+    r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b|\b[0-9a-f]{16,}\b",
+    re.IGNORECASE,
+)
+_TIMESTAMP = re.compile(
+    r"\b\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:[.,]\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?"
+    r"|\b\d{1,2}:\d{2}:\d{2}(?:[.,]\d+)?"
+)
+_PATH = re.compile(
+    r"(?:\b[A-Za-z]:\\|(?<![\w.])~?/)[^\s'\"`<>|]+"
+    r"|\b(?:[\w.-]+[\\/])+[\w-]+\.\w+\b"
+)
+_TOKEN = re.compile(r"<\w+>|\w+|[^\w\s]")
+
+# Near-identical puts replace the existing entry instead of adding one.
+_DUPLICATE_SIMILARITY = 0.999
+
+
+def semantic_cache_available() -> bool:
+    """
+    Check whether the semantic cache can be used.
+    
+    Returns:
+        bool: True if numpy is installed
+    """
+    if np is None:
+        logger.warning("OR_SEMANTIC_CACHE_ENABLED needs numpy, which is not installed; semantic cache disabled")
+        return False
+    return True
+
+
+def normalize_messages(messages: List[Dict]) -> str:
+    """
+    Reduce a message list to the text that decides its answer.
+    
+    IDs, timestamps and file paths are replaced by placeholders, case and
+    whitespace are folded. Plain numbers are kept, since they usually
+    change the answer.
+    
+    Args:
+        messages: Chat messages
+    
+    Returns:
+        str: One `role: text` line per message
+    """
+    lines = []
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        text = _UUID.sub(" <id> ", content)
+        text = _TIMESTAMP.sub(" <time> ", text)
+        text = _PATH.sub(" <path> ", text)
+        text = " ".join(text.lower().split())
+        lines.append(f"{message.get('role', 'user')}: {text}")
+    return "\n".join(lines)
+
+
+def embed(text: str, dim: int):
+    """
+    Embed text as a signed feature-hashed vector of words and word bigrams.
+    
+    Args:
+        text: Normalized text
+        dim: Vector dimension
+    
+    Returns:
+        numpy.ndarray: L2-normalized float32 vector
+    """
+    tokens = _TOKEN.findall(text)
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    if not features:
+        return np.zeros(dim, dtype=np.float32)
+    
+    hashes = np.fromiter(
+        (zlib.crc32(feature.encode("utf-8")) for feature in features),
+        dtype=np.uint32,
+        count=len(features),
+    )
+    signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+    vector = np.bincount(hashes % dim, weights=signs, minlength=dim).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def bucket_id(request_data: Dict) -> int:
+    """
+    Hash the request fields other than the messages, which must match exactly.
+    
+    Parameters added by an alias count too, as in the exact-match cache key.
+    
+    Args:
+        request_data: Upstream request body
+    
+    Returns:
+        int: Non-negative 60-bit bucket ID
+    """
+    fields = {field: value for field, value in request_data.items() if field != "messages"}
+    return int(cache_key(fields)[:15], 16)
+
+
+class VectorIndex:
+    """
+    Fixed-capacity nearest-neighbour index over unit vectors.
+    
+    Vectors live in one preallocated matrix and are searched by a single
+    matrix-vector product restricted to the query's bucket. When full,
+    expired slots are reused first, then the least recently used one.
+    """
+    
+    def __init__(self, capacity: int, dim: int):
+        """
+        Initialize an empty index.
+        
+        Args:
+            capacity: Maximum number of vectors
+            dim: Vector dimension
+        """
+        self.capacity = max(1, capacity)
+        self.dim = dim
+        self._vectors = np.zeros((self.capacity, dim), dtype=np.float32)
+        self._buckets = np.full(self.capacity, -1, dtype=np.int64)
+        self._expires = np.zeros(self.capacity, dtype=np.float64)
+        self._last_used = np.zeros(self.capacity, dtype=np.float64)
+        self._entries: List[Optional[Dict]] = [None] * self.capacity
+        self._size = 0
+    
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._buckets >= 0))
+    
+    def search(self, vector, bucket: int, now: float) -> Optional[Tuple[int, float]]:
+        """
+        Find the most similar live vector in a bucket.
+        
+        Args:
+            vector: Unit query vector
+            bucket: Bucket ID
+            now: Current time, for expiry
+        
+        Returns:
+            Optional[Tuple[int, float]]: Slot and cosine similarity, or None
+            if the bucket has no live vectors
+        """
+        live = (self._buckets[:self._size] == bucket) & (self._expires[:self._size] > now)
+        if not live.any():
+            return None
+        
+        similarities = self._vectors[:self._size] @ vector
+        similarities[~live] = -2.0
+        slot = int(similarities.argmax())
+        return slot, float(similarities[slot])
+    
+    def entry(self, slot: int, now: float) -> Dict:
+        """
+        Get the entry in a slot and mark it as used.
+        
+        Args:
+            slot: Slot returned by search()
+            now: Current time
+        
+        Returns:
+            Dict: The stored entry
+        """
+        self._last_used[slot] = now
+        return self._entries[slot]
+    
+    def add(self, vector, bucket: int, entry: Dict, expires_at: float, now: float, slot: Optional[int] = None) -> None:
+        """
+        Store a vector, evicting an old one if the index is full.
+        
+        Args:
+            vector: Unit vector
+            bucket: Bucket ID
+            entry: Value returned on hits
+            expires_at: Expiry time
+            now: Current time
+            slot: Slot to overwrite, e.g. a near-identical entry
+        """
+        if slot is None:
+            if self._size < self.capacity:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(self._expires.argmin())
+                if self._expires[slot] > now:
+                    slot = int(self._last_used.argmin())
+                    CACHE_EVICTIONS.labels(reason="semantic_lru").inc()
+                else:
+                    CACHE_EVICTIONS.labels(reason="semantic_ttl").inc()
+        
+        self._vectors[slot] = vector
+        self._buckets[slot] = bucket
+        self._expires[slot] = expires_at
+        self._last_used[slot] = now
+        self._entries[slot] = entry
+
+
+class SemanticCache:
+    """
+    Near-duplicate response cache in front of the upstream.
+    
+    Only requests whose non-message fields (model, temperature, top_p,
+    max_tokens, stop) match exactly are compared, and a hit needs a cosine
+    similarity of at least the target model's threshold. Entries have the
+    same shape as in ResponseCache.
+    """
+    
+    def __init__(
+        self,
+        ttl: float,
+        max_entries: int,
+        dim: int,
+        threshold: Callable[[str], float],
+    ):
+        """
+        Initialize the cache.
+        
+        Args:
+            ttl: Seconds an entry stays valid
+            max_entries: Maximum number of entries
+            dim: Embedding dimension
+            threshold: Returns the minimum similarity for a target model
+        """
+        self.ttl = ttl
+        self.dim = dim
+        self.threshold = threshold
+        self._index = VectorIndex(max_entries, dim)
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._index)
+    
+    def lookup(self, request_data: Dict) -> Tuple[Optional[Dict], Optional[float]]:
+        """
+        Find the nearest cached completion of a request.
+        
+        Args:
+            request_data: Upstream request body
+        
+        Returns:
+            Tuple[Optional[Dict], Optional[float]]: The entry if it passes the
+            model's threshold, and the best similarity found
+        """
+        vector = embed(normalize_messages(request_data.get("messages") or []), self.dim)
+        bucket = bucket_id(request_data)
+        now = time.time()
+        with self._lock:
+            found = self._index.search(vector, bucket, now)
+            if found is None:
+                return None, None
+            slot, similarity = found
+            if similarity < self.threshold(request_data.get("model", "")):
+                return None, similarity
+            return self._index.entry(slot, now), similarity
+    
+    def store(self, request_data: Dict, entry: Dict) -> None:
+        """
+        Add a completion, replacing a near-identical entry if there is one.
+        
+        Args:
+            request_data: Upstream request body
+            entry: Completion text, token counts and finish reason
+        """
+        vector = embed(normalize_messages(request_data.get("messages") or []), self.dim)
+        bucket = bucket_id(request_data)
+        now = time.time()
+        with self._lock:
+            found = self._index.search(vector, bucket, now)
+            slot = found[0] if found is not None and found[1] >= _DUPLICATE_SIMILARITY else None
+            self._index.add(vector, bucket, entry, now + self.ttl, now, slot)
+    
+    async def get(self, request_data: Dict) -> Optional[Dict]:
+        """
+        Look up a near-duplicate completion off the event loop.
+        
+        Args:
+            request_data: Upstream request body
+        
+        Returns:
+            Optional[Dict]: The cached entry, or None on a miss
+        """
+        model = request_data.get("model", "")
+        if self.threshold(model) > 1.0:
+            return None
+        
+        entry, similarity = await asyncio.to_thread(self.lookup, request_data)
+        if similarity is not None:
+            SEMANTIC_CACHE_SIMILARITY.labels(model=model).observe(similarity)
+        if entry is not None:
+            CACHE_HITS.labels(tier="semantic").inc()
+        return entry
+    
+    async def put(self, request_data: Dict, entry: Dict) -> None:
+        """
+        Store a completion off the event loop.
+        
+        Args:
+            request_data: Upstream request body
+            entry: Completion text, token counts and finish reason
+        """
+        if self.threshold(request_data.get("model", "")) > 1.0:
+            return
+        await asyncio.to_thread(self.store, request_data, entry)
@@ -0,0 +1,115 @@
+"""
+Server-sent events decoding for Orcestator.
+Splits upstream SSE bodies into frames straight from the byte stream and
+decodes their JSON with orjson when it is installed.
+"""
+
+import json
+from typing import AsyncIterator, List, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+DONE = b"[DONE]"
+
+
+def loads(data: Union[bytes, str]):
+    """
+    Decode a JSON document, using orjson when available.
+    
+    Both json and orjson raise a ValueError subclass on invalid input.
+    
+    Args:
+        data: JSON text
+    
+    Returns:
+        The decoded value
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    # The stdlib decoder is faster on str than on bytes.
+    return json.loads(data.decode() if isinstance(data, bytes) else data)
+
+
+def _frame_data(frame: bytes) -> bytes:
+    """
+    Get the payload of a multi-line SSE frame.
+    
+    Args:
+        frame: Frame without its terminating blank line
+    
+    Returns:
+        bytes: Joined `data:` values, empty for comment-only frames
+    """
+    values = []
+    for line in frame.split(b"\n"):
+        if line.startswith(b"data:"):
+            value = line[5:]
+            values.append(value[1:] if value.startswith(b" ") else value)
+    return b"\n".join(values)
+
+
+def split_frames(buffer: bytearray) -> List[bytes]:
+    """
+    Remove and return the complete frames at the start of a buffer.
+    
+    Args:
+        buffer: Received bytes; the incomplete tail is left in place
+    
+    Returns:
+        List[bytes]: Payloads of the complete frames, keep-alive and
+        other comment-only frames skipped
+    """
+    end = buffer.rfind(b"\n\n")
+    if end < 0:
+        return []
+    
+    frames = bytes(buffer[:end]).split(b"\n\n")
+    del buffer[:end + 2]
+    
+    payloads = []
+    for frame in frames:
+        # Comment frames (": OPENROUTER PROCESSING") are keep-alives.
+        if not frame or frame[:1] == b":":
+            continue
+        if frame.startswith(b"data: ") and b"\n" not in frame:
+            payloads.append(frame[6:])
+        else:
+            data = _frame_data(frame)
+            if data:
+                payloads.append(data)
+    return payloads
+
+
+async def iter_sse_data(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Iterate over the data payloads of an SSE byte stream until `[DONE]`.
+    
+    Frames are cut on blank lines in a single reused buffer, without
+    decoding the stream into text lines first.
+    
+    Args:
+        chunks: Raw body chunks, e.g. `response.aiter_bytes()`
+    
+    Yields:
+        bytes: The payload of each data frame
+    """
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer += chunk
+        if b"\r" in buffer:
+            # Rare CRLF framing; normalised on the buffer so a pair split
+            # across chunks is caught too.
+            buffer[:] = buffer.replace(b"\r\n", b"\n")
+        for data in split_frames(buffer):
+            if data == DONE:
+                return
+            yield data
+    
+    buffer += b"\n\n"
+    for data in split_frames(buffer):
+        if data == DONE:
+            return
+        yield data
@@ -0,0 +1,43 @@
+"""
+Streaming responses for Orcestator that stop when the client disconnects.
+Starlette stops sending a streaming body when its client goes away but
+leaves the body generator suspended until it is garbage collected, and
+skips the response's background task if the disconnect surfaces as an
+error. Closing the generator right away closes the upstream stream behind
+it, so the worker's concurrency slot and the upstream tokens are not spent
+on output nobody reads.
+"""
+
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that closes its body generator when the stream ends.
+    
+    Whether the body ran to completion, the client disconnected or the
+    send failed, the generator is closed (raising GeneratorExit at the
+    `yield` it is suspended at) and then the background task runs, so
+    cleanup such as releasing a worker semaphore always happens, and
+    happens after the upstream call has been closed.
+    """
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        Send the response, then close the body and run the background task.
+        
+        Args:
+            scope: ASGI connection scope
+            receive: ASGI receive channel
+            send: ASGI send channel
+        """
+        background, self.background = self.background, None
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            aclose = getattr(self.body_iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            if background is not None:
+                await background()
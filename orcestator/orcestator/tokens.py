@@ -0,0 +1,390 @@
+"""
+Token estimation and context trimming for Orcestator.
+Counts prompt and completion tokens locally when the upstream sends no
+usage, with the target model's tokenizer if one can be loaded and a fast
+character-class heuristic otherwise, and trims oversized message
+histories to a prompt token budget before they are sent upstream.
+"""
+
+import json
+import logging
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple
+
+from orcestator.config import Config
+
+logger = logging.getLogger("orcestator")
+
+HEURISTIC = "heuristic"
+
+# Tokens the chat format adds per message and to prime the reply.
+MESSAGE_OVERHEAD = 3
+REPLY_OVERHEAD = 3
+# Flat charge for an image part, as for a low-detail image.
+IMAGE_TOKENS = 85
+
+# Texts shorter than this are counted directly instead of being cached.
+_CACHE_MIN_CHARS = 256
+
+# Letter runs of up to six characters, digit groups of up to three and
+# single symbols or non-ASCII characters each come out close to one token
+# in the common BPE vocabularies.
+_PIECE = re.compile(r"[A-Za-z]{1,6}|\d{1,3}|[^\sA-Za-z\d]")
+
+_OMITTED = "\n[... {count} tokens omitted ...]\n"
+
+
+def heuristic_tokens(text: str) -> int:
+    """
+    Estimate the token count of text without a tokenizer.
+    
+    Args:
+        text: Text to count
+    
+    Returns:
+        int: Approximate number of tokens
+    """
+    return len(_PIECE.findall(text))
+
+
+def default_encoding(model: str) -> str:
+    """
+    Pick the tokenizer for a target model when none is configured.
+    
+    Args:
+        model: Upstream model name, with or without a vendor prefix
+    
+    Returns:
+        str: tiktoken encoding name, or HEURISTIC for non-OpenAI models
+    """
+    name = model.rsplit("/", 1)[-1]
+    if name.startswith(("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4", "chatgpt-4o")):
+        return "o200k_base"
+    if name.startswith(("gpt-4", "gpt-3.5")):
+        return "cl100k_base"
+    return HEURISTIC
+
+
+def _content_text(message: Dict) -> Tuple[str, int]:
+    """
+    Collect the text content of a message.
+    
+    Args:
+        message: Chat message
+    
+    Returns:
+        Tuple[str, int]: Text of the content and the number of image parts
+    """
+    content = message.get("content") or ""
+    images = 0
+    if isinstance(content, list):
+        texts = []
+        for part in content:
+            if not isinstance(part, dict):
+                continue
+            if part.get("type") == "image_url":
+                images += 1
+            else:
+                texts.append(part.get("text") or "")
+        content = "\n".join(texts)
+    return str(content), images
+
+
+def _message_text(message: Dict) -> Tuple[str, int]:
+    """
+    Collect the countable text of a message.
+    
+    Args:
+        message: Chat message
+    
+    Returns:
+        Tuple[str, int]: Text of content, name and tool calls, and the
+        number of image parts
+    """
+    text, images = _content_text(message)
+    if message.get("name"):
+        text += "\n" + message["name"]
+    if message.get("tool_calls"):
+        text += "\n" + json.dumps(message["tool_calls"], ensure_ascii=False)
+    return text, images
+
+
+def _with_content(message: Dict, text: str) -> Dict:
+    """
+    Copy a message with its text replaced.
+    
+    Args:
+        message: Chat message
+        text: New text content
+    
+    Returns:
+        Dict: The copy; list contents keep their non-text parts
+    """
+    content = message.get("content")
+    if not isinstance(content, list):
+        return dict(message, content=text)
+    
+    parts = [part for part in content if isinstance(part, dict) and part.get("type") == "image_url"]
+    return dict(message, content=[{"type": "text", "text": text}] + parts)
+
+
+class TokenEstimator:
+    """
+    Token counter with one tokenizer per target model.
+    
+    Tokenizers are loaded on first use and kept for the life of the
+    process. A configured name may be a tiktoken encoding, a path to a
+    Hugging Face `tokenizer.json` or "heuristic"; any tokenizer that
+    cannot be loaded (for example tiktoken without network access to
+    fetch its vocabulary) falls back to the heuristic. Counts of long
+    texts are cached, since the same system prompt and attached files
+    are resent on every turn of a conversation.
+    """
+    
+    def __init__(self, cache_size: int = 4096):
+        """
+        Initialize the estimator.
+        
+        Args:
+            cache_size: Maximum number of cached text counts
+        """
+        self.cache_size = cache_size
+        self._encoders: Dict[str, Tuple[str, Callable[[str], int]]] = {}
+        self._loaded: Dict[str, Callable[[str], int]] = {HEURISTIC: heuristic_tokens}
+        self._counts: "OrderedDict[Tuple[str, int, int], int]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _load(self, name: str) -> Callable[[str], int]:
+        """
+        Load a tokenizer by name, falling back to the heuristic.
+        
+        The optional tokenizer libraries are imported here rather than at
+        module load, so processes that never count tokens do not pay for them.
+        
+        Args:
+            name: tiktoken encoding, tokenizer.json path or HEURISTIC
+        
+        Returns:
+            Callable[[str], int]: Token counting function
+        """
+        try:
+            if name.endswith(".json"):
+                from tokenizers import Tokenizer
+                
+                tokenizer = Tokenizer.from_file(name)
+                return lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids)
+            
+            import tiktoken
+            
+            encoding = tiktoken.get_encoding(name)
+            return lambda text: len(encoding.encode_ordinary(text))
+        except Exception as e:
+            logger.warning(f"Tokenizer {name} unavailable, estimating tokens heuristically: {e}")
+            return heuristic_tokens
+    
+    def encoder(self, model: str) -> Tuple[str, Callable[[str], int]]:
+        """
+        Get the tokenizer of a target model, loading it on first use.
+        
+        May block while a vocabulary is read or downloaded, so call it
+        off the event loop.
+        
+        Args:
+            model: Upstream model name
+        
+        Returns:
+            Tuple[str, Callable[[str], int]]: Tokenizer name and counting function
+        """
+        found = self._encoders.get(model)
+        if found is not None:
+            return found
+        
+        name = Config.tokenizer_encoding(model) or default_encoding(model)
+        with self._lock:
+            count = self._loaded.get(name)
+        if count is None:
+            count = self._load(name)
+            with self._lock:
+                count = self._loaded.setdefault(name, count)
+        if count is heuristic_tokens:
+            name = HEURISTIC
+        
+        self._encoders[model] = (name, count)
+        return name, count
+    
+    def count_text(self, model: str, text: str) -> int:
+        """
+        Count the tokens of text for a target model.
+        
+        Args:
+            model: Upstream model name
+            text: Text to count
+        
+        Returns:
+            int: Number of tokens
+        """
+        name, count = self.encoder(model)
+        if len(text) < _CACHE_MIN_CHARS:
+            return count(text)
+        
+        key = (name, len(text), zlib.crc32(text.encode("utf-8", "surrogatepass")))
+        with self._lock:
+            cached = self._counts.get(key)
+            if cached is not None:
+                self._counts.move_to_end(key)
+                return cached
+        
+        tokens = count(text)
+        with self._lock:
+            self._counts[key] = tokens
+            while len(self._counts) > self.cache_size:
+                self._counts.popitem(last=False)
+        return tokens
+    
+    def count_message(self, model: str, message: Dict) -> int:
+        """
+        Count the tokens of one chat message including format overhead.
+        
+        Args:
+            model: Upstream model name
+            message: Chat message
+        
+        Returns:
+            int: Number of tokens
+        """
+        text, images = _message_text(message)
+        return MESSAGE_OVERHEAD + self.count_text(model, text) + images * IMAGE_TOKENS
+    
+    def count_messages(self, model: str, messages: List[Dict]) -> int:
+        """
+        Count the prompt tokens of a message list.
+        
+        Args:
+            model: Upstream model name
+            messages: Chat messages
+        
+        Returns:
+            int: Number of prompt tokens
+        """
+        return REPLY_OVERHEAD + sum(self.count_message(model, message) for message in messages)
+    
+    def _truncate(self, model: str, message: Dict, tokens: int, target: int) -> Dict:
+        """
+        Cut the middle out of a message's content so that it has about `target` tokens.
+        
+        Only the text content is shortened; the name and tool calls of
+        the message are kept as they are.
+        
+        Args:
+            model: Upstream model name
+            message: Chat message
+            tokens: Current token count of the message
+            target: Token count to aim for
+        
+        Returns:
+            Dict: The shortened copy, or the message itself if it has no text content
+        """
+        text, _ = _content_text(message)
+        if not text:
+            return message
+        content_tokens = max(1, self.count_text(model, text))
+        keep = max(0, content_tokens - (tokens - target) - 12)
+        # Aim slightly low, since the character ratio varies along the text.
+        keep_chars = int(len(text) * keep / content_tokens * 0.95)
+        head = keep_chars // 2
+        tail = keep_chars - head
+        marker = _OMITTED.format(count=max(0, content_tokens - keep))
+        return _with_content(message, text[:head] + marker + (text[-tail:] if tail else ""))
+    
+    def fit(self, model: str, messages: List[Dict], budget: int) -> Tuple[List[Dict], int, int]:
+        """
+        Trim a message list to a prompt token budget.
+        
+        System messages and the final message are kept; when the final
+        message is a tool result, so are the assistant message that called
+        the tool and its other results. The oldest other messages are
+        dropped first, together with the tool results that answer a dropped
+        assistant message. If that is not enough, the middle of the longest
+        remaining contents is cut out and replaced by a marker, keeping
+        their beginning and end.
+        
+        Args:
+            model: Upstream model name
+            messages: Chat messages
+            budget: Maximum prompt tokens
+        
+        Returns:
+            Tuple[List[Dict], int, int]: The messages to send, their token
+            count and the number of tokens removed
+        """
+        counts = [self.count_message(model, message) for message in messages]
+        original = total = REPLY_OVERHEAD + sum(counts)
+        if total <= budget or not messages:
+            return messages, total, 0
+        
+        # Messages from `kept` on answer the request and are never dropped.
+        kept = len(messages) - 1
+        while kept > 0 and messages[kept].get("role") == "tool":
+            kept -= 1
+        if messages[kept].get("role") == "tool" or not messages[kept].get("tool_calls"):
+            kept = len(messages) - 1
+        
+        dropped = set()
+        for index in range(kept):
+            if total <= budget:
+                break
+            if index in dropped or messages[index].get("role") in ("system", "developer"):
+                continue
+            group = [index]
+            if messages[index].get("role") == "assistant" and messages[index].get("tool_calls"):
+                following = index + 1
+                while following < kept and messages[following].get("role") == "tool":
+                    group.append(following)
+                    following += 1
+            for position in group:
+                dropped.add(position)
+                total -= counts[position]
+        
+        result: List[Dict] = []
+        result_counts: List[int] = []
+        for index, message in enumerate(messages):
+            if index in dropped:
+                continue
+            # A tool result is only valid after the assistant message that called it.
+            orphan = (
+                message.get("role") == "tool"
+                and index < kept
+                and (not result or result[-1].get("role") not in ("assistant", "tool"))
+            )
+            if orphan:
+                total -= counts[index]
+                continue
+            result.append(message)
+            result_counts.append(counts[index])
+        
+        # Messages whose content cannot be shortened any further.
+        settled = set()
+        for _ in range(3):
+            if total <= budget:
+                break
+            candidates = [index for index in range(len(result)) if index not in settled]
+            if not candidates:
+                break
+            largest = max(candidates, key=result_counts.__getitem__)
+            excess = total - budget
+            target = max(MESSAGE_OVERHEAD + 16, result_counts[largest] - excess)
+            if target >= result_counts[largest]:
+                break
+            shortened = self._truncate(model, result[largest], result_counts[largest], target)
+            new_count = self.count_message(model, shortened)
+            if new_count >= result_counts[largest]:
+                settled.add(largest)
+                continue
+            result[largest] = shortened
+            total += new_count - result_counts[largest]
+            result_counts[largest] = new_count
+        
+        return result, total, original - total
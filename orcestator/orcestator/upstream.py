@@ -0,0 +1,212 @@
+"""
+Upstream HTTP client for Orcestator.
+Builds the shared, tuned httpx connection pool used to reach OpenRouter.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from orcestator.config import Config
+from orcestator.logger import UPSTREAM_CONNECTIONS_IN_USE, UPSTREAM_CONNECTIONS_OPEN, UPSTREAM_POOL_WAIT, track_gauge
+
+logger = logging.getLogger("orcestator")
+
+_clients: List[httpx.AsyncClient] = []
+_transports: List[httpx.AsyncHTTPTransport] = []
+_gauges_tracked = False
+
+
+def http2_available() -> bool:
+    """
+    Check whether HTTP/2 is enabled and the h2 package is installed.
+    
+    Returns:
+        bool: True if HTTP/2 can be used
+    """
+    if not Config.UPSTREAM_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("OR_UPSTREAM_HTTP2 is set but h2 is not installed, falling back to HTTP/1.1")
+        return False
+    return True
+
+
+def build_timeout() -> httpx.Timeout:
+    """
+    Build split connect/read/write/pool timeouts from Config.
+    
+    The read timeout applies between chunks, so long SSE streams are not
+    cut off as long as tokens keep arriving.
+    
+    Returns:
+        httpx.Timeout: Timeout configuration
+    """
+    return httpx.Timeout(
+        connect=Config.UPSTREAM_CONNECT_TIMEOUT,
+        read=Config.UPSTREAM_READ_TIMEOUT,
+        write=Config.UPSTREAM_WRITE_TIMEOUT,
+        pool=Config.UPSTREAM_POOL_TIMEOUT,
+    )
+
+
+def build_limits() -> httpx.Limits:
+    """
+    Build connection pool limits from Config.
+    
+    Returns:
+        httpx.Limits: Pool limits
+    """
+    return httpx.Limits(
+        max_connections=Config.UPSTREAM_MAX_CONNECTIONS,
+        max_keepalive_connections=Config.UPSTREAM_MAX_KEEPALIVE,
+        keepalive_expiry=Config.UPSTREAM_KEEPALIVE_EXPIRY,
+    )
+
+
+def create_upstream_client(
+    base_url: str,
+    api_key: str,
+    headers: Optional[Dict[str, str]] = None,
+) -> httpx.AsyncClient:
+    """
+    Create an upstream client on a tuned connection pool.
+    
+    Args:
+        base_url: Base URL of the OpenAI-compatible upstream
+        api_key: Bearer token for the upstream
+        headers: Extra headers sent with every request
+        
+    Returns:
+        httpx.AsyncClient: Client registered for pool metrics
+    """
+    global _gauges_tracked
+    transport = httpx.AsyncHTTPTransport(
+        http2=http2_available(),
+        limits=build_limits(),
+    )
+    client = httpx.AsyncClient(
+        base_url=base_url,
+        timeout=build_timeout(),
+        transport=transport,
+        headers={
+            "Authorization": f"Bearer {api_key}",
+            "HTTP-Referer": "https://github.com/OleynikAleksandr/orchestrator_proxy_agent",
+            "X-Title": "Orcestator Proxy",
+            **(headers or {}),
+        },
+    )
+    
+    _clients.append(client)
+    _transports.append(transport)
+    if not _gauges_tracked:
+        _gauges_tracked = True
+        track_gauge(UPSTREAM_CONNECTIONS_IN_USE, lambda: _count_connections(busy_only=True))
+        track_gauge(UPSTREAM_CONNECTIONS_OPEN, lambda: _count_connections(busy_only=False))
+    
+    return client
+
+
+def _count_connections(busy_only: bool) -> int:
+    """
+    Count pooled connections across all upstream clients.
+    
+    Args:
+        busy_only: Count only connections that are not idle
+        
+    Returns:
+        int: Number of connections
+    """
+    count = 0
+    for transport in _transports:
+        pool = getattr(transport, "_pool", None)
+        if pool is None:
+            continue
+        for connection in pool.connections:
+            if not busy_only or not connection.is_idle():
+                count += 1
+    return count
+
+
+class UpstreamTrace:
+    """
+    httpcore trace hook that times one upstream request: how long it
+    waited for a pooled connection, how long a new connection took to set
+    up (zero when a pooled one was reused) and the time to the response
+    headers.
+    
+    Pass a fresh instance per request as `extensions={"trace": ...}`.
+    """
+    
+    def __init__(self):
+        """Start timing the request."""
+        self.start_time = time.perf_counter()
+        self.pool_wait: Optional[float] = None
+        self.connect = 0.0
+        self.ttfb: Optional[float] = None
+        self._connect_start: Optional[float] = None
+    
+    async def __call__(self, event_name: str, info: Dict) -> None:
+        """
+        Record the phase boundaries as httpcore reports them.
+        
+        Args:
+            event_name: httpcore trace event name
+            info: Event details (unused)
+        """
+        now = time.perf_counter()
+        if self.pool_wait is None and event_name.endswith(".started") and (
+            "connect_tcp" in event_name or "send_request_headers" in event_name
+        ):
+            self.pool_wait = now - self.start_time
+            UPSTREAM_POOL_WAIT.observe(self.pool_wait)
+        
+        if event_name == "connection.connect_tcp.started":
+            self._connect_start = now
+        elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+            if self._connect_start is not None:
+                self.connect = now - self._connect_start
+        elif event_name.endswith("receive_response_headers.complete") and self.ttfb is None:
+            self.ttfb = now - self.start_time
+
+
+async def warm_up(client: httpx.AsyncClient, connections: int) -> None:
+    """
+    Open pooled connections ahead of the first request.
+    
+    Issues concurrent lightweight GET /models requests so TCP and TLS
+    setup happen at startup instead of on a user's first completion.
+    
+    Args:
+        client: Upstream client to warm
+        connections: Number of concurrent warm-up requests
+    """
+    if connections <= 0:
+        return
+    
+    async def _ping() -> None:
+        try:
+            response = await client.get("/models")
+            await response.aclose()
+        except httpx.HTTPError as e:
+            logger.warning(f"Upstream warm-up request failed: {str(e)}")
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(_ping() for _ in range(connections)))
+    logger.info(
+        f"Warmed {connections} upstream connection(s) to {client.base_url} "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+
+
+async def close_upstream_clients() -> None:
+    """Close all upstream clients and their pools."""
+    while _clients:
+        client = _clients.pop()
+        await client.aclose()
+    _transports.clear()
@@ -0,0 +1,160 @@
+"""
+Multi-process mode for the proxy worker.
+Runs several ProxyWorker processes on consecutive ports, each registered
+with the controller as a worker of its own. Metrics are shared through
+Prometheus multiprocess files and the traffic log is written by this
+supervising process only.
+
+Usage:
+    python -m orcestator.worker_pool --num-workers 4 --port 8002
+"""
+
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from orcestator.config import Config
+
+# Nothing here may import prometheus_client (through orcestator.logger)
+# before PROMETHEUS_MULTIPROC_DIR is set, so those imports are deferred.
+
+logger = logging.getLogger("orcestator")
+
+RESTART_DELAY = 1.0
+
+
+def _prepare_metrics_dir() -> str:
+    """
+    Point prometheus_client at a multiprocess directory with no stale files.
+    
+    Returns:
+        str: The directory shared by the supervisor and its workers
+    """
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not directory:
+        directory = tempfile.mkdtemp(prefix="orcestator-metrics-")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = directory
+    
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith(".db"):
+            os.remove(os.path.join(directory, name))
+    return directory
+
+
+def _run_worker(args, log_queue) -> None:
+    """
+    Entry point of one worker process.
+    
+    Args:
+        args: Worker command line arguments with its own port and ID
+        log_queue: Queue drained by the supervisor's traffic log writer
+    """
+    from orcestator.logger import forward_logs
+    from orcestator.proxy_worker import serve
+    
+    forward_logs(log_queue)
+    serve(args)
+
+
+def run_worker_pool() -> None:
+    """
+    Start the worker processes and supervise them until interrupted.
+    
+    A worker that exits unexpectedly is restarted on the same port.
+    """
+    if not Config.validate():
+        sys.exit(1)
+    
+    _prepare_metrics_dir()
+    
+    from prometheus_client import multiprocess
+    
+    from orcestator.logger import drain_forwarded_logs, shutdown_logging, start_metrics_server
+    from orcestator.proxy_worker import build_parser
+    
+    parser = build_parser()
+    parser.add_argument("--num-workers", type=int, default=max(1, os.cpu_count() or 1))
+    parser.add_argument("--metrics-port", type=int, default=8001)
+    args = parser.parse_args()
+    
+    context = multiprocessing.get_context("spawn")
+    log_queue = context.Queue(maxsize=Config.LOG_QUEUE_SIZE)
+    drain_thread = drain_forwarded_logs(log_queue)
+    
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+    
+    def _start(index: int) -> multiprocessing.Process:
+        worker_args = type(args)(**vars(args))
+        worker_args.port = args.port + index
+        worker_args.worker_id = f"{args.worker_id}-{index}"
+        process = context.Process(
+            target=_run_worker,
+            args=(worker_args, log_queue),
+            name=f"orcestator-worker-{index}",
+        )
+        process.start()
+        logger.info(f"Started worker {worker_args.worker_id} (pid {process.pid}) on port {worker_args.port}")
+        return process
+    
+    processes: Dict[int, multiprocessing.Process] = {
+        index: _start(index) for index in range(args.num_workers)
+    }
+    
+    stopping = False
+    
+    def _stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+    
+    signal.signal(signal.SIGTERM, _stop)
+    
+    try:
+        while not stopping:
+            for index, process in list(processes.items()):
+                if process.is_alive():
+                    continue
+                multiprocess.mark_process_dead(process.pid)
+                logger.warning(f"Worker {index} (pid {process.pid}) exited with code {process.exitcode}, restarting")
+                time.sleep(RESTART_DELAY)
+                processes[index] = _start(index)
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        _shutdown(list(processes.values()), multiprocess)
+        log_queue.put(None)
+        drain_thread.join(timeout=10.0)
+        shutdown_logging()
+
+
+def _shutdown(processes: List[multiprocessing.Process], multiprocess, timeout: float = 10.0) -> None:
+    """
+    Stop the worker processes, forcefully if they do not exit in time.
+    
+    Args:
+        processes: Worker processes
+        multiprocess: prometheus_client.multiprocess, to drop their live gauges
+        timeout: Seconds to wait for a graceful exit
+    """
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    
+    deadline = time.monotonic() + timeout
+    for process in processes:
+        process.join(max(0.0, deadline - time.monotonic()))
+        if process.is_alive():
+            process.kill()
+            process.join()
+        multiprocess.mark_process_dead(process.pid)
+
+
+if __name__ == "__main__":
+    run_worker_pool()
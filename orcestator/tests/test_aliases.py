@@ -0,0 +1,33 @@
+"""
+Tests for loading the alias file.
+"""
+
+import json
+
+import pytest
+
+from orcestator.aliases import AliasRegistry, AliasTable
+
+
+@pytest.mark.parametrize("entry", [
+    [["openai/gpt-4o"]],
+    {"targets": [{"model": "openai/gpt-4o"}]},
+    {"targets": {"openai/gpt-4o": [1]}},
+    {"targets": {"openai/gpt-4o": True}},
+    {"targets": {"": 1}},
+    42,
+])
+def test_malformed_targets_raise_value_error(entry):
+    with pytest.raises(ValueError):
+        AliasTable.from_dict({"aliases": {"coder": entry}})
+
+
+def test_reload_keeps_current_table_on_malformed_file(tmp_path):
+    path = tmp_path / "aliases.json"
+    path.write_text(json.dumps({"aliases": {"coder": "openai/gpt-4o"}}))
+    registry = AliasRegistry(str(path), interval=60.0)
+    assert registry.resolve("coder")[0] == "openai/gpt-4o"
+    
+    path.write_text(json.dumps({"aliases": {"coder": [["anthropic/claude-3.5-sonnet"]]}}))
+    assert not registry.reload()
+    assert registry.resolve("coder")[0] == "openai/gpt-4o"
@@ -0,0 +1,43 @@
+"""
+Tests for upgrading request log databases created by earlier releases.
+"""
+
+import sqlite3
+
+from orcestator import db
+from orcestator.config import Config
+
+# Request log layout of the first release.
+BASELINE_SCHEMA = [
+    "CREATE TABLE requestlog ("
+    "id INTEGER NOT NULL, timestamp DATETIME NOT NULL, "
+    "user_message VARCHAR NOT NULL, assistant_message VARCHAR NOT NULL, "
+    "prompt_tokens INTEGER NOT NULL, completion_tokens INTEGER NOT NULL, latency_ms INTEGER NOT NULL, "
+    "model VARCHAR NOT NULL, original_model VARCHAR NOT NULL, PRIMARY KEY (id))",
+    "CREATE INDEX ix_requestlog_user_message ON requestlog (user_message)",
+    "CREATE INDEX ix_requestlog_model ON requestlog (model)",
+]
+
+
+def test_baseline_database_is_migrated_to_blob_table(tmp_path, monkeypatch):
+    path = str(tmp_path / "requests.db")
+    with sqlite3.connect(path) as connection:
+        for statement in BASELINE_SCHEMA:
+            connection.execute(statement)
+        connection.execute(
+            "INSERT INTO requestlog VALUES (1, '2024-01-01 00:00:00', 'hi', 'hello', 3, 5, 120, 'orcestator', 'openai/gpt-4o')"
+        )
+    monkeypatch.setattr(Config, "DB_PATH", path)
+    monkeypatch.setattr(db, "_engine", None)
+    
+    db.get_engine().dispose()
+    
+    with sqlite3.connect(path) as connection:
+        connection.row_factory = sqlite3.Row
+        row = dict(connection.execute("SELECT * FROM requestlog").fetchone())
+        blob_count = connection.execute("SELECT COUNT(*) FROM messageblob").fetchone()[0]
+    assert row["status"] == "ok"
+    assert row["ttft_ms"] is None
+    assert (row["prompt_tokens"], row["model"], row["original_model"]) == (3, "orcestator", "openai/gpt-4o")
+    assert "user_message" not in row
+    assert blob_count == 3
@@ -0,0 +1,32 @@
+"""
+Tests for the `orcestator serve` supervisor's readiness probe and restart backoff.
+"""
+
+import pytest
+
+from orcestator.launcher import RESTART_MAX_DELAY, STABLE_UPTIME, Component, probe_url
+
+
+@pytest.mark.parametrize("host, url", [
+    ("0.0.0.0", "http://127.0.0.1:8000/health"),
+    ("::", "http://[::1]:8000/health"),
+    ("127.0.0.2", "http://127.0.0.2:8000/health"),
+    ("10.0.0.5", "http://10.0.0.5:8000/health"),
+    ("fd00::5", "http://[fd00::5]:8000/health"),
+    ("api.internal", "http://api.internal:8000/health"),
+])
+def test_probe_url_uses_bind_address(host, url):
+    assert probe_url(host, 8000) == url
+
+
+def test_restart_delay_backs_off_and_resets_after_stable_run():
+    component = Component("worker", ["true"])
+    component.started_at = 1000.0
+    
+    delays = [component.schedule_restart(1001.0) for _ in range(8)]
+    assert delays[:4] == [1.0, 2.0, 4.0, 8.0]
+    assert max(delays) == RESTART_MAX_DELAY
+    assert component.restarts == 8
+    
+    assert component.schedule_restart(1000.0 + STABLE_UPTIME) == 1.0
+    assert component.restarts == 1
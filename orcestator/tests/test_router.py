@@ -0,0 +1,219 @@
+"""
+Tests for upstream routing: failover before the first byte and circuit breakers.
+Upstreams are httpx clients over stub transports, so no network is used.
+"""
+
+import asyncio
+from typing import Callable, List
+
+import httpx
+import pytest
+from prometheus_client import REGISTRY
+
+from orcestator import router as router_module
+from orcestator.config import Config
+from orcestator.router import CircuitBreaker, Upstream, UpstreamRouter
+
+
+class FailingStream(httpx.AsyncByteStream):
+    """Response body that sends one chunk and then loses the connection."""
+    
+    async def __aiter__(self):
+        yield b"data: first\n\n"
+        raise httpx.ReadError("connection lost")
+
+
+def make_upstream(name: str, handler: Callable[[httpx.Request], httpx.Response], calls: List[str]) -> Upstream:
+    """
+    Create an upstream served by a stub transport.
+    
+    Args:
+        name: Upstream name
+        handler: Builds the response for each request
+        calls: Receives the upstream's name on every request
+    
+    Returns:
+        Upstream: Endpoint whose client never touches the network
+    """
+    def record(request: httpx.Request) -> httpx.Response:
+        calls.append(name)
+        return handler(request)
+    
+    client = httpx.AsyncClient(base_url=f"http://{name}.test/api/v1", transport=httpx.MockTransport(record))
+    return Upstream(name, client)
+
+
+def ok(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, content=b"data: hello\n\ndata: [DONE]\n\n")
+
+
+def status(code: int) -> Callable[[httpx.Request], httpx.Response]:
+    return lambda request: httpx.Response(code, json={"error": {"code": code}})
+
+
+def outcome_count(upstream: str, outcome: str) -> float:
+    """Get the number of attempts recorded for an upstream and outcome."""
+    return REGISTRY.get_sample_value(
+        "orcestator_upstream_requests_total", {"upstream": upstream, "outcome": outcome}
+    ) or 0.0
+
+
+async def read_stream(router: UpstreamRouter) -> str:
+    """Open a routed stream and return the upstream that served it, reading its body."""
+    async with router.stream("/chat/completions", json={"stream": True}) as call:
+        await call.response.aread()
+        return call.upstream.name
+
+
+@pytest.fixture(autouse=True)
+def router_config(monkeypatch):
+    monkeypatch.setattr(Config, "ROUTER_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(Config, "CIRCUIT_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(Config, "CIRCUIT_COOLDOWN", 30.0)
+
+
+def test_stream_fails_over_before_first_byte():
+    calls: List[str] = []
+    router = UpstreamRouter([
+        make_upstream("failover-a", status(503), calls),
+        make_upstream("failover-b", ok, calls),
+    ])
+    
+    assert asyncio.run(read_stream(router)) == "failover-b"
+    assert calls == ["failover-a", "failover-b"]
+    assert router.upstreams[0].breaker.failures == 1
+    assert router.upstreams[0].error_ewma > 0
+    assert outcome_count("failover-a", "failure") == 1
+    assert outcome_count("failover-b", "success") == 1
+
+
+def test_stream_fails_over_on_transport_error():
+    calls: List[str] = []
+    
+    def refuse(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("connection refused", request=request)
+    
+    router = UpstreamRouter([make_upstream("connect-a", refuse, calls), make_upstream("connect-b", ok, calls)])
+    
+    assert asyncio.run(read_stream(router)) == "connect-b"
+    assert calls == ["connect-a", "connect-b"]
+
+
+def test_stream_does_not_fail_over_after_first_byte():
+    calls: List[str] = []
+    router = UpstreamRouter([
+        make_upstream("midstream-a", lambda request: httpx.Response(200, stream=FailingStream()), calls),
+        make_upstream("midstream-b", ok, calls),
+    ])
+    
+    with pytest.raises(httpx.ReadError):
+        asyncio.run(read_stream(router))
+    assert calls == ["midstream-a"]
+
+
+def test_rejected_request_is_not_retried_or_counted_as_failure():
+    calls: List[str] = []
+    router = UpstreamRouter([make_upstream("reject-a", status(400), calls), make_upstream("reject-b", ok, calls)])
+    
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(read_stream(router))
+    assert calls == ["reject-a"]
+    assert router.upstreams[0].breaker.failures == 0
+    assert router.upstreams[0].error_ewma == 0
+    assert outcome_count("reject-a", "rejected") == 1
+    assert outcome_count("reject-a", "success") == 0
+
+
+def test_post_fails_over_and_gives_up_after_max_attempts():
+    calls: List[str] = []
+    router = UpstreamRouter([make_upstream(f"post-{i}", status(502), calls) for i in range(4)])
+    
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(router.post("/chat/completions", json={}))
+    assert calls == ["post-0", "post-1", "post-2"]
+
+
+def test_circuit_breaker_opens_and_half_opens(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(router_module.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=10.0)
+    
+    breaker.on_failure()
+    assert breaker.allows_request()
+    breaker.on_failure()
+    assert breaker.is_open
+    assert not breaker.allows_request()
+    
+    # After the cooldown exactly one trial request goes through.
+    now[0] = 110.0
+    assert breaker.allows_request()
+    breaker.on_attempt()
+    assert not breaker.allows_request()
+    
+    # A failed trial opens the circuit for another cooldown.
+    breaker.on_failure()
+    assert not breaker.allows_request()
+    now[0] = 119.0
+    assert not breaker.allows_request()
+    
+    # A successful trial closes it.
+    now[0] = 120.0
+    breaker.on_attempt()
+    breaker.on_success()
+    assert not breaker.is_open
+    assert breaker.allows_request()
+
+
+def test_router_skips_open_circuit_until_half_open():
+    calls: List[str] = []
+    healthy = [False]
+    
+    def flaky(request: httpx.Request) -> httpx.Response:
+        return ok(request) if healthy[0] else status(503)(request)
+    
+    router = UpstreamRouter([make_upstream("circuit-a", flaky, calls), make_upstream("circuit-b", ok, calls)])
+    first = router.upstreams[0]
+    # The slow second upstream is only used while the first one's circuit is open.
+    router.upstreams[1].ttft_ewma = 10.0
+    
+    for _ in range(Config.CIRCUIT_FAILURE_THRESHOLD):
+        asyncio.run(read_stream(router))
+    assert first.breaker.is_open
+    
+    calls.clear()
+    assert asyncio.run(read_stream(router)) == "circuit-b"
+    assert calls == ["circuit-b"]
+    
+    # Cooldown over: the open upstream gets a trial, which closes it.
+    healthy[0] = True
+    first.breaker.open_until = 0.0
+    first.error_ewma = 0.0
+    calls.clear()
+    assert asyncio.run(read_stream(router)) == "circuit-a"
+    assert not first.breaker.is_open
+
+
+def test_consumer_error_releases_half_open_trial():
+    calls: List[str] = []
+    router = UpstreamRouter([make_upstream("consumer-a", ok, calls)])
+    upstream = router.upstreams[0]
+    upstream.breaker.failures = Config.CIRCUIT_FAILURE_THRESHOLD
+    upstream.breaker.open_until = 0.0
+    
+    async def fail_while_reading():
+        async with router.stream("/chat/completions", json={"stream": True}):
+            raise ValueError("bad frame")
+    
+    with pytest.raises(ValueError):
+        asyncio.run(fail_while_reading())
+    assert not upstream.breaker.trial_in_flight
+    assert upstream.breaker.allows_request()
+    assert outcome_count("consumer-a", "error") == 1
+
+
+def test_stream_without_tokens_records_no_ttft_sample():
+    calls: List[str] = []
+    router = UpstreamRouter([make_upstream("no-tokens-a", ok, calls)])
+    
+    asyncio.run(read_stream(router))
+    assert router.upstreams[0].ttft_ewma is None
@@ -0,0 +1,49 @@
+"""
+Tests for trimming message histories to a prompt token budget.
+"""
+
+import json
+
+from orcestator.tokens import TokenEstimator
+
+MODEL = "example/model"
+
+TOOL_CALLS = [{
+    "id": "call_1",
+    "type": "function",
+    "function": {"name": "read_file", "arguments": json.dumps({"path": "src/main.py"})},
+}]
+
+
+def test_fit_keeps_assistant_answered_by_trailing_tool_results():
+    messages = [
+        {"role": "system", "content": "You are a coding assistant."},
+        {"role": "user", "content": "Explain this file. " + "def f(x):\n    return x\n" * 200},
+        {"role": "assistant", "content": "", "tool_calls": TOOL_CALLS},
+        {"role": "tool", "tool_call_id": "call_1", "content": "print('hello')\n" * 100},
+    ]
+    
+    fitted, total, removed = TokenEstimator().fit(MODEL, messages, 200)
+    
+    assert [message["role"] for message in fitted] == ["system", "assistant", "tool"]
+    assert fitted[1]["tool_calls"] == TOOL_CALLS
+    assert "tokens omitted" in fitted[2]["content"]
+    assert total <= 200
+    assert removed > 0
+
+
+def test_fit_truncates_only_the_content_of_tool_calling_assistant():
+    messages = [
+        {"role": "user", "content": "Fix the bug."},
+        {"role": "assistant", "content": "Let me look at the file. " * 400, "tool_calls": TOOL_CALLS},
+        {"role": "tool", "tool_call_id": "call_1", "content": "print('hello')"},
+    ]
+    
+    fitted, total, _ = TokenEstimator().fit(MODEL, messages, 300)
+    
+    assistant = fitted[-2]
+    assert assistant["tool_calls"] == TOOL_CALLS
+    assert "tokens omitted" in assistant["content"]
+    assert assistant["content"].startswith("Let me look at the file.")
+    assert "read_file" not in assistant["content"]
+    assert total <= 300